@@ -1,18 +1,37 @@
 """
 Gestion de l'authentification JWT
 """
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Union
+from typing import Optional, Union, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from config import settings
-from database import get_db
+from database import get_async_db
+from schemas.auth import CurrentUser
 
 # Contexte de chiffrement pour les mots de passe
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min/max = coût configuré: tout hash à un autre coût est signalé pour re-hachage
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds,
+)
+
+# Pool borné pour bcrypt (libère le GIL): ne bloque pas la boucle d'événements
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers,
+    thread_name_prefix="bcrypt"
+)
 
 # Schéma de sécurité Bearer Token
 security = HTTPBearer()
@@ -28,6 +47,29 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def get_password_hash_async(password: str) -> str:
+    """Génère le hash d'un mot de passe dans le pool dédié"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, get_password_hash, password)
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Vérifie un mot de passe dans le pool dédié.
+    Retourne (valide, nouveau_hash); nouveau_hash est renseigné si le hash
+    doit être régénéré (facteur de coût modifié).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        password_executor, pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
+
+def shutdown_password_executor():
+    """Arrête le pool de hachage (arrêt de l'application)"""
+    password_executor.shutdown(wait=False)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Crée un token JWT d'accès
@@ -67,7 +109,51 @@ def verify_token(token: str) -> dict:
         raise credentials_exception
 
 
-def get_current_user(token: str = Depends(security), db: Session = Depends(get_db)):
+class UserCache:
+    """
+    Cache en mémoire (par worker) des utilisateurs authentifiés, avec TTL.
+    Évite la requête sur employe à chaque appel authentifié.
+    """
+
+    def __init__(self, ttl: int, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, Tuple[float, CurrentUser]]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[CurrentUser]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            self._entries.pop(user_id, None)
+            return None
+        return user
+
+    def set(self, user: CurrentUser):
+        if self.ttl <= 0:
+            return
+        self._entries[user.id_employe] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user.id_employe)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+user_cache = UserCache(ttl=settings.auth_cache_ttl, max_size=settings.auth_cache_max_size)
+
+
+def invalidate_user_cache(user_id: int):
+    """Retire un utilisateur du cache (modification, désactivation)"""
+    user_cache.invalidate(user_id)
+
+
+async def get_current_user(token: str = Depends(security), db: AsyncSession = Depends(get_async_db)):
     """
     Dépendance pour récupérer l'utilisateur courant à partir du token
     """
@@ -76,11 +162,15 @@ def get_current_user(token: str = Depends(security), db: Session = Depends(get_d
     token_data = verify_token(token.credentials)
     user_id = token_data["user_id"]
     
+    cached_user = user_cache.get(user_id)
+    if cached_user is not None:
+        return cached_user
+    
     # Récupérer l'utilisateur depuis la base de données
-    user = db.query(Employe).filter(
+    user = await db.scalar(select(Employe).where(
         Employe.id_employe == user_id,
         Employe.is_active == "1"
-    ).first()
+    ))
     
     if user is None:
         raise HTTPException(
@@ -89,7 +179,9 @@ def get_current_user(token: str = Depends(security), db: Session = Depends(get_d
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    return user
+    current_user = CurrentUser.model_validate(user)
+    user_cache.set(current_user)
+    return current_user
 
 
 def require_role(required_role: str):
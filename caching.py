@@ -0,0 +1,136 @@
+"""
+GET conditionnels: ETag forts, If-None-Match -> 304 et Cache-Control.
+
+- ConditionalGetMiddleware: ETag = empreinte du corps des réponses JSON des GET
+  (taille bornée); 304 sans corps si le client a déjà cette version. Le calcul
+  a lieu après la sérialisation: seul le transfert est économisé.
+- not_modified: ETag calculé par la route avant la sérialisation (horodatage
+  updated_at des modèles TimestampMixin via entity_etag, empreinte du cache de
+  référence); le 304 évite aussi la validation et l'encodage de la réponse.
+- cache_control: politique Cache-Control d'un routeur (dépendance), les autres
+  réponses reçoivent settings.cache_control.
+"""
+import hashlib
+from typing import Any, Callable, Optional, Type
+from fastapi import Request, Response
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import settings
+from loading import related_objects
+from models.base import TimestampMixin
+
+# En-têtes conservés sur une réponse 304 (RFC 9110 §15.4.5)
+NOT_MODIFIED_HEADERS = ("etag", "cache-control", "vary", "expires", "content-location", "date")
+
+
+def make_etag(*parts: Any) -> str:
+    """ETag fort à partir de valeurs quelconques (repr stable)"""
+    return '"' + hashlib.sha256(repr(parts).encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparaison faible de If-None-Match (liste, W/ et * acceptés)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+
+def entity_etag(obj: Any, schema: Type[BaseModel]) -> str:
+    """
+    ETag d'un objet ORM et des objets liés que `schema` sérialise, sans sérialisation:
+    (table, clé, updated_at ou created_at) pour les modèles TimestampMixin,
+    valeurs des colonnes pour les autres
+    """
+    parts = []
+    for item in related_objects(obj, schema):
+        state = inspect(item)
+        table = state.mapper.local_table.name
+        if isinstance(item, TimestampMixin):
+            parts.append((table, state.identity, item.updated_at or item.created_at))
+        else:
+            parts.append((table, tuple(getattr(item, column.key) for column in state.mapper.column_attrs)))
+    return make_etag(schema.__name__, parts)
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Réponse 304 si If-None-Match correspond à `etag`, sinon None après avoir posé
+    l'ETag sur `response` (réponse injectée de la route)
+    """
+    response.headers["ETag"] = etag
+    if not etag_matches(request.headers.get("if-none-match"), etag):
+        return None
+    headers = {name: value for name, value in response.headers.items() if name in NOT_MODIFIED_HEADERS}
+    headers.setdefault("cache-control", settings.cache_control)
+    return Response(status_code=304, headers=headers)
+
+
+def cache_control(policy: str) -> Callable:
+    """
+    Dépendance de routeur: Cache-Control des GET de ce routeur
+    APIRouter(..., dependencies=[Depends(cache_control("private, max-age=60"))])
+    """
+    def set_cache_control(request: Request, response: Response):
+        if request.method in ("GET", "HEAD"):
+            response.headers["Cache-Control"] = policy
+    return set_cache_control
+
+
+class ConditionalGetMiddleware:
+    """ETag par empreinte du corps et 304 pour les réponses JSON 200 des GET"""
+
+    def __init__(self, app: ASGIApp, max_body: int = 1024 * 1024, default_cache_control: str = "private, no-cache"):
+        self.app = app
+        self.max_body = max_body
+        self.default_cache_control = default_cache_control
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start: Optional[Message] = None
+        chunks = []
+
+        async def send_with_etag(message: Message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if message["status"] != 200 or not headers.get("content-type", "").startswith("application/json"):
+                    await send(message)
+                    return
+                headers.setdefault("cache-control", self.default_cache_control)
+                length = headers.get("content-length")
+                # ETag déjà posé par la route, ou corps en flux / trop gros: transmis tel quel
+                if "etag" in headers or length is None or int(length) > self.max_body:
+                    await send(message)
+                    return
+                start = message
+                return
+
+            if start is None:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            headers = MutableHeaders(scope=start)
+            headers["etag"] = etag
+            if etag_matches(if_none_match, etag):
+                kept = [(name, value) for name, value in start["headers"] if name.decode("latin-1") in NOT_MODIFIED_HEADERS]
+                await send({"type": "http.response.start", "status": 304, "headers": kept})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_with_etag)
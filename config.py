@@ -22,17 +22,71 @@ class BaseConfig(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     
+    # Hachage des mots de passe (bcrypt)
+    bcrypt_rounds: int = 12  # facteur de coût; les hashs différents sont re-hachés au login
+    password_hash_workers: int = 2  # threads dédiés au hachage (hors boucle d'événements)
+    
+    # Cache des utilisateurs authentifiés (secondes, 0 = désactivé)
+    auth_cache_ttl: int = 60
+    auth_cache_max_size: int = 10000
+    
     # Upload de fichiers
     upload_dir: str = "uploads"
     max_file_size: int = 10 * 1024 * 1024  # 10MB
+    upload_chunk_size: int = 1024 * 1024  # taille des blocs lus pendant l'upload
+    download_url_ttl: int = 3600  # secondes de validité des URLs de téléchargement signées
+    download_url_secret: Optional[str] = None  # clé HMAC des URLs signées (secret_key par défaut)
+    
+    # Déclinaisons des images (miniature / web), générées dans un pool de processus
+    image_workers: int = 2  # processus par worker uvicorn, 0 = désactivé
+    image_thumbnail_size: int = 320  # plus grand côté en pixels
+    image_web_size: int = 1600
+    image_quality: int = 80  # qualité WebP
     
     # Pagination
     default_page_size: int = 20
     max_page_size: int = 100
+    count_cache_ttl: int = 10  # secondes de validité des totaux en mode "cached"
+    count_cache_max_size: int = 1000
+    
+    # Imports en lot (JSON / NDJSON)
+    batch_max_rows: int = 50000  # lignes max par requête
+    reference_cache_ttl: int = 300  # secondes de validité des ensembles de référence (comptes, devises...)
+    reference_cache_notify: bool = True  # diffusion des invalidations entre workers (LISTEN/NOTIFY PostgreSQL)
+    
+    # Exports (CSV / NDJSON / Parquet)
+    export_dir: str = "exports"  # fichiers écrits par scripts/manage_db.py export
+    export_batch_size: int = 5000  # lignes lues par aller-retour du curseur serveur
+    
+    # Rapports pré-calculés (P&L, balance, valorisation de stock, relevés de caisse)
+    report_dir: str = "reports"
+    report_workers: int = 1  # processus de génération par worker uvicorn (0 = dans la boucle de l'API)
+    
+    # GET conditionnels (ETag / If-None-Match)
+    cache_control: str = "private, no-cache"  # réponses JSON des GET: revalidation à chaque appel
+    cache_control_reference: str = "private, max-age=60"  # données de référence (devises, statuts...)
+    etag_max_body: int = 1024 * 1024  # octets max pour l'ETag calculé sur le corps de la réponse
+    
+    # Pool de connexions base de données (par worker uvicorn)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30  # secondes d'attente max pour obtenir une connexion
+    db_pool_recycle: int = 1800  # secondes avant recyclage d'une connexion
+    db_pool_pre_ping: bool = True  # détecte les connexions mortes (failover PostgreSQL)
+    db_statement_timeout: int = 0  # millisecondes, 0 = désactivé
+    
+    # Rafraîchissement de la vue matérialisée stock_inventory (PostgreSQL)
+    stock_inventory_refresh_interval: int = 300  # secondes entre deux rafraîchissements, 0 = désactivé
+    stock_inventory_refresh_debounce: float = 5.0  # délai de regroupement après un mouvement de stock
     
     # CORS (sera parsé depuis une string séparée par des virgules)
     cors_origins: str = "*"
     
+    # Instrumentation SQL par requête (Server-Timing, détection N+1, budgets @query_budget)
+    sql_instrumentation: bool = False
+    sql_n_plus_one_threshold: int = 5  # exécutions d'une même instruction signalées comme N+1
+    sql_query_budget_strict: bool = False  # dépassement de budget: erreur au lieu d'un warning
+    
     # Logging
     log_level: str = "INFO"
     
@@ -58,6 +112,7 @@ class DevelopmentConfig(BaseConfig):
     
     # Logs détaillés
     log_level: str = "DEBUG"
+    sql_instrumentation: bool = True
     
     class Config:
         env_file = "config/.env.dev"
@@ -75,6 +130,14 @@ class ProductionConfig(BaseConfig):
     host: str = "0.0.0.0"
     port: int = 80
     reload: bool = False
+    workers: int = 4
+    
+    # Pool de connexions: workers * (pool_size + max_overflow) <= max_connections PostgreSQL
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 10
+    db_pool_recycle: int = 900
+    db_statement_timeout: int = 30000
     
     # Sécurité renforcée
     debug: bool = False
@@ -109,8 +172,15 @@ class TestConfig(BaseConfig):
     
     # Paramètres adaptés aux tests
     access_token_expire_minutes: int = 5
+    bcrypt_rounds: int = 4
     default_page_size: int = 5
     max_page_size: int = 10
+    db_pool_size: int = 2
+    db_max_overflow: int = 2
+    
+    # Les routes au-delà de leur budget SQL font échouer les tests
+    sql_instrumentation: bool = True
+    sql_query_budget_strict: bool = True
     
     class Config:
         env_file = "config/.env.test"
@@ -1,18 +1,138 @@
 """
 Configuration de la base de données PostgreSQL
 """
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from typing import Generator, AsyncGenerator, Callable, Dict, Any, List
 from config import settings
 
-# Création du moteur SQLAlchemy
-engine = create_engine(settings.database_url)
+# Drivers asynchrones par dialecte (asyncpg pour PostgreSQL, aiosqlite pour le mode no-db)
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+
+def get_async_database_url(database_url: str) -> str:
+    """
+    Convertit une URL synchrone (postgresql://, sqlite://) en URL asynchrone
+    """
+    url = make_url(database_url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for '{url.get_backend_name()}'")
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+# Observateurs de chaque attente de checkout: fonction(attente en secondes, timeout) (métriques)
+pool_wait_observers: List[Callable[[float, bool], None]] = []
+
+
+class PoolWaitStats:
+    """Temps d'attente cumulé pour obtenir une connexion du pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            if timed_out:
+                self.timeouts += 1
+        for observer in pool_wait_observers:
+            observer(wait, timed_out)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.total_wait, 6),
+                "wait_seconds_max": round(self.max_wait, 6),
+                "wait_seconds_avg": round(self.total_wait / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+
+
+class TimedPoolMixin:
+    """Mesure le temps d'attente de chaque checkout du pool"""
+    wait_stats: PoolWaitStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return connection
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    """QueuePool instrumenté (moteur synchrone)"""
+    wait_stats = PoolWaitStats()
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    """QueuePool instrumenté (moteur asynchrone)"""
+    wait_stats = PoolWaitStats()
+
+
+def get_engine_options(database_url: str, is_async: bool = False) -> Dict[str, Any]:
+    """
+    Options du moteur selon la configuration (pool, pre-ping, statement timeout)
+    """
+    if make_url(database_url).get_backend_name() != "postgresql":
+        # SQLite (mode no-db): pool par défaut du dialecte
+        return {}
+
+    options: Dict[str, Any] = {
+        "poolclass": TimedAsyncQueuePool if is_async else TimedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if settings.db_statement_timeout:
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(settings.db_statement_timeout)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={settings.db_statement_timeout}"}
+    return options
+
+
+# Création du moteur SQLAlchemy (scripts, création des tables)
+engine = create_engine(settings.database_url, **get_engine_options(settings.database_url))
+
+# Moteur asynchrone utilisé par les routes de l'API
+async_engine = create_async_engine(
+    get_async_database_url(settings.database_url),
+    **get_engine_options(settings.database_url, is_async=True)
+)
 
 # Factory de sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Factory de sessions asynchrones (pas d'expiration au commit: pas de lazy load implicite)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 # Classe de base pour les modèles ORM
 Base = declarative_base()
 
@@ -28,8 +148,53 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dépendance pour obtenir une session de base de données asynchrone
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _pool_status(sync_engine: Engine) -> Dict[str, Any]:
+    """Statistiques d'un pool de connexions"""
+    pool = sync_engine.pool
+    status: Dict[str, Any] = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+    wait_stats = getattr(pool, "wait_stats", None)
+    if wait_stats is not None:
+        status["wait"] = wait_stats.as_dict()
+    return status
+
+
+def get_pool_status() -> Dict[str, Any]:
+    """
+    Statistiques en direct des pools de connexions (worker courant)
+    """
+    return {
+        "async": _pool_status(async_engine.sync_engine),
+        "sync": _pool_status(engine),
+    }
+
+
 def create_tables():
     """
     Crée toutes les tables en base de données
     """
-    Base.metadata.create_all(bind=engine) 
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+
+
+async def dispose_engines():
+    """
+    Ferme les connexions des moteurs (arrêt de l'application)
+    """
+    await async_engine.dispose()
+    engine.dispose()
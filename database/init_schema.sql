@@ -56,13 +56,24 @@ CREATE TABLE statut_appro (
 CREATE TABLE document (
     id_document BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
     file_path   TEXT NOT NULL,
+    filename    TEXT,
     mime_type   TEXT,
     checksum    TEXT,
+    sha256      TEXT,                                  -- contenu dans document_blob
     size_bytes  BIGINT,
     uploaded_by BIGINT,                                -- FK employe après définition
     created_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
     updated_at  TIMESTAMPTZ
 );
+CREATE INDEX ix_document_sha256 ON document (sha256);
+
+-- Contenus adressés par SHA-256 (uploads/ab/cd/<sha256>), partagés entre documents
+CREATE TABLE document_blob (
+    sha256     TEXT PRIMARY KEY,
+    size_bytes BIGINT NOT NULL,
+    ref_count  BIGINT NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
 
 CREATE TABLE document_tag (
     id_document BIGINT NOT NULL REFERENCES document ON DELETE CASCADE,
@@ -204,6 +215,14 @@ CREATE TABLE stock_move (
     ref_document BIGINT REFERENCES document
 );
 
+/* Solde par stock et article, maintenu à chaque mouvement (voir services/stock.py) */
+CREATE TABLE stock_balance (
+    id_stock   BIGINT REFERENCES stock   ON DELETE CASCADE,
+    id_article BIGINT REFERENCES article ON DELETE CASCADE,
+    qty        NUMERIC(14,3) NOT NULL DEFAULT 0,
+    PRIMARY KEY (id_stock, id_article)
+);
+
 /* Vue matérialisée d’inventaire */
 CREATE MATERIALIZED VIEW stock_inventory AS
 SELECT
@@ -219,6 +238,9 @@ JOIN stock    s ON (s.id_stock = sm.dst_stock OR s.id_stock = sm.src_stock)
 JOIN article  a ON a.id_article = sm.id_article
 GROUP BY s.id_stock, a.id_article;
 
+/* Index unique requis par REFRESH MATERIALIZED VIEW CONCURRENTLY */
+CREATE UNIQUE INDEX stock_inventory_uq ON stock_inventory (id_stock, id_article);
+
 /* ======================= 7. PROJETS =============================== */
 
 CREATE TABLE site_client (
@@ -317,6 +339,21 @@ CREATE TABLE ledger_line (
     memo           TEXT
 );
 
+/* Solde courant par compte (débit - crédit), maintenu à chaque ligne (voir services/ledger.py) */
+CREATE TABLE account_balance (
+    id_account    BIGINT PRIMARY KEY REFERENCES account ON DELETE CASCADE,
+    balance_minor BIGINT NOT NULL DEFAULT 0,
+    last_date_op  TIMESTAMPTZ
+);
+
+/* Soldes de clôture datés : solde = dernière clôture + lignes postérieures */
+CREATE TABLE account_balance_snapshot (
+    id_account    BIGINT REFERENCES account ON DELETE CASCADE,
+    closed_at     TIMESTAMPTZ NOT NULL,
+    balance_minor BIGINT NOT NULL,
+    PRIMARY KEY (id_account, closed_at)
+);
+
 /* ======================= 10. CAISSE PROJET ======================== */
 
 CREATE TABLE caisse_projet (
@@ -331,23 +368,47 @@ CREATE TABLE expense_receipt (
     id_document BIGINT NOT NULL REFERENCES document
 );
 
-/* Contrainte : catégories obligatoires sur dépenses de caisse */
+/* Contrainte : catégories obligatoires sur dépenses de caisse
+   Trigger par instruction (tables de transition): une seule jointure pour un
+   INSERT multi-lignes au lieu d'une recherche par ligne */
 CREATE OR REPLACE FUNCTION check_caisse_category()
 RETURNS TRIGGER AS $$
 BEGIN
-    -- si la ligne crédite un compte caisse_projet alors id_cat doit être non null
-    IF EXISTS (SELECT 1 FROM caisse_projet cp WHERE cp.id_account = NEW.credit_account) THEN
-        IF NEW.id_cat IS NULL THEN
-            RAISE EXCEPTION 'id_cat obligatoire pour les lignes de dépense caisse';
-        END IF;
+    -- si une ligne crédite un compte caisse_projet alors id_cat doit être non null
+    IF EXISTS (
+        SELECT 1 FROM new_lines l
+        JOIN caisse_projet cp ON cp.id_account = l.credit_account
+        WHERE l.id_cat IS NULL
+    ) THEN
+        RAISE EXCEPTION 'id_cat obligatoire pour les lignes de dépense caisse';
     END IF;
-    RETURN NEW;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
-CREATE TRIGGER trg_caisse_cat
-    BEFORE INSERT OR UPDATE ON ledger_line
-    FOR EACH ROW EXECUTE FUNCTION check_caisse_category();
+CREATE TRIGGER trg_caisse_cat_insert
+    AFTER INSERT ON ledger_line
+    REFERENCING NEW TABLE AS new_lines
+    FOR EACH STATEMENT EXECUTE FUNCTION check_caisse_category();
+
+CREATE TRIGGER trg_caisse_cat_update
+    AFTER UPDATE ON ledger_line
+    REFERENCING NEW TABLE AS new_lines
+    FOR EACH STATEMENT EXECUTE FUNCTION check_caisse_category();
+
+/* Comptes de caisse créés ou supprimés (y compris hors API): les workers
+   invalident leur cache caisse_accounts (services/reference.py, LISTEN) */
+CREATE OR REPLACE FUNCTION notify_caisse_accounts()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('reference_cache', '0:caisse_accounts');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_caisse_projet_notify
+    AFTER INSERT OR UPDATE OR DELETE ON caisse_projet
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_caisse_accounts();
 
 /* ======================= 11. LOGISTIQUE =========================== */
 
@@ -358,4 +419,26 @@ CREATE TABLE livraison (
     date_livraison      TIMESTAMPTZ NOT NULL DEFAULT now(),
     id_statut_livraison BIGINT REFERENCES statut_livraison,
     id_livreur          BIGINT REFERENCES employe
-);
\ No newline at end of file
+);
+/* ======================= 12. RAPPORTS ============================= */
+
+-- Rapports générés en tâche de fond (fichiers dans reports/), réutilisés tant
+-- que les données (watermark) et les paramètres ne changent pas
+CREATE TABLE report_job (
+    id_job       BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    report_type  TEXT NOT NULL,
+    params       TEXT NOT NULL,
+    watermark    TEXT NOT NULL,
+    cache_key    VARCHAR(64) NOT NULL,
+    status       TEXT NOT NULL DEFAULT 'PENDING'
+                 CHECK (status IN ('PENDING','RUNNING','DONE','FAILED')),
+    file_path    TEXT,
+    size_bytes   BIGINT,
+    error        TEXT,
+    requested_by BIGINT REFERENCES employe,
+    created_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+    started_at   TIMESTAMPTZ,
+    finished_at  TIMESTAMPTZ
+);
+CREATE INDEX ix_report_job_cache_key ON report_job (cache_key);
+CREATE INDEX ix_report_job_pending ON report_job (id_job) WHERE status = 'PENDING';
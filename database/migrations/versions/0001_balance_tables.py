@@ -0,0 +1,83 @@
+"""Tables de soldes (stock_balance, account_balance, clôtures) et index de stock_inventory
+
+Base: schéma créé par database/init_schema.sql. Les objets sont créés avec
+IF NOT EXISTS: la migration est sans effet sur une base initialisée avec la
+version courante de init_schema.sql.
+
+Les soldes sont alimentés depuis l'historique: stock_balance depuis stock_move
+(mêmes variations que services.stock.stock_move_deltas: +qty sur dst_stock,
+-qty sur src_stock), account_balance depuis ledger_line (comme
+services.ledger._ledger_delta_sql: débit positif, crédit négatif). Les lignes
+déjà présentes sont conservées.
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-06-03
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS stock_balance (
+            id_stock   BIGINT REFERENCES stock   ON DELETE CASCADE,
+            id_article BIGINT REFERENCES article ON DELETE CASCADE,
+            qty        NUMERIC(14,3) NOT NULL DEFAULT 0,
+            PRIMARY KEY (id_stock, id_article)
+        )
+    """)
+    # Mouvements concurrents bloqués jusqu'à la fin de la migration
+    op.execute("LOCK TABLE stock_move IN SHARE MODE")
+    op.execute("""
+        INSERT INTO stock_balance (id_stock, id_article, qty)
+        SELECT id_stock, id_article, SUM(delta)
+        FROM (
+            SELECT dst_stock AS id_stock, id_article, qty AS delta
+            FROM stock_move WHERE dst_stock IS NOT NULL
+            UNION ALL
+            SELECT src_stock AS id_stock, id_article, -qty AS delta
+            FROM stock_move WHERE src_stock IS NOT NULL
+        ) moves
+        GROUP BY id_stock, id_article
+        ON CONFLICT (id_stock, id_article) DO NOTHING
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS account_balance (
+            id_account    BIGINT PRIMARY KEY REFERENCES account ON DELETE CASCADE,
+            balance_minor BIGINT NOT NULL DEFAULT 0,
+            last_date_op  TIMESTAMPTZ
+        )
+    """)
+    op.execute("LOCK TABLE ledger_line IN SHARE MODE")
+    op.execute("""
+        INSERT INTO account_balance (id_account, balance_minor, last_date_op)
+        SELECT id_account, SUM(amount_minor), MAX(date_op)
+        FROM (
+            SELECT debit_account AS id_account, amount_minor, date_op FROM ledger_line
+            UNION ALL
+            SELECT credit_account AS id_account, -amount_minor, date_op FROM ledger_line
+        ) lines
+        GROUP BY id_account
+        ON CONFLICT (id_account) DO NOTHING
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS account_balance_snapshot (
+            id_account    BIGINT REFERENCES account ON DELETE CASCADE,
+            closed_at     TIMESTAMPTZ NOT NULL,
+            balance_minor BIGINT NOT NULL,
+            PRIMARY KEY (id_account, closed_at)
+        )
+    """)
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS stock_inventory_uq ON stock_inventory (id_stock, id_article)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS stock_inventory_uq")
+    op.execute("DROP TABLE IF EXISTS account_balance_snapshot")
+    op.execute("DROP TABLE IF EXISTS account_balance")
+    op.execute("DROP TABLE IF EXISTS stock_balance")
@@ -0,0 +1,73 @@
+"""Index secondaires: clés étrangères filtrées, tris des listes, tables de liaison
+
+Les index sont créés CONCURRENTLY (hors transaction) pour ne pas bloquer les
+écritures sur une base en production.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-06-03
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# (nom, table, colonnes, options)
+INDEXES = [
+    # Mouvements de stock: filtres par stock/article, liste triée par date
+    ("ix_stock_move_src_stock", "stock_move", ["src_stock", "date_move"],
+     {"postgresql_where": sa.text("src_stock IS NOT NULL")}),
+    ("ix_stock_move_dst_stock", "stock_move", ["dst_stock", "date_move"],
+     {"postgresql_where": sa.text("dst_stock IS NOT NULL")}),
+    ("ix_stock_move_id_article", "stock_move", ["id_article", "date_move"], {}),
+    ("ix_stock_move_date_move", "stock_move", ["date_move", "id_move"], {}),
+    # Grand livre: lignes d'un compte et deltas depuis la dernière clôture (index couvrants)
+    ("ix_ledger_line_debit_account", "ledger_line", ["debit_account", "date_op"],
+     {"postgresql_include": ["amount_minor"]}),
+    ("ix_ledger_line_credit_account", "ledger_line", ["credit_account", "date_op"],
+     {"postgresql_include": ["amount_minor"]}),
+    ("ix_ledger_line_date_op", "ledger_line", ["date_op", "id_line"],
+     {"postgresql_include": ["debit_account", "credit_account", "amount_minor"]}),
+    # Conducteur actif d'un véhicule
+    ("ix_voiture_conducteur_active", "voiture_conducteur", ["id_voiture"],
+     {"postgresql_where": sa.text("date_fin IS NULL")}),
+    ("ix_voiture_conducteur_id_employe", "voiture_conducteur", ["id_employe"], {}),
+    # Clés étrangères parcourues depuis le parent
+    ("ix_article_id_produit", "article", ["id_produit"], {}),
+    ("ix_projet_id_site_client", "projet", ["id_site_client"], {}),
+    ("ix_projet_id_chef_chantier", "projet", ["id_chef_chantier"], {}),
+    ("ix_ordre_fabrication_id_projet", "ordre_fabrication", ["id_projet"], {}),
+    # Tables de liaison: la clé primaire couvre la première colonne, pas la seconde
+    ("ix_document_tag_id_tag", "document_tag", ["id_tag"], {}),
+    ("ix_task_assignment_id_employe", "task_assignment", ["id_employe"], {}),
+    ("ix_task_dependency_id_child_task", "task_dependency", ["id_child_task"], {}),
+    ("ix_task_document_id_document", "task_document", ["id_document"], {}),
+    ("ix_materiel_document_id_document", "materiel_document", ["id_document"], {}),
+    ("ix_produit_fournisseur_id_entreprise", "produit_fournisseur", ["id_entreprise"], {}),
+    ("ix_projet_voiture_id_voiture", "projet_voiture", ["id_voiture"], {}),
+    ("ix_projet_materiel_id_materiel", "projet_materiel", ["id_materiel"], {}),
+    ("ix_projet_document_id_document", "projet_document", ["id_document"], {}),
+    ("ix_nomenclature_produit_id_produit", "nomenclature_produit", ["id_produit"], {}),
+    ("ix_nomenclature_document_id_document", "nomenclature_document", ["id_document"], {}),
+    ("ix_of_nomenclature_id_nomenclature", "of_nomenclature", ["id_nomenclature"], {}),
+    ("ix_of_document_id_document", "of_document", ["id_document"], {}),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_concurrently=True, if_not_exists=True, **options
+            )
+        op.execute("ANALYZE stock_move, ledger_line, voiture_conducteur")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,20 @@
+"""Empreinte SHA-256 des documents (calculée pendant l'upload, à côté du MD5)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-06-10
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("ALTER TABLE document ADD COLUMN IF NOT EXISTS sha256 TEXT")
+
+
+def downgrade():
+    op.execute("ALTER TABLE document DROP COLUMN IF EXISTS sha256")
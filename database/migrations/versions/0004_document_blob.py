@@ -0,0 +1,34 @@
+"""Magasin de blobs adressé par contenu: document_blob (compteur de références), nom d'origine
+
+Les documents existants gardent leur fichier ({md5}_{nom}); ils sont supprimés
+directement, sans compteur.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-06-12
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS document_blob (
+            sha256     TEXT PRIMARY KEY,
+            size_bytes BIGINT NOT NULL,
+            ref_count  BIGINT NOT NULL DEFAULT 0,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    op.execute("ALTER TABLE document ADD COLUMN IF NOT EXISTS filename TEXT")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_document_sha256 ON document (sha256)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_document_sha256")
+    op.execute("ALTER TABLE document DROP COLUMN IF EXISTS filename")
+    op.execute("DROP TABLE IF EXISTS document_blob")
@@ -0,0 +1,72 @@
+"""check_caisse_category par instruction (tables de transition) au lieu de par ligne
+
+Les écritures de journal en lot (POST /ledger/journal) insèrent des milliers de
+lignes par instruction: le contrôle devient une seule jointure sur les lignes
+insérées ou modifiées.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2024-06-17
+"""
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_caisse_cat ON ledger_line")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION check_caisse_category()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM new_lines l
+                JOIN caisse_projet cp ON cp.id_account = l.credit_account
+                WHERE l.id_cat IS NULL
+            ) THEN
+                RAISE EXCEPTION 'id_cat obligatoire pour les lignes de dépense caisse';
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("DROP TRIGGER IF EXISTS trg_caisse_cat_insert ON ledger_line")
+    op.execute("""
+        CREATE TRIGGER trg_caisse_cat_insert
+            AFTER INSERT ON ledger_line
+            REFERENCING NEW TABLE AS new_lines
+            FOR EACH STATEMENT EXECUTE FUNCTION check_caisse_category()
+    """)
+    op.execute("DROP TRIGGER IF EXISTS trg_caisse_cat_update ON ledger_line")
+    op.execute("""
+        CREATE TRIGGER trg_caisse_cat_update
+            AFTER UPDATE ON ledger_line
+            REFERENCING NEW TABLE AS new_lines
+            FOR EACH STATEMENT EXECUTE FUNCTION check_caisse_category()
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_caisse_cat_insert ON ledger_line")
+    op.execute("DROP TRIGGER IF EXISTS trg_caisse_cat_update ON ledger_line")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION check_caisse_category()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM caisse_projet cp WHERE cp.id_account = NEW.credit_account) THEN
+                IF NEW.id_cat IS NULL THEN
+                    RAISE EXCEPTION 'id_cat obligatoire pour les lignes de dépense caisse';
+                END IF;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_caisse_cat
+            BEFORE INSERT OR UPDATE ON ledger_line
+            FOR EACH ROW EXECUTE FUNCTION check_caisse_category()
+    """)
@@ -0,0 +1,39 @@
+"""Rapports générés en tâche de fond: report_job
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2024-06-19
+"""
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS report_job (
+            id_job       BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            report_type  TEXT NOT NULL,
+            params       TEXT NOT NULL,
+            watermark    TEXT NOT NULL,
+            cache_key    VARCHAR(64) NOT NULL,
+            status       TEXT NOT NULL DEFAULT 'PENDING'
+                         CHECK (status IN ('PENDING','RUNNING','DONE','FAILED')),
+            file_path    TEXT,
+            size_bytes   BIGINT,
+            error        TEXT,
+            requested_by BIGINT REFERENCES employe,
+            created_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+            started_at   TIMESTAMPTZ,
+            finished_at  TIMESTAMPTZ
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_report_job_cache_key ON report_job (cache_key)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_report_job_pending ON report_job (id_job) WHERE status = 'PENDING'")
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS report_job")
@@ -0,0 +1,39 @@
+"""Notification des changements de caisse_projet au cache de référence
+
+Les comptes de caisse ne sont pas créés par l'API: un trigger par instruction
+envoie NOTIFY reference_cache '0:caisse_accounts' (pid 0: aucun worker ne
+l'ignore), chaque worker invalide son ensemble caisse_accounts.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2024-06-24
+"""
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_caisse_accounts()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM pg_notify('reference_cache', '0:caisse_accounts');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("DROP TRIGGER IF EXISTS trg_caisse_projet_notify ON caisse_projet")
+    op.execute("""
+        CREATE TRIGGER trg_caisse_projet_notify
+            AFTER INSERT OR UPDATE OR DELETE ON caisse_projet
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_caisse_accounts()
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_caisse_projet_notify ON caisse_projet")
+    op.execute("DROP FUNCTION IF EXISTS notify_caisse_accounts()")
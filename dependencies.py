@@ -1,10 +1,11 @@
 """
 Dépendances communes pour l'API
 """
-from typing import Optional
+from datetime import datetime, time
+from typing import Optional, Literal
 from fastapi import Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from auth import get_current_user
 from schemas.common import PaginationParams, FilterParams
 from config import settings
@@ -12,19 +13,59 @@ from config import settings
 
 def get_pagination_params(
     page: int = Query(1, ge=1, description="Numéro de page"),
-    page_size: int = Query(settings.default_page_size, ge=1, le=settings.max_page_size, description="Taille de page")
+    page_size: int = Query(settings.default_page_size, ge=1, le=settings.max_page_size, description="Taille de page"),
+    cursor: Optional[str] = Query(None, description="Curseur renvoyé par la page précédente (pagination keyset)")
 ) -> PaginationParams:
-    """Dépendance pour les paramètres de pagination"""
-    return PaginationParams(page=page, page_size=page_size)
+    """Dépendance pour les paramètres de pagination (listes simples, sans total)"""
+    return PaginationParams(
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        include_total=False
+    )
+
+
+def get_paginated_response_params(
+    pagination: PaginationParams = Depends(get_pagination_params),
+    include_total: Optional[bool] = Query(None, description="Calculer le total (par défaut: oui sans curseur, non avec curseur)"),
+    total_mode: Literal["exact", "cached", "estimate"] = Query("exact", description="Total exact, mis en cache quelques secondes ou estimé (PostgreSQL)")
+) -> PaginationParams:
+    """
+    Dépendance pour les routes PaginatedResponse (fetch_paginated): pagination et
+    calcul du total. Avec un curseur, pas de COUNT sauf demande explicite.
+    """
+    if include_total is None:
+        include_total = not pagination.cursor
+    return pagination.model_copy(update={"include_total": include_total, "total_mode": total_mode})
+
+
+def _parse_filter_date(name: str, value: Optional[str], end_of_day: bool = False) -> Optional[datetime]:
+    """Date ou date-heure ISO; une date seule en borne de fin couvre toute la journée"""
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Invalid {name}: expected an ISO date or datetime"
+        )
+    if end_of_day and len(value) == 10:
+        parsed = datetime.combine(parsed.date(), time.max)
+    return parsed
 
 
 def get_filter_params(
     q: Optional[str] = Query(None, description="Recherche textuelle"),
     date_from: Optional[str] = Query(None, description="Date de début (ISO format)"),
-    date_to: Optional[str] = Query(None, description="Date de fin (ISO format)")
+    date_to: Optional[str] = Query(None, description="Date de fin incluse (ISO format)")
 ) -> FilterParams:
     """Dépendance pour les paramètres de filtrage"""
-    return FilterParams(q=q, date_from=date_from, date_to=date_to)
+    return FilterParams(
+        q=q,
+        date_from=_parse_filter_date("date_from", date_from),
+        date_to=_parse_filter_date("date_to", date_to, end_of_day=True)
+    )
 
 
 def require_authenticated_user(current_user=Depends(get_current_user)):
@@ -51,7 +92,7 @@ def require_admin_user(current_user=Depends(get_current_user)):
 
 def get_current_user_id(current_user=Depends(get_current_user)) -> int:
     """Récupère l'ID de l'utilisateur courant"""
-    return current_user["id"]
+    return current_user.id_employe
 
 
 class CommonQueryParams:
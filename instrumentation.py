@@ -0,0 +1,155 @@
+"""
+Instrumentation SQL par requête HTTP, sur les événements du moteur SQLAlchemy.
+
+Toujours actif: nombre d'instructions et temps SQL de la requête (métriques).
+Avec SQL_INSTRUMENTATION: décompte par forme d'instruction (SQL paramétré,
+listes IN normalisées) pour repérer les N+1, en-tête Server-Timing, journal
+par requête, et vérification des budgets déclarés avec @query_budget
+(SQL_QUERY_BUDGET_STRICT: un dépassement lève une erreur, mode test).
+"""
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import settings
+
+logger = logging.getLogger("sql")
+
+# Paramètres liés des différents pilotes: ? (sqlite), $1 (asyncpg), %(nom)s (psycopg2)
+_PLACEHOLDER = re.compile(r"\?|\$\d+|%\(\w+\)s")
+# Listes IN développées (expanding): une seule forme quelle que soit leur longueur
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Forme d'une instruction: SQL paramétré normalisé"""
+    shape = _PLACEHOLDER.sub("?", statement)
+    shape = _IN_LIST.sub("(?...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+@dataclass
+class RequestStats:
+    """Instructions SQL de la requête HTTP en cours"""
+    queries: int = 0
+    db_seconds: float = 0.0
+    # forme -> [exécutions, secondes]; None sans instrumentation détaillée
+    shapes: Optional[Dict[str, List[float]]] = None
+
+    def record(self, statement: str, seconds: float):
+        self.queries += 1
+        self.db_seconds += seconds
+        if self.shapes is not None:
+            entry = self.shapes.setdefault(statement_shape(statement), [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Formes exécutées au moins `threshold` fois (N+1 probable), les plus fréquentes d'abord"""
+        if not self.shapes:
+            return []
+        return sorted(
+            ((shape, int(count)) for shape, (count, _) in self.shapes.items() if count >= threshold),
+            key=lambda item: -item[1]
+        )
+
+
+# Positionné par le middleware; les tâches lancées par la route en héritent
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+@contextmanager
+def track_queries(detailed: Optional[bool] = None) -> Iterator[RequestStats]:
+    """Compte les instructions SQL exécutées dans ce contexte"""
+    if detailed is None:
+        detailed = settings.sql_instrumentation
+    stats = RequestStats(shapes={} if detailed else None)
+    token = request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        request_stats.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = request_stats.get()
+    started = getattr(context, "_query_started", None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def instrument_engine(sync_engine: Engine):
+    """Branche le décompte sur un moteur (async_engine.sync_engine pour un moteur asynchrone)"""
+    if not event.contains(sync_engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ======================= BUDGETS ==========================
+
+class QueryBudgetExceeded(AssertionError):
+    """Route au-delà de son budget d'instructions SQL (SQL_QUERY_BUDGET_STRICT)"""
+
+
+def query_budget(max_queries: int) -> Callable:
+    """
+    Décorateur de route (sous @router.get...): nombre maximal d'instructions SQL
+    par requête, indépendant du nombre de lignes renvoyées
+    """
+    def decorator(endpoint: Callable) -> Callable:
+        endpoint.__query_budget__ = max_queries
+        return endpoint
+    return decorator
+
+
+def route_budget(request: Request) -> Optional[int]:
+    return getattr(request.scope.get("endpoint"), "__query_budget__", None)
+
+
+def _request_label(request: Request) -> str:
+    route = request.scope.get("route")
+    return f"{request.method} {getattr(route, 'path', request.url.path)}"
+
+
+def report_request(request: Request, response: Response, stats: RequestStats, elapsed: float,
+                   strict: Optional[bool] = None):
+    """
+    Server-Timing, journal et budget d'une requête (instrumentation détaillée uniquement).
+    Lève QueryBudgetExceeded en mode strict si le budget de la route est dépassé.
+    """
+    if stats.shapes is None:
+        return
+    if strict is None:
+        strict = settings.sql_query_budget_strict
+
+    label = _request_label(request)
+    response.headers.append(
+        "Server-Timing",
+        f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} SQL", app;dur={elapsed * 1000:.2f}'
+    )
+    logger.debug(f"{label}: {stats.queries} SQL, {stats.db_seconds * 1000:.1f} ms SQL / {elapsed * 1000:.1f} ms")
+
+    repeated = stats.repeated(settings.sql_n_plus_one_threshold)
+    for shape, count in repeated:
+        logger.warning(f"N+1 probable sur {label}: {count} exécutions de {shape[:300]}")
+
+    budget = route_budget(request)
+    if budget is not None and stats.queries > budget:
+        message = f"{label}: {stats.queries} SQL statements, budget {budget}"
+        if repeated:
+            message += f" (repeated: {repeated[0][1]}x {repeated[0][0][:200]})"
+        if strict:
+            raise QueryBudgetExceeded(message)
+        logger.warning(f"Budget SQL dépassé - {message}")
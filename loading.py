@@ -0,0 +1,75 @@
+"""
+Stratégies de chargement des relations ORM dérivées des schémas de réponse.
+
+Les relations présentes dans le schéma (et récursivement dans ses schémas
+imbriqués) sont chargées en une requête par relation: joinedload pour une
+relation vers un seul objet, selectinload pour une collection. Les autres
+relations passent en raiseload: une route ne charge plus ce qu'elle ne renvoie
+pas (lazy="selectin" des modèles), et un accès imprévu lève une erreur au lieu
+d'une requête par ligne. Le nombre de requêtes d'une liste est ainsi constant.
+related_objects parcourt le même graphe sur des objets chargés (ETag, caching.py).
+"""
+import typing
+from functools import lru_cache
+from typing import Any, Iterator, Optional, Tuple, Type
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from sqlalchemy.orm import Mapper, joinedload, raiseload, selectinload
+from sqlalchemy.orm.strategy_options import _AbstractLoad
+
+
+def _nested_schema(annotation) -> Optional[Type[BaseModel]]:
+    """Schéma imbriqué d'un champ (Optional[...] et List[...] déballés)"""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for arg in typing.get_args(annotation):
+        nested = _nested_schema(arg)
+        if nested is not None:
+            return nested
+    return None
+
+
+def related_objects(obj: Any, schema: Type[BaseModel], path: Tuple[type, ...] = ()) -> Iterator[Any]:
+    """`obj` puis les objets liés que `schema` sérialise (relations déjà chargées)"""
+    yield obj
+    path = path + (schema,)
+    for relationship in inspect(obj).mapper.relationships:
+        field = schema.model_fields.get(relationship.key)
+        if field is None:
+            continue
+        value = getattr(obj, relationship.key)
+        items = value if relationship.uselist else ([value] if value is not None else [])
+        nested = _nested_schema(field.annotation)
+        for item in items:
+            if nested is None or nested in path:
+                yield item
+            else:
+                yield from related_objects(item, nested, path)
+
+
+def _options(mapper: Mapper, schema: Type[BaseModel], path: Tuple[type, ...]) -> list:
+    options = []
+    for relationship in mapper.relationships:
+        attribute = getattr(mapper.class_, relationship.key)
+        field = schema.model_fields.get(relationship.key)
+        if field is None:
+            # sql_only: un many-to-one déjà présent dans la session reste accessible
+            options.append(raiseload(attribute, sql_only=True))
+            continue
+
+        loader = selectinload(attribute) if relationship.uselist else joinedload(attribute)
+        nested = _nested_schema(field.annotation)
+        # Schéma non résolu ou cycle: chargement par défaut des relations imbriquées
+        if nested is not None and nested not in path:
+            loader = loader.options(*_options(relationship.mapper, nested, path + (nested,)))
+        options.append(loader)
+    return options
+
+
+@lru_cache(maxsize=None)
+def response_options(model: type, schema: Type[BaseModel]) -> Tuple[_AbstractLoad, ...]:
+    """
+    Options de chargement pour sérialiser `model` avec `schema`:
+    select(Model).options(*response_options(Model, ModelResponse))
+    """
+    return tuple(_options(inspect(model), schema, (schema,)))
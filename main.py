@@ -8,7 +8,16 @@ from fastapi.responses import JSONResponse
 import time
 import logging
 from config import settings, get_environment_info, get_cors_origins_list
-from database import create_tables
+from database import create_tables, dispose_engines
+from auth import shutdown_password_executor
+from metrics import metrics_response, observe_request, shutdown_metrics
+from instrumentation import report_request, track_queries
+from caching import ConditionalGetMiddleware
+from serialization import ORJSONResponse
+from services.images import image_derivatives
+from services.stock import stock_inventory_refresher
+from services.reports import report_jobs
+from services.reference import reference_sets
 
 # Import des routes
 from routes.auth import router as auth_router
@@ -23,6 +32,8 @@ from routes.projects import router as projects_router
 from routes.manufacturing import router as manufacturing_router
 from routes.finance import router as finance_router
 from routes.logistics import router as logistics_router
+from routes.exports import router as exports_router
+from routes.reports import router as reports_router
 
 # Configuration du logging selon l'environnement
 logging.basicConfig(
@@ -126,6 +137,14 @@ Cette API utilise l'authentification **JWT Bearer Token**.
     license_info={
         "name": "Propriétaire",
     },
+    default_response_class=ORJSONResponse,
+)
+
+# ETag et 304 pour les GET (interne au CORS: les 304 portent aussi les en-têtes CORS)
+app.add_middleware(
+    ConditionalGetMiddleware,
+    max_body=settings.etag_max_body,
+    default_cache_control=settings.cache_control
 )
 
 # Middleware CORS configuré selon l'environnement
@@ -141,9 +160,12 @@ app.add_middleware(
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
     start_time = time.time()
-    response = await call_next(request)
+    with track_queries() as sql_stats:
+        response = await observe_request(request, call_next, sql_stats)
     process_time = time.time() - start_time
     response.headers["X-Process-Time"] = str(process_time)
+    # Server-Timing, N+1 et budgets SQL (SQL_INSTRUMENTATION)
+    report_request(request, response, sql_stats, process_time)
     return response
 
 # Gestionnaire d'erreurs global
@@ -179,11 +201,30 @@ async def startup_event():
         logger.warning(f"Base de données non disponible: {e}")
         logger.warning("L'API démarre en mode sans base de données")
         logger.warning("Certaines fonctionnalités nécessiteront une DB")
+    
+    # Rafraîchissement périodique de la vue d'inventaire (PostgreSQL uniquement)
+    stock_inventory_refresher.start()
+    
+    # Invalidation du cache de référence diffusée entre workers (PostgreSQL uniquement)
+    reference_sets.start()
+    
+    # Jobs de rapport restés en attente avant le redémarrage
+    try:
+        await report_jobs.start()
+    except Exception as e:
+        logger.warning(f"Reprise des jobs de rapport impossible: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Actions à effectuer à l'arrêt de l'application"""
     logger.info("Arrêt de l'API PMS Protection Incendie")
+    await stock_inventory_refresher.stop()
+    await reference_sets.stop()
+    await image_derivatives.stop()
+    await report_jobs.stop()
+    await dispose_engines()
+    shutdown_password_executor()
+    shutdown_metrics()
 
 # Enregistrement des routes
 app.include_router(common_router)
@@ -198,6 +239,8 @@ app.include_router(projects_router)
 app.include_router(manufacturing_router)
 app.include_router(finance_router)
 app.include_router(logistics_router)
+app.include_router(exports_router)
+app.include_router(reports_router)
 
 # Route racine
 @app.get("/")
@@ -230,14 +273,9 @@ async def environment_info():
 @app.get("/metrics")
 async def metrics():
     """
-    Endpoint pour les métriques Prometheus/OpenTelemetry
+    Métriques Prometheus (exposition texte), agrégées sur tous les workers
     """
-    # TODO: Implémenter les métriques réelles
-    return {
-        "status": "ok",
-        "metrics_available": False,
-        "message": "Metrics endpoint not implemented yet"
-    }
+    return metrics_response()
 
 
 # Route admin pour créer des utilisateurs
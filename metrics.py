@@ -0,0 +1,130 @@
+"""
+Métriques Prometheus: latence par route et par statut, requêtes en cours,
+pool de connexions, requêtes SQL par requête HTTP, octets uploadés.
+
+Avec plusieurs workers uvicorn, PROMETHEUS_MULTIPROC_DIR (positionné par
+scripts/start_prod.py avant le lancement des workers) active le mode
+multiprocessus de prometheus_client: chaque worker écrit ses valeurs dans ce
+répertoire et /metrics agrège tous les workers, quel que soit celui qui répond.
+"""
+import os
+import time
+from fastapi import Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool, QueuePool
+from database import async_engine, engine, pool_wait_observers
+from instrumentation import RequestStats, instrument_engine as instrument_queries
+
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP (jusqu'aux en-têtes de réponse)",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress", "Requêtes HTTP en cours de traitement",
+    ["method"], multiprocess_mode="livesum"
+)
+http_request_db_queries = Histogram(
+    "http_request_db_queries", "Instructions SQL exécutées par requête HTTP",
+    ["route"], buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+)
+http_request_db_duration = Histogram(
+    "http_request_db_duration_seconds", "Temps passé en SQL par requête HTTP",
+    ["route"], buckets=LATENCY_BUCKETS
+)
+db_pool_connections = Gauge(
+    "db_pool_connections", "Connexions du pool par état",
+    ["engine", "state"], multiprocess_mode="livesum"
+)
+db_pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Attente pour obtenir une connexion du pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+db_pool_checkout_timeouts = Counter(
+    "db_pool_checkout_timeouts", "Checkouts abandonnés après pool_timeout"
+)
+upload_bytes = Counter(
+    "document_upload_bytes", "Octets reçus par les uploads de documents",
+    ["deduplicated"]
+)
+
+
+def _pool_gauges(engine_name: str, pool: Pool):
+    """Met à jour les jauges du pool à chaque checkout/checkin (valeurs du worker courant)"""
+    if not isinstance(pool, QueuePool):
+        return
+
+    def update(*_):
+        db_pool_connections.labels(engine_name, "checked_out").set(pool.checkedout())
+        db_pool_connections.labels(engine_name, "checked_in").set(pool.checkedin())
+        db_pool_connections.labels(engine_name, "overflow").set(max(pool.overflow(), 0))
+
+    for name in ("connect", "checkout", "checkin"):
+        event.listen(pool, name, update)
+
+
+def _observe_pool_wait(wait: float, timed_out: bool):
+    db_pool_checkout_wait.observe(wait)
+    if timed_out:
+        db_pool_checkout_timeouts.inc()
+
+
+def instrument_engine(engine_name: str, sync_engine: Engine):
+    instrument_queries(sync_engine)
+    _pool_gauges(engine_name, sync_engine.pool)
+
+
+instrument_engine("async", async_engine.sync_engine)
+instrument_engine("sync", engine)
+pool_wait_observers.append(_observe_pool_wait)
+
+
+# ======================= MIDDLEWARE / EXPOSITION ==========================
+
+def route_label(request: Request) -> str:
+    """Modèle de chemin de la route (/api/v1/projects/{project_id}): cardinalité bornée"""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+async def observe_request(request: Request, call_next, stats: RequestStats) -> Response:
+    """Mesure une requête HTTP (appelé par le middleware de main.py, dans track_queries)"""
+    method = request.method
+    in_progress = http_requests_in_progress.labels(method)
+    in_progress.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_progress.dec()
+        route = route_label(request)
+        http_request_duration.labels(method, route, str(status)).observe(time.perf_counter() - started)
+        http_request_db_queries.labels(route).observe(stats.queries)
+        http_request_db_duration.labels(route).observe(stats.db_seconds)
+
+
+def metrics_response() -> Response:
+    """Exposition texte Prometheus (tous les workers en mode multiprocessus)"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    # Content-Type fourni tel quel (il porte déjà le charset)
+    return Response(generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+def shutdown_metrics():
+    """Retire les jauges du worker qui s'arrête (mode multiprocessus)"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
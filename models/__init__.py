@@ -11,4 +11,5 @@ from .products import *
 from .projects import *
 from .manufacturing import *
 from .finance import *
-from .logistics import * 
\ No newline at end of file
+from .logistics import *
+from .reports import *
@@ -1,8 +1,9 @@
 """
 Modèles pour la gestion des documents
 """
-from sqlalchemy import Column, String, Text, BigInteger, DateTime, ForeignKey, Table
+from sqlalchemy import Column, String, Text, BigInteger, DateTime, ForeignKey, Table, Index
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 from database import Base
 from .base import TimestampMixin
 
@@ -12,7 +13,8 @@ document_tag_association = Table(
     'document_tag',
     Base.metadata,
     Column('id_document', BigInteger, ForeignKey('document.id_document'), primary_key=True),
-    Column('id_tag', BigInteger, ForeignKey('tag_document.id_tag'), primary_key=True)
+    Column('id_tag', BigInteger, ForeignKey('tag_document.id_tag'), primary_key=True),
+    Index('ix_document_tag_id_tag', 'id_tag')
 )
 
 
@@ -23,10 +25,26 @@ class Document(Base, TimestampMixin):
     id_document = Column(BigInteger, primary_key=True, autoincrement=True)
     file_path = Column(Text, nullable=False)
     mime_type = Column(Text)
+    filename = Column(Text)
     checksum = Column(Text)
+    sha256 = Column(Text)  # blob partagé dans document_blob
     size_bytes = Column(BigInteger)
     uploaded_by = Column(BigInteger, ForeignKey('employe.id_employe'))
     
     # Relations
     uploader = relationship("Employe", back_populates="uploaded_documents", foreign_keys=[uploaded_by])
-    tags = relationship("TagDocument", secondary=document_tag_association, back_populates="documents") 
\ No newline at end of file
+    tags = relationship("TagDocument", secondary=document_tag_association, back_populates="documents", lazy="selectin")
+
+    __table_args__ = (
+        Index('ix_document_sha256', 'sha256'),
+    )
+
+
+class DocumentBlob(Base):
+    """Contenu stocké une seule fois (adressé par SHA-256), partagé par les documents identiques"""
+    __tablename__ = "document_blob"
+
+    sha256 = Column(Text, primary_key=True)
+    size_bytes = Column(BigInteger, nullable=False)
+    ref_count = Column(BigInteger, nullable=False, default=0)  # documents pointant sur ce contenu
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False) 
\ No newline at end of file
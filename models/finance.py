@@ -1,7 +1,7 @@
 """
 Modèles pour la gestion financière
 """
-from sqlalchemy import Column, Text, BigInteger, ForeignKey, Numeric, DateTime, String, func, CheckConstraint
+from sqlalchemy import Column, Text, BigInteger, ForeignKey, Numeric, DateTime, String, func, CheckConstraint, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -24,6 +24,11 @@ class Account(Base):
 class LedgerLine(Base):
     """Modèle pour les lignes du grand livre (double-entrée)"""
     __tablename__ = "ledger_line"
+    __table_args__ = (
+        Index('ix_ledger_line_debit_account', 'debit_account', 'date_op', postgresql_include=['amount_minor']),
+        Index('ix_ledger_line_credit_account', 'credit_account', 'date_op', postgresql_include=['amount_minor']),
+        Index('ix_ledger_line_date_op', 'date_op', 'id_line', postgresql_include=['debit_account', 'credit_account', 'amount_minor']),
+    )
     
     id_line = Column(BigInteger, primary_key=True, autoincrement=True)
     debit_account = Column(BigInteger, ForeignKey('account.id_account'), nullable=False)
@@ -36,10 +41,10 @@ class LedgerLine(Base):
     memo = Column(Text)
     
     # Relations
-    debit_account_ref = relationship("Account", foreign_keys=[debit_account], back_populates="debit_lines")
-    credit_account_ref = relationship("Account", foreign_keys=[credit_account], back_populates="credit_lines")
+    debit_account_ref = relationship("Account", foreign_keys=[debit_account], back_populates="debit_lines", lazy="selectin")
+    credit_account_ref = relationship("Account", foreign_keys=[credit_account], back_populates="credit_lines", lazy="selectin")
     devise = relationship("Devise")
-    category = relationship("ExpenseCategory")
+    category = relationship("ExpenseCategory", lazy="selectin")
     expense_receipt = relationship("ExpenseReceipt", back_populates="ledger_line", uselist=False)
 
 
@@ -55,7 +60,7 @@ class CaisseProjet(Base):
     # Relations
     projet = relationship("Projet", back_populates="caisse")
     account = relationship("Account", back_populates="caisse_projet")
-    responsable = relationship("Employe")
+    responsable = relationship("Employe", lazy="selectin")
 
 
 class ExpenseReceipt(Base):
@@ -67,4 +72,22 @@ class ExpenseReceipt(Base):
     
     # Relations
     ledger_line = relationship("LedgerLine", back_populates="expense_receipt")
-    document = relationship("Document") 
\ No newline at end of file
+    document = relationship("Document")
+
+
+class AccountBalance(Base):
+    """Solde courant d'un compte (débit - crédit), maintenu à chaque ligne de grand livre"""
+    __tablename__ = "account_balance"
+    
+    id_account = Column(BigInteger, ForeignKey('account.id_account', ondelete='CASCADE'), primary_key=True)
+    balance_minor = Column(BigInteger, nullable=False, default=0)
+    last_date_op = Column(DateTime(timezone=True))
+
+
+class AccountBalanceSnapshot(Base):
+    """Solde de clôture d'un compte: lignes dont date_op < closed_at"""
+    __tablename__ = "account_balance_snapshot"
+    
+    id_account = Column(BigInteger, ForeignKey('account.id_account', ondelete='CASCADE'), primary_key=True)
+    closed_at = Column(DateTime(timezone=True), primary_key=True)
+    balance_minor = Column(BigInteger, nullable=False)
@@ -1,7 +1,7 @@
 """
 Modèles pour les ressources humaines
 """
-from sqlalchemy import Column, String, Text, BigInteger, DateTime, ForeignKey, Date, Numeric, Table
+from sqlalchemy import Column, String, Text, BigInteger, DateTime, ForeignKey, Date, Numeric, Table, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from .base import TimestampMixin
@@ -12,21 +12,24 @@ task_assignment_table = Table(
     'task_assignment',
     Base.metadata,
     Column('id_task', BigInteger, ForeignKey('task.id_task'), primary_key=True),
-    Column('id_employe', BigInteger, ForeignKey('employe.id_employe'), primary_key=True)
+    Column('id_employe', BigInteger, ForeignKey('employe.id_employe'), primary_key=True),
+    Index('ix_task_assignment_id_employe', 'id_employe')
 )
 
 task_dependency_table = Table(
     'task_dependency',
     Base.metadata,
     Column('id_parent_task', BigInteger, ForeignKey('task.id_task'), primary_key=True),
-    Column('id_child_task', BigInteger, ForeignKey('task.id_task'), primary_key=True)
+    Column('id_child_task', BigInteger, ForeignKey('task.id_task'), primary_key=True),
+    Index('ix_task_dependency_id_child_task', 'id_child_task')
 )
 
 task_document_table = Table(
     'task_document',
     Base.metadata,
     Column('id_task', BigInteger, ForeignKey('task.id_task'), primary_key=True),
-    Column('id_document', BigInteger, ForeignKey('document.id_document'), primary_key=True)
+    Column('id_document', BigInteger, ForeignKey('document.id_document'), primary_key=True),
+    Index('ix_task_document_id_document', 'id_document')
 )
 
 
@@ -52,7 +55,7 @@ class Employe(Base, TimestampMixin):
     is_active = Column(String(1), default="1")  # 1=actif, 0=inactif
     
     # Relations
-    fonction = relationship("FonctionEmploye")
+    fonction = relationship("FonctionEmploye", lazy="selectin")
     doc_cin = relationship("Document", foreign_keys=[id_doc_cin])
     doc_permis = relationship("Document", foreign_keys=[id_doc_permis])
     uploaded_documents = relationship("Document", back_populates="uploader", foreign_keys="Document.uploaded_by")
@@ -72,15 +75,15 @@ class Task(Base):
     date_echeance = Column(DateTime(timezone=True))
     
     # Relations
-    assignees = relationship("Employe", secondary=task_assignment_table, back_populates="assigned_tasks")
+    assignees = relationship("Employe", secondary=task_assignment_table, back_populates="assigned_tasks", lazy="selectin")
     parent_tasks = relationship("Task", 
                                secondary=task_dependency_table,
                                primaryjoin="Task.id_task == task_dependency.c.id_child_task",
                                secondaryjoin="Task.id_task == task_dependency.c.id_parent_task",
-                               back_populates="child_tasks")
+                               back_populates="child_tasks", lazy="selectin")
     child_tasks = relationship("Task", 
                               secondary=task_dependency_table,
                               primaryjoin="Task.id_task == task_dependency.c.id_parent_task",
                               secondaryjoin="Task.id_task == task_dependency.c.id_child_task",
-                              back_populates="parent_tasks")
+                              back_populates="parent_tasks", lazy="selectin")
     documents = relationship("Document", secondary=task_document_table) 
\ No newline at end of file
@@ -28,10 +28,10 @@ class Livraison(Base):
     id_livreur = Column(BigInteger, ForeignKey('employe.id_employe'))
     
     # Relations
-    move_out = relationship("StockMove", foreign_keys=[id_move_out])
-    move_in = relationship("StockMove", foreign_keys=[id_move_in])
-    statut = relationship("StatutLivraison")
-    livreur = relationship("Employe")
+    move_out = relationship("StockMove", foreign_keys=[id_move_out], lazy="selectin")
+    move_in = relationship("StockMove", foreign_keys=[id_move_in], lazy="selectin")
+    statut = relationship("StatutLivraison", lazy="selectin")
+    livreur = relationship("Employe", lazy="selectin")
 
 
 class SupplyRequest(Base):
@@ -45,10 +45,10 @@ class SupplyRequest(Base):
     id_demandeur = Column(BigInteger, ForeignKey('employe.id_employe'))
     
     # Relations
-    statut = relationship("StatutAppro")
-    demandeur = relationship("Employe")
-    produits = relationship("Produit", secondary=supply_request_product_table)
-    tracking_events = relationship("SupplyRequestTracking", back_populates="supply_request")
+    statut = relationship("StatutAppro", lazy="selectin")
+    demandeur = relationship("Employe", lazy="selectin")
+    produits = relationship("Produit", secondary=supply_request_product_table, lazy="selectin")
+    tracking_events = relationship("SupplyRequestTracking", back_populates="supply_request", lazy="selectin")
 
 
 class SupplyRequestTracking(Base):
@@ -63,4 +63,4 @@ class SupplyRequestTracking(Base):
     
     # Relations
     supply_request = relationship("SupplyRequest", back_populates="tracking_events")
-    statut = relationship("StatutAppro") 
\ No newline at end of file
+    statut = relationship("StatutAppro", lazy="selectin") 
\ No newline at end of file
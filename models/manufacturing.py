@@ -1,7 +1,7 @@
 """
 Modèles pour la gestion de la fabrication
 """
-from sqlalchemy import Column, Text, BigInteger, ForeignKey, Numeric, DateTime, String, Table, func, CheckConstraint
+from sqlalchemy import Column, Text, BigInteger, ForeignKey, Numeric, DateTime, String, Table, func, CheckConstraint, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -12,14 +12,16 @@ nomenclature_produit_table = Table(
     Base.metadata,
     Column('id_nomenclature', BigInteger, ForeignKey('nomenclature_fabrication.id_nomenclature'), primary_key=True),
     Column('id_produit', BigInteger, ForeignKey('produit.id_produit'), primary_key=True),
-    Column('quantite', Numeric(12, 3), nullable=False)
+    Column('quantite', Numeric(12, 3), nullable=False),
+    Index('ix_nomenclature_produit_id_produit', 'id_produit')
 )
 
 nomenclature_document_table = Table(
     'nomenclature_document',
     Base.metadata,
     Column('id_nomenclature', BigInteger, ForeignKey('nomenclature_fabrication.id_nomenclature'), primary_key=True),
-    Column('id_document', BigInteger, ForeignKey('document.id_document'), primary_key=True)
+    Column('id_document', BigInteger, ForeignKey('document.id_document'), primary_key=True),
+    Index('ix_nomenclature_document_id_document', 'id_document')
 )
 
 of_nomenclature_table = Table(
@@ -27,7 +29,8 @@ of_nomenclature_table = Table(
     Base.metadata,
     Column('id_of', BigInteger, ForeignKey('ordre_fabrication.id_of'), primary_key=True),
     Column('id_nomenclature', BigInteger, ForeignKey('nomenclature_fabrication.id_nomenclature'), primary_key=True),
-    Column('quantite', Numeric(12, 3), nullable=False)
+    Column('quantite', Numeric(12, 3), nullable=False),
+    Index('ix_of_nomenclature_id_nomenclature', 'id_nomenclature')
 )
 
 
@@ -40,7 +43,7 @@ class NomenclatureFabrication(Base):
     description_longue = Column(Text)
     
     # Relations
-    produits = relationship("Produit", secondary=nomenclature_produit_table)
+    produits = relationship("Produit", secondary=nomenclature_produit_table, lazy="selectin")
     documents = relationship("Document", secondary=nomenclature_document_table)
     ordres_fabrication = relationship("OrdreFabrication", secondary=of_nomenclature_table, back_populates="nomenclatures")
 
@@ -48,6 +51,9 @@ class NomenclatureFabrication(Base):
 class OrdreFabrication(Base):
     """Modèle pour les ordres de fabrication"""
     __tablename__ = "ordre_fabrication"
+    __table_args__ = (
+        Index('ix_ordre_fabrication_id_projet', 'id_projet'),
+    )
     
     id_of = Column(BigInteger, primary_key=True, autoincrement=True)
     date_creation = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -56,15 +62,18 @@ class OrdreFabrication(Base):
     id_projet = Column(BigInteger, ForeignKey('projet.id_projet'))
     
     # Relations
-    statut = relationship("StatutFabrication")
-    projet = relationship("Projet", back_populates="ordres_fabrication")
-    nomenclatures = relationship("NomenclatureFabrication", secondary=of_nomenclature_table, back_populates="ordres_fabrication")
+    statut = relationship("StatutFabrication", lazy="selectin")
+    projet = relationship("Projet", back_populates="ordres_fabrication", lazy="selectin")
+    nomenclatures = relationship("NomenclatureFabrication", secondary=of_nomenclature_table, back_populates="ordres_fabrication", lazy="selectin")
     documents = relationship("OFDocument", back_populates="ordre_fabrication")
 
 
 class OFDocument(Base):
     """Modèle pour les documents d'ordre de fabrication (photos avancement/réalisation)"""
     __tablename__ = "of_document"
+    __table_args__ = (
+        Index('ix_of_document_id_document', 'id_document'),
+    )
     
     id_of = Column(BigInteger, ForeignKey('ordre_fabrication.id_of'), primary_key=True)
     id_document = Column(BigInteger, ForeignKey('document.id_document'), primary_key=True)
@@ -72,4 +81,4 @@ class OFDocument(Base):
     
     # Relations
     ordre_fabrication = relationship("OrdreFabrication", back_populates="documents")
-    document = relationship("Document") 
\ No newline at end of file
+    document = relationship("Document", lazy="selectin") 
\ No newline at end of file
@@ -1,7 +1,7 @@
 """
 Modèles pour la gestion du matériel
 """
-from sqlalchemy import Column, BigInteger, ForeignKey, Table
+from sqlalchemy import Column, BigInteger, ForeignKey, Table, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -11,7 +11,8 @@ materiel_document_table = Table(
     'materiel_document',
     Base.metadata,
     Column('id_materiel', BigInteger, ForeignKey('materiel.id_materiel'), primary_key=True),
-    Column('id_document', BigInteger, ForeignKey('document.id_document'), primary_key=True)
+    Column('id_document', BigInteger, ForeignKey('document.id_document'), primary_key=True),
+    Index('ix_materiel_document_id_document', 'id_document')
 )
 
 
@@ -24,5 +25,5 @@ class Materiel(Base):
     
     # Relations
     facture = relationship("Document", foreign_keys=[id_facture])
-    documents = relationship("Document", secondary=materiel_document_table)
+    documents = relationship("Document", secondary=materiel_document_table, lazy="selectin")
     projets = relationship("Projet", secondary="projet_materiel", back_populates="materiel") 
\ No newline at end of file
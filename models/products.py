@@ -1,7 +1,7 @@
 """
 Modèles pour la gestion des produits et du stock
 """
-from sqlalchemy import Column, String, Text, BigInteger, ForeignKey, Numeric, DateTime, Table, func
+from sqlalchemy import Column, String, Text, BigInteger, ForeignKey, Numeric, DateTime, Table, func, Index, text
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -11,7 +11,8 @@ produit_fournisseur_table = Table(
     'produit_fournisseur',
     Base.metadata,
     Column('id_produit', BigInteger, ForeignKey('produit.id_produit'), primary_key=True),
-    Column('id_entreprise', BigInteger, ForeignKey('entreprise.id_entreprise'), primary_key=True)
+    Column('id_entreprise', BigInteger, ForeignKey('entreprise.id_entreprise'), primary_key=True),
+    Index('ix_produit_fournisseur_id_entreprise', 'id_entreprise')
 )
 
 
@@ -25,19 +26,22 @@ class Produit(Base):
     description = Column(Text)
     
     # Relations
-    fournisseurs = relationship("Entreprise", secondary=produit_fournisseur_table)
+    fournisseurs = relationship("Entreprise", secondary=produit_fournisseur_table, lazy="selectin")
     articles = relationship("Article", back_populates="produit")
 
 
 class Article(Base):
     """Modèle pour les articles (SKU)"""
     __tablename__ = "article"
+    __table_args__ = (
+        Index('ix_article_id_produit', 'id_produit'),
+    )
     
     id_article = Column(BigInteger, primary_key=True, autoincrement=True)
     id_produit = Column(BigInteger, ForeignKey('produit.id_produit'))
     
     # Relations
-    produit = relationship("Produit", back_populates="articles")
+    produit = relationship("Produit", back_populates="articles", lazy="selectin")
     stock_moves = relationship("StockMove", back_populates="article")
 
 
@@ -57,6 +61,12 @@ class Stock(Base):
 class StockMove(Base):
     """Modèle pour les mouvements de stock (double-entrée)"""
     __tablename__ = "stock_move"
+    __table_args__ = (
+        Index('ix_stock_move_src_stock', 'src_stock', 'date_move', postgresql_where=text('src_stock IS NOT NULL')),
+        Index('ix_stock_move_dst_stock', 'dst_stock', 'date_move', postgresql_where=text('dst_stock IS NOT NULL')),
+        Index('ix_stock_move_id_article', 'id_article', 'date_move'),
+        Index('ix_stock_move_date_move', 'date_move', 'id_move'),
+    )
     
     id_move = Column(BigInteger, primary_key=True, autoincrement=True)
     id_article = Column(BigInteger, ForeignKey('article.id_article'), nullable=False)
@@ -69,8 +79,17 @@ class StockMove(Base):
     ref_document = Column(BigInteger, ForeignKey('document.id_document'))
     
     # Relations
-    article = relationship("Article", back_populates="stock_moves")
-    source_stock = relationship("Stock", foreign_keys=[src_stock], back_populates="moves_out")
-    destination_stock = relationship("Stock", foreign_keys=[dst_stock], back_populates="moves_in")
+    article = relationship("Article", back_populates="stock_moves", lazy="selectin")
+    source_stock = relationship("Stock", foreign_keys=[src_stock], back_populates="moves_out", lazy="selectin")
+    destination_stock = relationship("Stock", foreign_keys=[dst_stock], back_populates="moves_in", lazy="selectin")
     devise = relationship("Devise")
-    document = relationship("Document") 
\ No newline at end of file
+    document = relationship("Document")
+
+
+class StockBalance(Base):
+    """Solde courant par (stock, article), maintenu à chaque mouvement de stock"""
+    __tablename__ = "stock_balance"
+    
+    id_stock = Column(BigInteger, ForeignKey('stock.id_stock', ondelete='CASCADE'), primary_key=True)
+    id_article = Column(BigInteger, ForeignKey('article.id_article', ondelete='CASCADE'), primary_key=True)
+    qty = Column(Numeric(14, 3), nullable=False, default=0)
@@ -1,7 +1,7 @@
 """
 Modèles pour la gestion des projets
 """
-from sqlalchemy import Column, Text, BigInteger, ForeignKey, Date, Table
+from sqlalchemy import Column, Text, BigInteger, ForeignKey, Date, Table, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -11,21 +11,24 @@ projet_voiture_table = Table(
     'projet_voiture',
     Base.metadata,
     Column('id_projet', BigInteger, ForeignKey('projet.id_projet'), primary_key=True),
-    Column('id_voiture', BigInteger, ForeignKey('voiture.id_voiture'), primary_key=True)
+    Column('id_voiture', BigInteger, ForeignKey('voiture.id_voiture'), primary_key=True),
+    Index('ix_projet_voiture_id_voiture', 'id_voiture')
 )
 
 projet_materiel_table = Table(
     'projet_materiel',
     Base.metadata,
     Column('id_projet', BigInteger, ForeignKey('projet.id_projet'), primary_key=True),
-    Column('id_materiel', BigInteger, ForeignKey('materiel.id_materiel'), primary_key=True)
+    Column('id_materiel', BigInteger, ForeignKey('materiel.id_materiel'), primary_key=True),
+    Index('ix_projet_materiel_id_materiel', 'id_materiel')
 )
 
 projet_document_table = Table(
     'projet_document',
     Base.metadata,
     Column('id_projet', BigInteger, ForeignKey('projet.id_projet'), primary_key=True),
-    Column('id_document', BigInteger, ForeignKey('document.id_document'), primary_key=True)
+    Column('id_document', BigInteger, ForeignKey('document.id_document'), primary_key=True),
+    Index('ix_projet_document_id_document', 'id_document')
 )
 
 
@@ -38,13 +41,17 @@ class SiteClient(Base):
     id_client = Column(BigInteger, ForeignKey('entreprise.id_entreprise'))
     
     # Relations
-    client = relationship("Entreprise")
+    client = relationship("Entreprise", lazy="selectin")
     projets = relationship("Projet", back_populates="site_client")
 
 
 class Projet(Base):
     """Modèle pour les projets"""
     __tablename__ = "projet"
+    __table_args__ = (
+        Index('ix_projet_id_site_client', 'id_site_client'),
+        Index('ix_projet_id_chef_chantier', 'id_chef_chantier'),
+    )
     
     id_projet = Column(BigInteger, primary_key=True, autoincrement=True)
     adresse = Column(Text)
@@ -54,11 +61,11 @@ class Projet(Base):
     id_icone = Column(BigInteger, ForeignKey('document.id_document'))
     
     # Relations
-    site_client = relationship("SiteClient", back_populates="projets")
-    chef_chantier = relationship("Employe", back_populates="managed_projects")
+    site_client = relationship("SiteClient", back_populates="projets", lazy="selectin")
+    chef_chantier = relationship("Employe", back_populates="managed_projects", lazy="selectin")
     icone = relationship("Document")
-    voitures = relationship("Voiture", secondary=projet_voiture_table, back_populates="projets")
-    materiel = relationship("Materiel", secondary=projet_materiel_table, back_populates="projets")
+    voitures = relationship("Voiture", secondary=projet_voiture_table, back_populates="projets", lazy="selectin")
+    materiel = relationship("Materiel", secondary=projet_materiel_table, back_populates="projets", lazy="selectin")
     documents = relationship("Document", secondary=projet_document_table)
-    caisse = relationship("CaisseProjet", back_populates="projet", uselist=False)
+    caisse = relationship("CaisseProjet", back_populates="projet", uselist=False, lazy="selectin")
     ordres_fabrication = relationship("OrdreFabrication", back_populates="projet") 
\ No newline at end of file
@@ -0,0 +1,28 @@
+"""
+Modèles pour les rapports générés en tâche de fond
+"""
+from sqlalchemy import Column, Text, BigInteger, ForeignKey, DateTime, String, func, Index, text
+from database import Base
+
+
+class ReportJob(Base):
+    """Demande de rapport: statut de génération et fichier produit dans reports/"""
+    __tablename__ = "report_job"
+    __table_args__ = (
+        Index('ix_report_job_cache_key', 'cache_key'),
+        Index('ix_report_job_pending', 'id_job', postgresql_where=text("status = 'PENDING'")),
+    )
+    
+    id_job = Column(BigInteger, primary_key=True, autoincrement=True)
+    report_type = Column(Text, nullable=False)
+    params = Column(Text, nullable=False)  # JSON canonique (clés triées)
+    watermark = Column(Text, nullable=False)  # état des données au moment de la demande
+    cache_key = Column(String(64), nullable=False)  # SHA-256(type, params, watermark)
+    status = Column(Text, nullable=False, default="PENDING")  # CHECK status IN (...) dans le SQL
+    file_path = Column(Text)
+    size_bytes = Column(BigInteger)
+    error = Column(Text)
+    requested_by = Column(BigInteger, ForeignKey('employe.id_employe'))
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
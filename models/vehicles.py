@@ -1,7 +1,7 @@
 """
 Modèles pour la gestion du parc de véhicules
 """
-from sqlalchemy import Column, String, Text, BigInteger, ForeignKey, Date, Numeric
+from sqlalchemy import Column, String, Text, BigInteger, ForeignKey, Date, Numeric, Index, text
 from sqlalchemy.orm import relationship
 from database import Base
 from .base import TimestampMixin
@@ -21,8 +21,8 @@ class Voiture(Base, TimestampMixin):
     # Relations
     carte_grise = relationship("Document", foreign_keys=[id_carte_grise])
     assurance = relationship("Document", foreign_keys=[id_assurance])
-    km_logs = relationship("VoitureKmLog", back_populates="voiture")
-    conducteurs = relationship("VoitureConducteur", back_populates="voiture")
+    km_logs = relationship("VoitureKmLog", back_populates="voiture", lazy="selectin")
+    conducteurs = relationship("VoitureConducteur", back_populates="voiture", lazy="selectin")
     projets = relationship("Projet", secondary="projet_voiture", back_populates="voitures")
 
 
@@ -41,6 +41,10 @@ class VoitureKmLog(Base):
 class VoitureConducteur(Base):
     """Modèle pour l'assignation des conducteurs aux véhicules"""
     __tablename__ = "voiture_conducteur"
+    __table_args__ = (
+        Index('ix_voiture_conducteur_active', 'id_voiture', postgresql_where=text('date_fin IS NULL')),
+        Index('ix_voiture_conducteur_id_employe', 'id_employe'),
+    )
     
     id_voiture = Column(BigInteger, ForeignKey('voiture.id_voiture'), primary_key=True)
     id_employe = Column(BigInteger, ForeignKey('employe.id_employe'), primary_key=True)
@@ -49,4 +53,4 @@ class VoitureConducteur(Base):
     
     # Relations
     voiture = relationship("Voiture", back_populates="conducteurs")
-    employe = relationship("Employe", back_populates="vehicle_assignments") 
\ No newline at end of file
+    employe = relationship("Employe", back_populates="vehicle_assignments", lazy="selectin") 
\ No newline at end of file
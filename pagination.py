@@ -0,0 +1,219 @@
+"""
+Pagination des listes: offset classique ou curseur opaque (keyset)
+"""
+import base64
+import binascii
+import json
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, Response, status
+from sqlalchemy import DateTime, Select, Table, bindparam, func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from schemas.common import PaginationParams, PaginatedResponse
+
+# En-tête portant le curseur de la page suivante pour les listes simples
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Format commun des dates-heures comparées en texte par SQLite
+SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%f"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode les valeurs de la clé de tri de la dernière ligne en curseur opaque"""
+    payload = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence[Any]) -> List[Any]:
+    """Décode un curseur en valeurs typées selon les colonnes de tri"""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(raw, list) or len(raw) != len(columns):
+            raise ValueError("cursor does not match sort key")
+        values = []
+        for column, value in zip(columns, raw):
+            python_type = column.type.python_type
+            if value is not None and python_type in (datetime, date):
+                value = python_type.fromisoformat(value)
+            values.append(value)
+        return values
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+
+def _sort_key(dialect_name: str, column: Any, expr: Any) -> Any:
+    """
+    Expression comparée au curseur pour `column`. SQLite stocke les dates-heures
+    en texte, sans fraction pour le défaut serveur (CURRENT_TIMESTAMP), avec
+    microsecondes pour les valeurs liées: les deux côtés sont ramenés au même
+    format pour que l'ordre du texte soit l'ordre chronologique.
+    """
+    if dialect_name == "sqlite" and isinstance(column.type, DateTime):
+        return func.strftime(SQLITE_DATETIME_FORMAT, expr)
+    return expr
+
+
+async def fetch_page(
+    db: AsyncSession,
+    stmt: Select,
+    pagination: PaginationParams,
+    *columns,
+    descending: bool = False,
+    response: Optional[Response] = None
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Exécute une requête paginée triée sur `columns` (la dernière doit être unique,
+    typiquement la clé primaire).
+    Avec un curseur, la page est lue par comparaison de clé (keyset): le coût
+    reste constant quelle que soit la profondeur. Sans curseur, offset classique.
+    Retourne (éléments, curseur suivant) et renseigne l'en-tête X-Next-Cursor.
+    """
+    dialect_name = db.bind.dialect.name
+    keys = [_sort_key(dialect_name, column, column) for column in columns]
+    stmt = stmt.order_by(*[key.desc() if descending else key.asc() for key in keys])
+
+    if pagination.cursor:
+        values = decode_cursor(pagination.cursor, columns)
+        bounds = [
+            _sort_key(dialect_name, column, bindparam(None, value, type_=column.type))
+            for column, value in zip(columns, values)
+        ]
+        if len(columns) == 1:
+            key, bound = keys[0], bounds[0]
+        else:
+            key, bound = tuple_(*keys), tuple_(*bounds)
+        stmt = stmt.where(key < bound if descending else key > bound)
+    else:
+        stmt = stmt.offset(pagination.offset)
+
+    # Une ligne de plus pour savoir s'il existe une page suivante
+    items = (await db.scalars(stmt.limit(pagination.limit + 1))).all()
+
+    next_cursor = None
+    if len(items) > pagination.limit:
+        items = items[:pagination.limit]
+        next_cursor = encode_cursor([getattr(items[-1], column.key) for column in columns])
+        if response is not None:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return items, next_cursor
+
+
+class CountCache:
+    """
+    Cache en mémoire (par worker) des totaux de pagination, avec TTL court.
+    La clé est la requête de comptage compilée avec ses paramètres.
+    """
+
+    def __init__(self, ttl: int, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[int]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, total = entry
+        if expires_at < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return total
+
+    def set(self, key: str, total: int):
+        if self.ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, total)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+count_cache = CountCache(ttl=settings.count_cache_ttl, max_size=settings.count_cache_max_size)
+
+
+def _count_cache_key(stmt: Select) -> str:
+    compiled = stmt.compile()
+    return f"{compiled}|{sorted(compiled.params.items())!r}"
+
+
+async def _estimate_total(db: AsyncSession, stmt: Select) -> Optional[int]:
+    """
+    Estimation à partir des statistiques du planificateur (pg_class.reltuples).
+    Uniquement pour une requête non filtrée sur une seule table PostgreSQL.
+    """
+    if db.bind.dialect.name != "postgresql" or stmt.whereclause is not None:
+        return None
+    froms = stmt.get_final_froms()
+    if len(froms) != 1 or not isinstance(froms[0], Table):
+        return None
+    estimate = await db.scalar(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": froms[0].name}
+    )
+    # reltuples vaut -1 tant que la table n'a jamais été analysée
+    if estimate is None or estimate < 0:
+        return None
+    return estimate
+
+
+async def count_total(
+    db: AsyncSession,
+    stmt: Select,
+    pagination: PaginationParams
+) -> Tuple[Optional[int], bool]:
+    """
+    Total d'éléments selon pagination.total_mode.
+    Retourne (total, estimé); total est None si include_total=false.
+    """
+    if not pagination.include_total:
+        return None, False
+
+    if pagination.total_mode == "estimate":
+        estimate = await _estimate_total(db, stmt)
+        if estimate is not None:
+            return estimate, True
+
+    count_stmt = select(func.count()).select_from(stmt.order_by(None).subquery())
+    if pagination.total_mode == "exact":
+        return await db.scalar(count_stmt), False
+
+    # Mode "cached" (et repli du mode "estimate" quand aucune statistique n'est disponible)
+    key = _count_cache_key(count_stmt)
+    total = count_cache.get(key)
+    if total is None:
+        total = await db.scalar(count_stmt)
+        count_cache.set(key, total)
+    return total, False
+
+
+async def fetch_paginated(
+    db: AsyncSession,
+    stmt: Select,
+    pagination: PaginationParams,
+    *columns,
+    descending: bool = False
+) -> PaginatedResponse:
+    """Page d'éléments avec total (exact, en cache, estimé ou omis) et curseur suivant"""
+    total, estimated = await count_total(db, stmt, pagination)
+    items, next_cursor = await fetch_page(db, stmt, pagination, *columns, descending=descending)
+
+    return PaginatedResponse(
+        items=items,
+        total=total,
+        page=pagination.page,
+        page_size=pagination.page_size,
+        total_pages=(total + pagination.page_size - 1) // pagination.page_size if total is not None else None,
+        total_estimated=estimated,
+        next_cursor=next_cursor
+    )
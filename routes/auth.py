@@ -4,9 +4,10 @@ Routes pour l'authentification
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
-from database import get_db
-from auth import verify_password, create_access_token, get_password_hash
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from auth import verify_and_update_password, create_access_token, get_password_hash_async
 from schemas.auth import LoginRequest, TokenResponse, RefreshTokenRequest, CreateUserRequest
 from schemas.common import ResponseMessage
 from config import settings
@@ -19,17 +20,17 @@ security = HTTPBearer()
 @router.post("/login", response_model=TokenResponse)
 async def login(
     login_data: LoginRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Connexion avec email et mot de passe
     Retourne un token JWT d'accès
     """
     # Récupérer l'utilisateur depuis la base de données
-    user = db.query(Employe).filter(
+    user = await db.scalar(select(Employe).where(
         Employe.email == login_data.email,
         Employe.is_active == "1"
-    ).first()
+    ))
     
     if not user or not user.password_hash:
         raise HTTPException(
@@ -39,12 +40,18 @@ async def login(
         )
     
     # Vérifier le mot de passe
-    if not verify_password(login_data.password, user.password_hash):
+    password_valid, new_hash = await verify_and_update_password(login_data.password, user.password_hash)
+    if not password_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    
+    # Re-hachage transparent si le facteur de coût a changé
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
 
     # Créer le token JWT
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
@@ -67,7 +74,7 @@ async def login(
 @router.post("/refresh", response_model=TokenResponse)
 async def refresh_token(
     refresh_data: RefreshTokenRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Renouvellement du token d'accès
@@ -83,13 +90,13 @@ async def refresh_token(
 @router.post("/register", response_model=ResponseMessage, status_code=status.HTTP_201_CREATED)
 async def register_user(
     user_data: CreateUserRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Création d'un nouvel utilisateur (admin seulement)
     """
     # Vérifier que l'email n'existe pas déjà
-    existing_user = db.query(Employe).filter(Employe.email == user_data.email).first()
+    existing_user = await db.scalar(select(Employe).where(Employe.email == user_data.email))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -97,7 +104,7 @@ async def register_user(
         )
     
     # Hasher le mot de passe
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     
     # Créer l'utilisateur
     new_user = Employe(
@@ -111,8 +118,8 @@ async def register_user(
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     return ResponseMessage(
         message=f"User {user_data.email} created successfully",
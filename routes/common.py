@@ -2,22 +2,22 @@
 Routes communes
 """
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
 from sqlalchemy import text
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, get_pool_status
 from schemas.common import ResponseMessage
 
 router = APIRouter(tags=["Common"])
 
 
 @router.get("/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     """
     Vérification de l'état de l'API et de la base de données
     """
     try:
         # Test de connexion à la base de données
-        result = db.execute(text("SELECT 1"))
+        result = await db.execute(text("SELECT 1"))
         result.fetchone()
         
         return {
@@ -30,4 +30,12 @@ async def health_check(db: Session = Depends(get_db)):
             "status": "unhealthy",
             "database": "disconnected",
             "error": str(e)
-        } 
\ No newline at end of file
+        }
+
+
+@router.get("/health/pool")
+async def pool_status():
+    """
+    Statistiques en direct du pool de connexions (worker courant)
+    """
+    return get_pool_status()
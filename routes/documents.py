@@ -2,73 +2,97 @@
 Routes pour la gestion des documents
 """
 import os
-import hashlib
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
-from database import get_db
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal, get_async_db
 from auth import get_current_user
 from schemas.documents import *
 from schemas.common import ResponseMessage
-from models.documents import Document
+from models.documents import Document, document_tag_association
 from models.referentiels import TagDocument
-from config import settings
+from services.associations import find_missing_ids, insert_links, unique_ids
+from services.downloads import file_response, signed_download_url, verify_download_signature
+from services.images import DERIVATIVE_MIME_TYPE, derivative_path, image_derivatives, is_image
+from services.storage import (
+    FileTooLargeError, UploadSizeLimitRoute, discard_upload, purge_released_file, release_document_file,
+    save_upload
+)
 
-router = APIRouter(prefix="/api/v1/documents", tags=["Documents"])
+# Corps des requêtes borné avant l'analyse multipart (uploads trop gros rejetés tôt)
+router = APIRouter(prefix="/api/v1/documents", tags=["Documents"], route_class=UploadSizeLimitRoute)
+
+
+def document_metadata(document: Document) -> DocumentMetadata:
+    """Métadonnées avec URLs signées (original et miniature pour les images)"""
+    signed_url = signed_download_url(document.id_document)
+    return DocumentMetadata(
+        id_document=document.id_document,
+        filename=document.filename,
+        mime_type=document.mime_type,
+        size_bytes=document.size_bytes,
+        sha256=document.sha256,
+        signed_url=signed_url,
+        thumbnail_url=f"{signed_url}&size=thumb" if is_image(document.mime_type) else None
+    )
 
 
 @router.post("/", response_model=DocumentUploadResponse, status_code=status.HTTP_201_CREATED)
 async def upload_document(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """
     Upload d'un fichier (multipart/form-data)
+    Requête rejetée (413) dès que le corps dépasse la taille maximale, avant
+    l'analyse du formulaire; le fichier est ensuite écrit par blocs.
+    Un contenu déjà stocké (même SHA-256) n'est pas réécrit.
     """
-    # Vérifier la taille du fichier
-    file_content = await file.read()
-    file_size = len(file_content)
-    
-    if file_size > settings.max_file_size:
+    try:
+        stored = await save_upload(db, file)
+    except FileTooLargeError as e:
         raise HTTPException(
             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File too large. Max size: {settings.max_file_size} bytes"
+            detail=str(e)
         )
     
-    # Calculer le checksum
-    checksum = hashlib.md5(file_content).hexdigest()
-    
-    # Créer le répertoire d'upload s'il n'existe pas
-    os.makedirs(settings.upload_dir, exist_ok=True)
-    
-    # Générer un nom de fichier unique
-    filename = f"{checksum}_{file.filename}"
-    file_path = os.path.join(settings.upload_dir, filename)
-    
-    # Sauvegarder le fichier
-    with open(file_path, "wb") as f:
-        f.write(file_content)
-    
     # Créer l'enregistrement en base
     document = Document(
-        file_path=file_path,
+        file_path=stored.file_path,
+        filename=stored.filename,
         mime_type=file.content_type,
-        size_bytes=file_size,
-        checksum=checksum,
+        size_bytes=stored.size_bytes,
+        checksum=stored.md5,
+        sha256=stored.sha256,
         uploaded_by=current_user.id_employe
     )
     
     db.add(document)
-    db.commit()
-    db.refresh(document)
+    try:
+        await db.commit()
+    except BaseException:
+        # Blob placé mais document non enregistré: pas de fichier orphelin
+        await db.rollback()
+        await discard_upload(db, stored)
+        raise
+    await db.refresh(document)
+    
+    # Miniature et taille web générées en tâche de fond (images)
+    image_derivatives.schedule(document.file_path, document.mime_type)
     
     return DocumentUploadResponse(
         id_document=document.id_document,
         file_path=document.file_path,
+        filename=document.filename,
         mime_type=document.mime_type,
         size_bytes=document.size_bytes,
         checksum=document.checksum,
+        sha256=document.sha256,
+        deduplicated=stored.deduplicated,
         upload_url=f"/api/v1/documents/{document.id_document}"
     )
 
@@ -76,27 +100,98 @@ async def upload_document(
 @router.get("/{document_id}", response_model=DocumentMetadata)
 async def get_document_metadata(
     document_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """
     Métadonnées et URL signée pour un document
     """
-    document = db.query(Document).filter(Document.id_document == document_id).first()
+    document = await db.scalar(select(Document).where(Document.id_document == document_id))
     if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Document not found"
         )
     
-    # TODO: Générer une URL signée pour l'accès sécurisé
-    signed_url = f"/api/v1/documents/{document_id}/download"
+    return document_metadata(document)
+
+
+@router.get("/by-checksum/{sha256}", response_model=List[DocumentMetadata])
+async def get_documents_by_checksum(
+    sha256: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Documents ayant ce contenu (SHA-256), pour éviter un upload déjà stocké
+    """
+    documents = (await db.scalars(
+        select(Document).where(Document.sha256 == sha256.lower()).order_by(Document.id_document)
+    )).all()
+    if not documents:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No document with this checksum"
+        )
     
-    return DocumentMetadata(
-        id_document=document.id_document,
-        mime_type=document.mime_type,
-        size_bytes=document.size_bytes,
-        signed_url=signed_url
+    return [document_metadata(document) for document in documents]
+
+
+@router.api_route("/{document_id}/download", methods=["GET", "HEAD"], response_class=Response)
+async def download_document(
+    document_id: int,
+    request: Request,
+    expires: int = Query(..., description="Expiration de l'URL signée (timestamp Unix)"),
+    sig: str = Query(..., description="Signature HMAC de l'URL"),
+    size: Optional[Literal["thumb", "web"]] = Query(None, description="Déclinaison d'une image (miniature, taille web)"),
+):
+    """
+    Téléchargement par URL signée (obtenue via GET /documents/{id})
+    Supporte Range (206), ETag/If-None-Match (304) et HEAD.
+    Avec size, une image est servie dans sa déclinaison WebP (générée si absente).
+    """
+    if not verify_download_signature(document_id, expires, sig):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or expired download URL"
+        )
+    
+    # Session courte: la connexion est rendue au pool avant l'envoi du fichier
+    async with AsyncSessionLocal() as db:
+        document = await db.scalar(select(Document).where(Document.id_document == document_id))
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    
+    try:
+        stat_result = await run_in_threadpool(os.stat, document.file_path)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document file not found"
+        )
+    
+    etag = document.sha256 or document.checksum or f"{stat_result.st_mtime_ns}-{stat_result.st_size}"
+    if size and is_image(document.mime_type) and await image_derivatives.ensure(document.file_path):
+        path = derivative_path(document.file_path, size)
+        return file_response(
+            request,
+            path,
+            await run_in_threadpool(os.stat, path),
+            etag=f"{etag}-{size}",
+            media_type=DERIVATIVE_MIME_TYPE,
+            filename=None
+        )
+    
+    return file_response(
+        request,
+        document.file_path,
+        stat_result,
+        etag=etag,
+        media_type=document.mime_type,
+        filename=document.filename
     )
 
 
@@ -104,30 +199,40 @@ async def get_document_metadata(
 async def delete_document(
     document_id: int,
     force: bool = False,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """
     Suppression (soft delete par défaut, hard delete avec ?force=true)
     """
-    document = db.query(Document).filter(Document.id_document == document_id).first()
+    document = await db.scalar(select(Document).where(Document.id_document == document_id))
     if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Document not found"
         )
     
+    released = None
     if force:
-        # Hard delete - supprimer le fichier et l'enregistrement
-        if os.path.exists(document.file_path):
-            os.remove(document.file_path)
-        db.delete(document)
+        # Hard delete - supprimer l'enregistrement, le blob avec sa dernière référence
+        released = await release_document_file(db, document)
+        await db.delete(document)
     else:
         # Soft delete - marquer comme supprimé
         # TODO: Ajouter un champ deleted_at dans le modèle
         pass
     
-    db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Document encore référencé (mouvement de stock, dépense, projet...): fichier conservé
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Document {document_id} is still referenced"
+        )
+    # Fichier supprimé seulement une fois la suppression du document validée
+    await purge_released_file(db, released)
     
     return ResponseMessage(
         message=f"Document {document_id} deleted successfully",
@@ -139,36 +244,32 @@ async def delete_document(
 async def attach_tags(
     document_id: int,
     tag_request: AttachTagRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """
-    Attacher des tags à un document
+    Attacher des tags à un document (liens existants ignorés)
     """
-    document = db.query(Document).filter(Document.id_document == document_id).first()
-    if not document:
+    if not await db.scalar(select(Document.id_document).where(Document.id_document == document_id)):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Document not found"
         )
     
     # Vérifier que tous les tags existent
-    tags = db.query(TagDocument).filter(TagDocument.id_tag.in_(tag_request.tag_ids)).all()
-    if len(tags) != len(tag_request.tag_ids):
+    tag_ids = unique_ids(tag_request.tag_ids)
+    if await find_missing_ids(db, TagDocument.id_tag, tag_ids):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="One or more tags not found"
         )
     
     # Attacher les tags
-    for tag in tags:
-        if tag not in document.tags:
-            document.tags.append(tag)
-    
-    db.commit()
+    attached = await insert_links(db, document_tag_association, "id_document", document_id, "id_tag", tag_ids)
+    await db.commit()
     
     return ResponseMessage(
-        message=f"Tags attached to document {document_id}",
+        message=f"Tags attached to document {document_id} ({attached} new)",
         success=True
     )
 
@@ -177,20 +278,20 @@ async def attach_tags(
 async def detach_tag(
     document_id: int,
     tag_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """
     Détacher un tag d'un document
     """
-    document = db.query(Document).filter(Document.id_document == document_id).first()
+    document = await db.scalar(select(Document).where(Document.id_document == document_id))
     if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Document not found"
         )
     
-    tag = db.query(TagDocument).filter(TagDocument.id_tag == tag_id).first()
+    tag = await db.scalar(select(TagDocument).where(TagDocument.id_tag == tag_id))
     if not tag:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -199,7 +300,7 @@ async def detach_tag(
     
     if tag in document.tags:
         document.tags.remove(tag)
-        db.commit()
+        await db.commit()
     
     return ResponseMessage(
         message=f"Tag {tag_id} detached from document {document_id}",
@@ -0,0 +1,36 @@
+"""
+Routes d'export des tables volumineuses (CSV, NDJSON, Parquet)
+"""
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from dependencies import get_filter_params, require_authenticated_user
+from schemas.common import FilterParams
+from services.exports import MEDIA_TYPES, ExportFormatUnavailable, export_filename, stream_export
+
+router = APIRouter(prefix="/api/v1", tags=["Exports"])
+
+
+@router.get("/exports/{dataset}", response_class=StreamingResponse)
+async def export_dataset(
+    dataset: Literal["ledger_line", "stock_move", "voiture_km_log"],
+    format: Literal["csv", "ndjson", "parquet"] = Query("csv", description="Format du fichier"),
+    gzip: bool = Query(False, description="Compresser en gzip (CSV, NDJSON)"),
+    filters: FilterParams = Depends(get_filter_params),
+    current_user=Depends(require_authenticated_user)
+):
+    """
+    Exporter une table en flux (curseur serveur, mémoire constante), filtrée sur
+    sa date (date_op, date_move, date_releve) entre date_from et date_to inclus
+    """
+    try:
+        content = stream_export(dataset, format, gzip, filters.date_from, filters.date_to)
+    except ExportFormatUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    compressed = gzip and format != "parquet"
+    return StreamingResponse(
+        content,
+        media_type="application/gzip" if compressed else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(dataset, format, gzip)}"'}
+    )
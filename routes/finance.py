@@ -1,36 +1,55 @@
 """
 Routes pour la gestion financière
 """
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
+import logging
+from typing import Dict, List, Optional
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from dependencies import get_pagination_params, require_authenticated_user
-from schemas.common import PaginationParams, ResponseMessage
+from instrumentation import query_budget
+from loading import response_options
+from pagination import fetch_page
+from serialization import schema_response
+from config import settings
+from services.ledger import (
+    apply_ledger_line, apply_ledger_lines, get_last_closing, ledger_line_reference_errors
+)
+from services.reference import reference_sets
+from services.reports import profit_loss, trial_balance
+from schemas.common import BatchResult, BatchRowError, PaginationParams, ResponseMessage
 from schemas.finance import *
 from models.finance import Account, LedgerLine
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/v1", tags=["Finance"])
 
 
 # ======================= COMPTES DU GRAND LIVRE ==========================
 
 @router.get("/ledger/accounts", response_model=List[AccountResponse])
+@query_budget(2)
 async def list_accounts(
+    response: Response,
     pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des comptes du grand livre (readonly sauf admin)"""
-    skip = (pagination.page - 1) * pagination.page_size
-    accounts = db.query(Account).offset(skip).limit(pagination.page_size).all()
-    return accounts
+    accounts, _ = await fetch_page(
+        db, select(Account), pagination, Account.id_account, response=response
+    )
+    return schema_response(List[AccountResponse], accounts, response)
 
 
 @router.post("/ledger/accounts", response_model=AccountResponse, status_code=status.HTTP_201_CREATED)
 async def create_account(
     account_data: AccountCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer un nouveau compte (admin seulement)"""
@@ -38,19 +57,20 @@ async def create_account(
     
     account = Account(**account_data.model_dump())
     db.add(account)
-    db.commit()
-    db.refresh(account)
+    await db.commit()
+    await db.refresh(account)
+    await reference_sets.changed(db, "accounts")
     return account
 
 
 @router.get("/ledger/accounts/{account_id}", response_model=AccountResponse)
 async def get_account(
     account_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer un compte par ID"""
-    account = db.query(Account).filter(Account.id_account == account_id).first()
+    account = await db.scalar(select(Account).where(Account.id_account == account_id))
     if not account:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -64,19 +84,19 @@ async def get_account(
 @router.post("/ledger/lines", response_model=LedgerLineResponse, status_code=status.HTTP_201_CREATED)
 async def create_ledger_line(
     line_data: LedgerLineCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer une ligne de grand livre générique (flux non-caisse)"""
     # Vérifier que les comptes existent
-    debit_account = db.query(Account).filter(Account.id_account == line_data.debit_account).first()
+    debit_account = await db.scalar(select(Account).where(Account.id_account == line_data.debit_account))
     if not debit_account:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Debit account not found"
         )
     
-    credit_account = db.query(Account).filter(Account.id_account == line_data.credit_account).first()
+    credit_account = await db.scalar(select(Account).where(Account.id_account == line_data.credit_account))
     if not credit_account:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -92,8 +112,7 @@ async def create_ledger_line(
     
     # Vérifier la catégorie si spécifiée
     if line_data.id_cat:
-        from models.referentiels import ExpenseCategory
-        category = db.query(ExpenseCategory).filter(ExpenseCategory.id_cat == line_data.id_cat).first()
+        category = await reference_sets.expense_categories.find(db, line_data.id_cat)
         if not category:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -102,19 +121,97 @@ async def create_ledger_line(
     
     ledger_line = LedgerLine(**line_data.model_dump())
     db.add(ledger_line)
-    db.commit()
-    db.refresh(ledger_line)
+    await apply_ledger_line(db, ledger_line)
+    await db.commit()
+    await db.refresh(ledger_line)
     return ledger_line
 
 
+def journal_reference_errors(response: Response, errors: Dict[int, List[str]]) -> BatchResult:
+    """Réponse 422 avec les erreurs de référence par ligne"""
+    response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    return BatchResult(
+        inserted=0,
+        errors=[BatchRowError(index=index, errors=messages) for index, messages in sorted(errors.items())]
+    )
+
+
+@router.post("/ledger/journal", response_model=BatchResult, status_code=status.HTTP_201_CREATED)
+async def post_journal_entry(
+    entry: JournalEntryCreate,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(require_authenticated_user)
+):
+    """
+    Poster une écriture de journal (paie, clôture mensuelle...): toutes les lignes
+    ou aucune. Références validées contre les ensembles en cache, erreurs par ligne (422).
+    """
+    if len(entry.lines) > settings.batch_max_rows:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many lines. Max lines per journal entry: {settings.batch_max_rows}"
+        )
+    
+    date_op = entry.date_op or datetime.now(timezone.utc)
+    if date_op.tzinfo is None:
+        date_op = date_op.replace(tzinfo=timezone.utc)
+    last_closing = await get_last_closing(db)
+    if last_closing is not None and date_op <= last_closing.replace(tzinfo=last_closing.tzinfo or timezone.utc):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Ledger closed at {last_closing.isoformat()}"
+        )
+    
+    reference_errors = await ledger_line_reference_errors(db, list(enumerate(entry.lines)))
+    if reference_errors:
+        return journal_reference_errors(response, reference_errors)
+    
+    rows = [
+        {**line.model_dump(), "memo": line.memo or entry.memo, "date_op": date_op}
+        for line in entry.lines
+    ]
+    # INSERT Core multi-lignes (insertmanyvalues), sans passer par l'unité de travail ORM
+    table = LedgerLine.__table__
+    try:
+        result = await db.execute(
+            insert(table).returning(table.c.id_line, sort_by_parameter_order=True),
+            rows
+        )
+        ids = list(result.scalars())
+        await apply_ledger_lines(db, rows)
+        await db.commit()
+    except DBAPIError as e:
+        # Référence supprimée ou compte de caisse créé depuis le chargement du
+        # cache (clé étrangère, trigger check_caisse_category): le message de la
+        # base reste dans les logs, le client reçoit les erreurs par ligne
+        await db.rollback()
+        logger.warning(f"Écriture de journal rejetée par la base: {e.orig}")
+        reference_sets.invalidate("accounts", "caisse_accounts", "expense_categories", "currencies")
+        reference_errors = await ledger_line_reference_errors(db, list(enumerate(entry.lines)))
+        if reference_errors:
+            return journal_reference_errors(response, reference_errors)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Journal entry rejected"
+        )
+    
+    return BatchResult(inserted=len(ids), ids=ids)
+
+
 @router.get("/ledger/lines/{line_id}", response_model=LedgerLineResponse)
+@query_budget(5)
 async def get_ledger_line(
     line_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer une ligne de grand livre par ID"""
-    line = db.query(LedgerLine).filter(LedgerLine.id_line == line_id).first()
+    line = await db.scalar(
+        select(LedgerLine)
+        .options(*response_options(LedgerLine, LedgerLineResponse))
+        .where(LedgerLine.id_line == line_id)
+    )
     if not line:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -124,118 +221,49 @@ async def get_ledger_line(
 
 
 @router.get("/ledger/lines", response_model=List[LedgerLineResponse])
+@query_budget(5)
 async def list_ledger_lines(
+    response: Response,
     pagination: PaginationParams = Depends(get_pagination_params),
     account_id: int = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des lignes de grand livre avec filtrage optionnel par compte"""
-    skip = (pagination.page - 1) * pagination.page_size
-    
-    query = db.query(LedgerLine)
+    query = select(LedgerLine).options(*response_options(LedgerLine, LedgerLineResponse))
     
     # Filtrer par compte si spécifié
     if account_id:
-        query = query.filter(
+        query = query.where(
             (LedgerLine.debit_account == account_id) |
             (LedgerLine.credit_account == account_id)
         )
     
-    lines = query.order_by(LedgerLine.date_op.desc()).offset(skip).limit(pagination.page_size).all()
-    return lines
+    lines, _ = await fetch_page(
+        db, query, pagination, LedgerLine.date_op, LedgerLine.id_line,
+        descending=True, response=response
+    )
+    return schema_response(List[LedgerLineResponse], lines, response)
 
 
 # ======================= RAPPORTS FINANCIERS ==========================
 
 @router.get("/ledger/balance", response_model=List[dict])
 async def get_trial_balance(
-    db: Session = Depends(get_db),
+    as_of: Optional[datetime] = Query(None, description="Soldes à cette date (dernière clôture + lignes postérieures); solde courant par défaut"),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
-    """Balance de vérification - soldes de tous les comptes"""
-    from sqlalchemy import text
-    
-    query = text("""
-        SELECT 
-            a.id_account,
-            a.libelle,
-            a.account_type,
-            COALESCE(SUM(
-                CASE 
-                    WHEN ll.debit_account = a.id_account THEN ll.amount_minor
-                    WHEN ll.credit_account = a.id_account THEN -ll.amount_minor
-                    ELSE 0
-                END
-            ), 0) as balance_minor
-        FROM account a
-        LEFT JOIN ledger_line ll ON (ll.debit_account = a.id_account OR ll.credit_account = a.id_account)
-        GROUP BY a.id_account, a.libelle, a.account_type
-        ORDER BY a.account_type, a.libelle
-    """)
-    
-    result = db.execute(query)
-    
-    balance_data = []
-    for row in result:
-        balance = float(row.balance_minor) / 100  # Convertir en unités principales
-        
-        balance_data.append({
-            "id_account": row.id_account,
-            "libelle": row.libelle,
-            "account_type": row.account_type,
-            "balance": balance
-        })
-    
-    return balance_data
+    """Balance de vérification - soldes de tous les comptes (voir aussi POST /reports)"""
+    return schema_response(List[dict], await trial_balance(db, as_of))
 
 
 @router.get("/ledger/profit-loss", response_model=dict)
 async def get_profit_loss(
-    db: Session = Depends(get_db),
+    date_from: Optional[datetime] = Query(None, description="Début de période (inclus)"),
+    date_to: Optional[datetime] = Query(None, description="Fin de période (exclue); aujourd'hui par défaut"),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
-    """Compte de résultat simplifié"""
-    from sqlalchemy import text
-    
-    # Calculer les revenus (INCOME accounts)
-    income_query = text("""
-        SELECT COALESCE(SUM(
-            CASE 
-                WHEN ll.credit_account = a.id_account THEN ll.amount_minor
-                WHEN ll.debit_account = a.id_account THEN -ll.amount_minor
-                ELSE 0
-            END
-        ), 0) as total_income
-        FROM account a
-        LEFT JOIN ledger_line ll ON (ll.debit_account = a.id_account OR ll.credit_account = a.id_account)
-        WHERE a.account_type = 'INCOME'
-    """)
-    
-    # Calculer les dépenses (EXPENSE accounts)
-    expense_query = text("""
-        SELECT COALESCE(SUM(
-            CASE 
-                WHEN ll.debit_account = a.id_account THEN ll.amount_minor
-                WHEN ll.credit_account = a.id_account THEN -ll.amount_minor
-                ELSE 0
-            END
-        ), 0) as total_expenses
-        FROM account a
-        LEFT JOIN ledger_line ll ON (ll.debit_account = a.id_account OR ll.credit_account = a.id_account)
-        WHERE a.account_type = 'EXPENSE'
-    """)
-    
-    income_result = db.execute(income_query).first()
-    expense_result = db.execute(expense_query).first()
-    
-    total_income = float(income_result.total_income) / 100
-    total_expenses = float(expense_result.total_expenses) / 100
-    net_profit = total_income - total_expenses
-    
-    return {
-        "total_income": total_income,
-        "total_expenses": total_expenses,
-        "net_profit": net_profit,
-        "currency": "MAD"
-    } 
\ No newline at end of file
+    """Compte de résultat simplifié (sur une période si des dates sont fournies; voir aussi POST /reports)"""
+    return await profit_loss(db, date_from, date_to) 
\ No newline at end of file
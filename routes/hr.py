@@ -2,11 +2,13 @@
 Routes pour les ressources humaines
 """
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
-from auth import get_current_user
-from models.hr import Employe, Task
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from caching import entity_etag, not_modified
+from database import get_async_db
+from auth import get_current_user, invalidate_user_cache
+from models.hr import Employe, Task, task_document_table
 from models.referentiels import FonctionEmploye
 from schemas.hr import (
     EmployeResponse, EmployeCreate, EmployeUpdate, CreateEmployeeRequest,
@@ -16,7 +18,10 @@ from schemas.hr import (
 from schemas.referentiels import FonctionEmployeResponse, FonctionEmployeCreate
 from schemas.common import ResponseMessage, PaginatedResponse, AttachDocumentRequest
 from models.documents import Document
-from dependencies import get_pagination_params
+from dependencies import get_paginated_response_params
+from pagination import fetch_paginated
+from serialization import schema_response
+from services.associations import find_missing_ids, insert_links, unique_ids
 from schemas.common import PaginationParams
 
 router = APIRouter(prefix="/api/v1", tags=["Human Resources"])
@@ -24,46 +29,40 @@ router = APIRouter(prefix="/api/v1", tags=["Human Resources"])
 
 @router.get("/employees", response_model=PaginatedResponse[EmployeResponse])
 async def get_employees(
-    pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    pagination: PaginationParams = Depends(get_paginated_response_params),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Récupérer la liste des employés avec pagination"""
-    query = db.query(Employe)
-    
-    total = query.count()
-    employees = query.offset(pagination.offset).limit(pagination.limit).all()
-    
-    return PaginatedResponse(
-        items=employees,
-        total=total,
-        page=pagination.page,
-        page_size=pagination.page_size,
-        total_pages=(total + pagination.page_size - 1) // pagination.page_size
+    return schema_response(
+        PaginatedResponse[EmployeResponse],
+        await fetch_paginated(db, select(Employe), pagination, Employe.id_employe)
     )
 
 
 @router.post("", response_model=ResponseMessage, status_code=status.HTTP_201_CREATED)
 async def create_employee(
     employee_data: CreateEmployeeRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """
     Créer un nouvel employé
     """
-    from auth import get_password_hash
+    from auth import get_password_hash_async
     
     try:
         # Vérifier que l'email n'existe pas déjà (si fourni)
         if employee_data.email:
-            existing_user = db.query(Employe).filter(Employe.email == employee_data.email).first()
+            existing_user = await db.scalar(select(Employe).where(Employe.email == employee_data.email))
             if existing_user:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Email already exists"
                 )
     
+        password_hash = await get_password_hash_async(employee_data.password) if employee_data.password else None
+        
         # Créer l'employé
         new_employee = Employe(
             cin_numero=employee_data.cin_numero,
@@ -74,14 +73,14 @@ async def create_employee(
             salaire_net=employee_data.salaire_net,
             id_fonction=employee_data.id_fonction,
             email=employee_data.email,
-            password_hash=get_password_hash(employee_data.password) if employee_data.password else None,
+            password_hash=password_hash,
             role=employee_data.role or "employee",
             is_active="1"
         )
         
         db.add(new_employee)
-        db.commit()
-        db.refresh(new_employee)
+        await db.commit()
+        await db.refresh(new_employee)
         
         # Message de succès avec info d'authentification
         auth_info = ""
@@ -94,32 +93,34 @@ async def create_employee(
             id=new_employee.id_employe
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/employees/{employee_id}", response_model=EmployeResponse)
 async def get_employee(
     employee_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Récupérer un employé par son ID"""
-    employee = db.query(Employe).filter(Employe.id_employe == employee_id).first()
+    employee = await db.scalar(select(Employe).where(Employe.id_employe == employee_id))
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
-    return employee
+    return not_modified(request, response, entity_etag(employee, EmployeResponse)) or employee
 
 
 @router.patch("/employees/{employee_id}", response_model=EmployeResponse)
 async def update_employee(
     employee_id: int,
     employee_data: EmployeUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Mettre à jour un employé"""
-    employee = db.query(Employe).filter(Employe.id_employe == employee_id).first()
+    employee = await db.scalar(select(Employe).where(Employe.id_employe == employee_id))
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     
@@ -127,25 +128,27 @@ async def update_employee(
     for field, value in employee_data.model_dump(exclude_unset=True).items():
         setattr(employee, field, value)
     
-    db.commit()
-    db.refresh(employee)
+    await db.commit()
+    await db.refresh(employee)
+    invalidate_user_cache(employee_id)
     return employee
 
 
 @router.delete("/employees/{employee_id}", response_model=ResponseMessage)
 async def delete_employee(
     employee_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Supprimer un employé (soft delete)"""
-    employee = db.query(Employe).filter(Employe.id_employe == employee_id).first()
+    employee = await db.scalar(select(Employe).where(Employe.id_employe == employee_id))
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     
     # Soft delete en désactivant l'employé
     employee.is_active = "0"
-    db.commit()
+    await db.commit()
+    invalidate_user_cache(employee_id)
     
     return ResponseMessage(
         message=f"Employee {employee.prenom} {employee.nom} deleted successfully",
@@ -157,16 +160,16 @@ async def delete_employee(
 async def attach_document_to_employee(
     employee_id: int,
     request: AttachDocumentRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Attacher des documents à un employé"""
-    employee = db.query(Employe).filter(Employe.id_employe == employee_id).first()
+    employee = await db.scalar(select(Employe).where(Employe.id_employe == employee_id))
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     
     # Vérifier que les documents existent
-    documents = db.query(Document).filter(Document.id_document.in_(request.document_ids)).all()
+    documents = (await db.scalars(select(Document).where(Document.id_document.in_(request.document_ids)))).all()
     if len(documents) != len(request.document_ids):
         raise HTTPException(status_code=404, detail="One or more documents not found")
     
@@ -182,72 +185,64 @@ async def attach_document_to_employee(
 # Routes pour les fonctions d'employés
 @router.get("/functions", response_model=List[FonctionEmployeResponse])
 async def get_employee_functions(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Récupérer la liste des fonctions d'employés"""
-    functions = db.query(FonctionEmploye).all()
+    functions = (await db.scalars(select(FonctionEmploye))).all()
     return functions
 
 
 @router.post("/functions", response_model=FonctionEmployeResponse, status_code=status.HTTP_201_CREATED)
 async def create_employee_function(
     function_data: FonctionEmployeCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Créer une nouvelle fonction d'employé"""
     function = FonctionEmploye(**function_data.model_dump())
     db.add(function)
-    db.commit()
-    db.refresh(function)
+    await db.commit()
+    await db.refresh(function)
     return function
 
 
 # Routes pour les tâches
 @router.get("/tasks", response_model=PaginatedResponse[TaskResponse])
 async def get_tasks(
-    pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    pagination: PaginationParams = Depends(get_paginated_response_params),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Récupérer la liste des tâches avec pagination"""
-    query = db.query(Task)
-    
-    total = query.count()
-    tasks = query.offset(pagination.offset).limit(pagination.limit).all()
-    
-    return PaginatedResponse(
-        items=tasks,
-        total=total,
-        page=pagination.page,
-        size=pagination.size,
-        pages=(total + pagination.size - 1) // pagination.size
+    return schema_response(
+        PaginatedResponse[TaskResponse],
+        await fetch_paginated(db, select(Task), pagination, Task.id_task)
     )
 
 
 @router.post("/tasks", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
 async def create_task(
     task_data: TaskCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Créer une nouvelle tâche"""
     task = Task(**task_data.model_dump())
     db.add(task)
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     return task
 
 
 @router.get("/tasks/{task_id}", response_model=TaskResponse)
 async def get_task(
     task_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Récupérer une tâche par son ID"""
-    task = db.query(Task).filter(Task.id_task == task_id).first()
+    task = await db.scalar(select(Task).where(Task.id_task == task_id))
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
@@ -257,11 +252,11 @@ async def get_task(
 async def update_task(
     task_id: int,
     task_data: TaskUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Mettre à jour une tâche"""
-    task = db.query(Task).filter(Task.id_task == task_id).first()
+    task = await db.scalar(select(Task).where(Task.id_task == task_id))
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
@@ -269,24 +264,24 @@ async def update_task(
     for field, value in task_data.model_dump(exclude_unset=True).items():
         setattr(task, field, value)
     
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     return task
 
 
 @router.delete("/tasks/{task_id}", response_model=ResponseMessage)
 async def delete_task(
     task_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Supprimer une tâche"""
-    task = db.query(Task).filter(Task.id_task == task_id).first()
+    task = await db.scalar(select(Task).where(Task.id_task == task_id))
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    db.delete(task)
-    db.commit()
+    await db.delete(task)
+    await db.commit()
     
     return ResponseMessage(
         message="Task deleted successfully",
@@ -298,15 +293,15 @@ async def delete_task(
 async def assign_task_to_employee(
     task_id: int,
     assignment: TaskAssignmentRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Assigner une tâche à un employé"""
-    task = db.query(Task).filter(Task.id_task == task_id).first()
+    task = await db.scalar(select(Task).where(Task.id_task == task_id))
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    employee = db.query(Employe).filter(Employe.id_employe == assignment.id_employe).first()
+    employee = await db.scalar(select(Employe).where(Employe.id_employe == assignment.id_employe))
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     
@@ -315,7 +310,7 @@ async def assign_task_to_employee(
         raise HTTPException(status_code=400, detail="Employee already assigned to this task")
     
         task.assignees.append(employee)
-        db.commit()
+        await db.commit()
     
     return ResponseMessage(
         message=f"Task assigned to {employee.prenom} {employee.nom}",
@@ -327,15 +322,15 @@ async def assign_task_to_employee(
 async def unassign_task_from_employee(
     task_id: int,
     employee_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Désassigner une tâche d'un employé"""
-    task = db.query(Task).filter(Task.id_task == task_id).first()
+    task = await db.scalar(select(Task).where(Task.id_task == task_id))
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    employee = db.query(Employe).filter(Employe.id_employe == employee_id).first()
+    employee = await db.scalar(select(Employe).where(Employe.id_employe == employee_id))
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     
@@ -343,7 +338,7 @@ async def unassign_task_from_employee(
         raise HTTPException(status_code=400, detail="Employee not assigned to this task")
     
         task.assignees.remove(employee)
-        db.commit()
+        await db.commit()
     
     return ResponseMessage(
         message=f"Task unassigned from {employee.prenom} {employee.nom}",
@@ -355,15 +350,15 @@ async def unassign_task_from_employee(
 async def add_subtask(
     task_id: int,
     subtask_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
     """Ajouter une sous-tâche à une tâche"""
-    parent_task = db.query(Task).filter(Task.id_task == task_id).first()
+    parent_task = await db.scalar(select(Task).where(Task.id_task == task_id))
     if not parent_task:
         raise HTTPException(status_code=404, detail="Parent task not found")
     
-    subtask = db.query(Task).filter(Task.id_task == subtask_id).first()
+    subtask = await db.scalar(select(Task).where(Task.id_task == subtask_id))
     if not subtask:
         raise HTTPException(status_code=404, detail="Subtask not found")
     
@@ -384,27 +379,23 @@ async def add_subtask(
 async def attach_document_to_task(
     task_id: int,
     request: AttachDocumentRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
-    """Attacher des documents à une tâche"""
-    task = db.query(Task).filter(Task.id_task == task_id).first()
-    if not task:
+    """Attacher des documents à une tâche (liens existants ignorés)"""
+    if not await db.scalar(select(Task.id_task).where(Task.id_task == task_id)):
         raise HTTPException(status_code=404, detail="Task not found")
     
     # Vérifier que les documents existent
-    documents = db.query(Document).filter(Document.id_document.in_(request.document_ids)).all()
-    if len(documents) != len(request.document_ids):
+    document_ids = unique_ids(request.document_ids)
+    if await find_missing_ids(db, Document.id_document, document_ids):
         raise HTTPException(status_code=404, detail="One or more documents not found")
     
     # Attacher les documents à la tâche
-    for document in documents:
-        if document not in task.documents:
-            task.documents.append(document)
-    
-    db.commit()
+    attached = await insert_links(db, task_document_table, "id_task", task_id, "id_document", document_ids)
+    await db.commit()
     
     return ResponseMessage(
-        message=f"{len(documents)} document(s) attached to task",
+        message=f"{attached} document(s) attached to task",
         success=True
-    ) 
\ No newline at end of file
+    ) 
@@ -2,16 +2,21 @@
 Routes pour la logistique et les approvisionnements
 """
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from dependencies import get_pagination_params, require_authenticated_user
+from instrumentation import query_budget
+from loading import response_options
+from pagination import fetch_page
+from serialization import schema_response
 from schemas.common import PaginationParams, ResponseMessage
 from schemas.logistics import *
 from models.logistics import Livraison, SupplyRequest, SupplyRequestTracking
 from models.products import StockMove, Produit
 from models.hr import Employe
-from models.referentiels import StatutLivraison, StatutAppro
+from services.reference import reference_sets
 
 router = APIRouter(prefix="/api/v1", tags=["Logistics"])
 
@@ -19,27 +24,31 @@ router = APIRouter(prefix="/api/v1", tags=["Logistics"])
 # ======================= LIVRAISONS ==========================
 
 @router.get("/deliveries", response_model=List[LivraisonResponse])
+@query_budget(3)
 async def list_deliveries(
+    response: Response,
     pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des livraisons avec pagination"""
-    skip = (pagination.page - 1) * pagination.page_size
-    deliveries = db.query(Livraison).offset(skip).limit(pagination.page_size).all()
-    return deliveries
+    deliveries, _ = await fetch_page(
+        db, select(Livraison).options(*response_options(Livraison, LivraisonResponse)),
+        pagination, Livraison.id_livraison, response=response
+    )
+    return schema_response(List[LivraisonResponse], deliveries, response)
 
 
 @router.post("/deliveries", response_model=LivraisonResponse, status_code=status.HTTP_201_CREATED)
 async def create_delivery(
     delivery_data: LivraisonCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer une nouvelle livraison (wraps deux mouvements de stock)"""
     # Vérifier que les mouvements de stock existent
     if delivery_data.id_move_out:
-        move_out = db.query(StockMove).filter(StockMove.id_move == delivery_data.id_move_out).first()
+        move_out = await db.scalar(select(StockMove).where(StockMove.id_move == delivery_data.id_move_out))
         if not move_out:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -47,7 +56,7 @@ async def create_delivery(
             )
     
     if delivery_data.id_move_in:
-        move_in = db.query(StockMove).filter(StockMove.id_move == delivery_data.id_move_in).first()
+        move_in = await db.scalar(select(StockMove).where(StockMove.id_move == delivery_data.id_move_in))
         if not move_in:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -56,7 +65,7 @@ async def create_delivery(
     
     # Vérifier le statut si spécifié
     if delivery_data.id_statut_livraison:
-        status_delivery = db.query(StatutLivraison).filter(StatutLivraison.id_statut == delivery_data.id_statut_livraison).first()
+        status_delivery = await reference_sets.statuts_livraison.find(db, delivery_data.id_statut_livraison)
         if not status_delivery:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -65,7 +74,7 @@ async def create_delivery(
     
     # Vérifier le livreur si spécifié
     if delivery_data.id_livreur:
-        driver = db.query(Employe).filter(Employe.id_employe == delivery_data.id_livreur).first()
+        driver = await db.scalar(select(Employe).where(Employe.id_employe == delivery_data.id_livreur))
         if not driver:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -74,19 +83,24 @@ async def create_delivery(
     
     delivery = Livraison(**delivery_data.model_dump())
     db.add(delivery)
-    db.commit()
-    db.refresh(delivery)
+    await db.commit()
+    await db.refresh(delivery)
     return delivery
 
 
 @router.get("/deliveries/{delivery_id}", response_model=LivraisonResponse)
+@query_budget(3)
 async def get_delivery(
     delivery_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer une livraison par ID"""
-    delivery = db.query(Livraison).filter(Livraison.id_livraison == delivery_id).first()
+    delivery = await db.scalar(
+        select(Livraison)
+        .options(*response_options(Livraison, LivraisonResponse))
+        .where(Livraison.id_livraison == delivery_id)
+    )
     if not delivery:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -99,11 +113,11 @@ async def get_delivery(
 async def update_delivery(
     delivery_id: int,
     delivery_data: LivraisonUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Modifier une livraison"""
-    delivery = db.query(Livraison).filter(Livraison.id_livraison == delivery_id).first()
+    delivery = await db.scalar(select(Livraison).where(Livraison.id_livraison == delivery_id))
     if not delivery:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -115,8 +129,8 @@ async def update_delivery(
     for field, value in update_data.items():
         setattr(delivery, field, value)
     
-    db.commit()
-    db.refresh(delivery)
+    await db.commit()
+    await db.refresh(delivery)
     return delivery
 
 
@@ -124,11 +138,11 @@ async def update_delivery(
 async def update_delivery_status(
     delivery_id: int,
     status_request: UpdateDeliveryStatusRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Mettre à jour le statut d'une livraison"""
-    delivery = db.query(Livraison).filter(Livraison.id_livraison == delivery_id).first()
+    delivery = await db.scalar(select(Livraison).where(Livraison.id_livraison == delivery_id))
     if not delivery:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -136,7 +150,7 @@ async def update_delivery_status(
         )
     
     # Vérifier que le statut existe
-    status_delivery = db.query(StatutLivraison).filter(StatutLivraison.id_statut == status_request.status_id).first()
+    status_delivery = await reference_sets.statuts_livraison.find(db, status_request.status_id)
     if not status_delivery:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -144,10 +158,10 @@ async def update_delivery_status(
         )
     
     delivery.id_statut_livraison = status_request.status_id
-    db.commit()
+    await db.commit()
     
     return ResponseMessage(
-        message=f"Delivery {delivery_id} status updated to {status_delivery.libelle}",
+        message=f"Delivery {delivery_id} status updated to {status_delivery['libelle']}",
         success=True
     )
 
@@ -155,27 +169,31 @@ async def update_delivery_status(
 # ======================= DEMANDES D'APPROVISIONNEMENT ==========================
 
 @router.get("/supply-requests", response_model=List[SupplyRequestResponse])
+@query_budget(5)
 async def list_supply_requests(
+    response: Response,
     pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des demandes d'approvisionnement avec pagination"""
-    skip = (pagination.page - 1) * pagination.page_size
-    requests = db.query(SupplyRequest).offset(skip).limit(pagination.page_size).all()
-    return requests
+    requests, _ = await fetch_page(
+        db, select(SupplyRequest).options(*response_options(SupplyRequest, SupplyRequestResponse)),
+        pagination, SupplyRequest.id_supply_request, response=response
+    )
+    return schema_response(List[SupplyRequestResponse], requests, response)
 
 
 @router.post("/supply-requests", response_model=SupplyRequestResponse, status_code=status.HTTP_201_CREATED)
 async def create_supply_request(
     request_data: SupplyRequestCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer une nouvelle demande d'approvisionnement"""
     # Vérifier le demandeur si spécifié
     if request_data.id_demandeur:
-        requester = db.query(Employe).filter(Employe.id_employe == request_data.id_demandeur).first()
+        requester = await db.scalar(select(Employe).where(Employe.id_employe == request_data.id_demandeur))
         if not requester:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -184,7 +202,7 @@ async def create_supply_request(
     
     # Vérifier le statut si spécifié
     if request_data.id_statut_appro:
-        status_appro = db.query(StatutAppro).filter(StatutAppro.id_statut == request_data.id_statut_appro).first()
+        status_appro = await reference_sets.statuts_appro.find(db, request_data.id_statut_appro)
         if not status_appro:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -193,19 +211,24 @@ async def create_supply_request(
     
     supply_request = SupplyRequest(**request_data.model_dump())
     db.add(supply_request)
-    db.commit()
-    db.refresh(supply_request)
+    await db.commit()
+    await db.refresh(supply_request)
     return supply_request
 
 
 @router.get("/supply-requests/{request_id}", response_model=SupplyRequestResponse)
+@query_budget(5)
 async def get_supply_request(
     request_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer une demande d'approvisionnement par ID"""
-    supply_request = db.query(SupplyRequest).filter(SupplyRequest.id_supply_request == request_id).first()
+    supply_request = await db.scalar(
+        select(SupplyRequest)
+        .options(*response_options(SupplyRequest, SupplyRequestResponse))
+        .where(SupplyRequest.id_supply_request == request_id)
+    )
     if not supply_request:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -218,11 +241,11 @@ async def get_supply_request(
 async def update_supply_request(
     request_id: int,
     request_data: SupplyRequestUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Modifier une demande d'approvisionnement"""
-    supply_request = db.query(SupplyRequest).filter(SupplyRequest.id_supply_request == request_id).first()
+    supply_request = await db.scalar(select(SupplyRequest).where(SupplyRequest.id_supply_request == request_id))
     if not supply_request:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -234,8 +257,8 @@ async def update_supply_request(
     for field, value in update_data.items():
         setattr(supply_request, field, value)
     
-    db.commit()
-    db.refresh(supply_request)
+    await db.commit()
+    await db.refresh(supply_request)
     return supply_request
 
 
@@ -243,18 +266,18 @@ async def update_supply_request(
 async def add_supply_request_product(
     request_id: int,
     product_request: AddSupplyProductRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Ajouter un produit à une demande d'approvisionnement"""
-    supply_request = db.query(SupplyRequest).filter(SupplyRequest.id_supply_request == request_id).first()
+    supply_request = await db.scalar(select(SupplyRequest).where(SupplyRequest.id_supply_request == request_id))
     if not supply_request:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Supply request not found"
         )
     
-    product = db.query(Produit).filter(Produit.id_produit == product_request.product_id).first()
+    product = await db.scalar(select(Produit).where(Produit.id_produit == product_request.product_id))
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -264,7 +287,7 @@ async def add_supply_request_product(
     # Ajouter le produit s'il n'est pas déjà dans la demande
     if product not in supply_request.produits:
         supply_request.produits.append(product)
-        db.commit()
+        await db.commit()
     
     return ResponseMessage(
         message=f"Product {product_request.product_id} added to supply request {request_id} with quantity {product_request.qty}",
@@ -276,11 +299,11 @@ async def add_supply_request_product(
 async def add_supply_request_tracking(
     request_id: int,
     tracking_data: SupplyRequestTrackingCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Ajouter un événement de suivi à une demande d'approvisionnement"""
-    supply_request = db.query(SupplyRequest).filter(SupplyRequest.id_supply_request == request_id).first()
+    supply_request = await db.scalar(select(SupplyRequest).where(SupplyRequest.id_supply_request == request_id))
     if not supply_request:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -288,7 +311,7 @@ async def add_supply_request_tracking(
         )
     
     # Vérifier que le statut existe
-    status_appro = db.query(StatutAppro).filter(StatutAppro.id_statut == tracking_data.id_statut).first()
+    status_appro = await reference_sets.statuts_appro.find(db, tracking_data.id_statut)
     if not status_appro:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -300,6 +323,6 @@ async def add_supply_request_tracking(
         **tracking_data.model_dump()
     )
     db.add(tracking)
-    db.commit()
-    db.refresh(tracking)
+    await db.commit()
+    await db.refresh(tracking)
     return tracking 
\ No newline at end of file
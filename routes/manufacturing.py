@@ -2,17 +2,23 @@
 Routes pour la gestion de la fabrication
 """
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from dependencies import get_pagination_params, require_authenticated_user
+from instrumentation import query_budget
+from loading import response_options
+from pagination import fetch_page
+from serialization import schema_response
 from schemas.common import PaginationParams, ResponseMessage, AttachDocumentRequest
 from schemas.manufacturing import *
 from models.manufacturing import NomenclatureFabrication, OrdreFabrication, OFDocument
 from models.products import Produit
 from models.projects import Projet
-from models.referentiels import StatutFabrication
 from models.documents import Document
+from services.images import image_derivatives
+from services.reference import reference_sets
 
 router = APIRouter(prefix="/api/v1", tags=["Manufacturing"])
 
@@ -21,38 +27,40 @@ router = APIRouter(prefix="/api/v1", tags=["Manufacturing"])
 
 @router.get("/bom", response_model=List[NomenclatureFabricationResponse])
 async def list_bom(
+    response: Response,
     pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des nomenclatures de fabrication avec pagination"""
-    skip = (pagination.page - 1) * pagination.page_size
-    boms = db.query(NomenclatureFabrication).offset(skip).limit(pagination.page_size).all()
-    return boms
+    boms, _ = await fetch_page(
+        db, select(NomenclatureFabrication), pagination, NomenclatureFabrication.id_nomenclature, response=response
+    )
+    return schema_response(List[NomenclatureFabricationResponse], boms, response)
 
 
 @router.post("/bom", response_model=NomenclatureFabricationResponse, status_code=status.HTTP_201_CREATED)
 async def create_bom(
     bom_data: NomenclatureFabricationCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer une nouvelle nomenclature de fabrication"""
     bom = NomenclatureFabrication(**bom_data.model_dump())
     db.add(bom)
-    db.commit()
-    db.refresh(bom)
+    await db.commit()
+    await db.refresh(bom)
     return bom
 
 
 @router.get("/bom/{bom_id}", response_model=NomenclatureFabricationResponse)
 async def get_bom(
     bom_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer une nomenclature par ID"""
-    bom = db.query(NomenclatureFabrication).filter(NomenclatureFabrication.id_nomenclature == bom_id).first()
+    bom = await db.scalar(select(NomenclatureFabrication).where(NomenclatureFabrication.id_nomenclature == bom_id))
     if not bom:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -65,11 +73,11 @@ async def get_bom(
 async def update_bom(
     bom_id: int,
     bom_data: NomenclatureFabricationUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Modifier une nomenclature"""
-    bom = db.query(NomenclatureFabrication).filter(NomenclatureFabrication.id_nomenclature == bom_id).first()
+    bom = await db.scalar(select(NomenclatureFabrication).where(NomenclatureFabrication.id_nomenclature == bom_id))
     if not bom:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -81,8 +89,8 @@ async def update_bom(
     for field, value in update_data.items():
         setattr(bom, field, value)
     
-    db.commit()
-    db.refresh(bom)
+    await db.commit()
+    await db.refresh(bom)
     return bom
 
 
@@ -90,18 +98,18 @@ async def update_bom(
 async def add_bom_product(
     bom_id: int,
     product_request: AddBOMProductRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Ajouter un produit/composant à une nomenclature"""
-    bom = db.query(NomenclatureFabrication).filter(NomenclatureFabrication.id_nomenclature == bom_id).first()
+    bom = await db.scalar(select(NomenclatureFabrication).where(NomenclatureFabrication.id_nomenclature == bom_id))
     if not bom:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="BOM not found"
         )
     
-    product = db.query(Produit).filter(Produit.id_produit == product_request.product_id).first()
+    product = await db.scalar(select(Produit).where(Produit.id_produit == product_request.product_id))
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -111,7 +119,7 @@ async def add_bom_product(
     # Ajouter le produit s'il n'est pas déjà dans la nomenclature
     if product not in bom.produits:
         bom.produits.append(product)
-        db.commit()
+        await db.commit()
     
     return ResponseMessage(
         message=f"Product {product_request.product_id} added to BOM {bom_id} with quantity {product_request.qty}",
@@ -122,27 +130,31 @@ async def add_bom_product(
 # ======================= ORDRES DE FABRICATION ==========================
 
 @router.get("/orders/fabrication", response_model=List[OrdreFabricationResponse])
+@query_budget(10)
 async def list_fabrication_orders(
+    response: Response,
     pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des ordres de fabrication avec pagination"""
-    skip = (pagination.page - 1) * pagination.page_size
-    orders = db.query(OrdreFabrication).offset(skip).limit(pagination.page_size).all()
-    return orders
+    orders, _ = await fetch_page(
+        db, select(OrdreFabrication).options(*response_options(OrdreFabrication, OrdreFabricationResponse)),
+        pagination, OrdreFabrication.id_of, response=response
+    )
+    return schema_response(List[OrdreFabricationResponse], orders, response)
 
 
 @router.post("/orders/fabrication", response_model=OrdreFabricationResponse, status_code=status.HTTP_201_CREATED)
 async def create_fabrication_order(
     order_data: OrdreFabricationCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer un nouvel ordre de fabrication"""
     # Vérifier que le projet existe si spécifié
     if order_data.id_projet:
-        project = db.query(Projet).filter(Projet.id_projet == order_data.id_projet).first()
+        project = await db.scalar(select(Projet).where(Projet.id_projet == order_data.id_projet))
         if not project:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -151,7 +163,7 @@ async def create_fabrication_order(
     
     # Vérifier que le statut existe si spécifié
     if order_data.id_statut_fabrication:
-        status_fab = db.query(StatutFabrication).filter(StatutFabrication.id_statut == order_data.id_statut_fabrication).first()
+        status_fab = await reference_sets.statuts_fabrication.find(db, order_data.id_statut_fabrication)
         if not status_fab:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -160,19 +172,24 @@ async def create_fabrication_order(
     
     order = OrdreFabrication(**order_data.model_dump())
     db.add(order)
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    await db.refresh(order)
     return order
 
 
 @router.get("/orders/fabrication/{order_id}", response_model=OrdreFabricationResponse)
+@query_budget(10)
 async def get_fabrication_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer un ordre de fabrication par ID"""
-    order = db.query(OrdreFabrication).filter(OrdreFabrication.id_of == order_id).first()
+    order = await db.scalar(
+        select(OrdreFabrication)
+        .options(*response_options(OrdreFabrication, OrdreFabricationResponse))
+        .where(OrdreFabrication.id_of == order_id)
+    )
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -185,11 +202,11 @@ async def get_fabrication_order(
 async def update_fabrication_order(
     order_id: int,
     order_data: OrdreFabricationUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Modifier un ordre de fabrication"""
-    order = db.query(OrdreFabrication).filter(OrdreFabrication.id_of == order_id).first()
+    order = await db.scalar(select(OrdreFabrication).where(OrdreFabrication.id_of == order_id))
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -201,8 +218,8 @@ async def update_fabrication_order(
     for field, value in update_data.items():
         setattr(order, field, value)
     
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    await db.refresh(order)
     return order
 
 
@@ -210,18 +227,18 @@ async def update_fabrication_order(
 async def link_bom_to_order(
     order_id: int,
     bom_request: LinkBOMRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Lier une nomenclature (BOM) à un ordre de fabrication avec quantité"""
-    order = db.query(OrdreFabrication).filter(OrdreFabrication.id_of == order_id).first()
+    order = await db.scalar(select(OrdreFabrication).where(OrdreFabrication.id_of == order_id))
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Fabrication order not found"
         )
     
-    bom = db.query(NomenclatureFabrication).filter(NomenclatureFabrication.id_nomenclature == bom_request.nomenclature_id).first()
+    bom = await db.scalar(select(NomenclatureFabrication).where(NomenclatureFabrication.id_nomenclature == bom_request.nomenclature_id))
     if not bom:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -231,7 +248,7 @@ async def link_bom_to_order(
     # Ajouter la nomenclature s'elle n'est pas déjà liée
     if bom not in order.nomenclatures:
         order.nomenclatures.append(bom)
-        db.commit()
+        await db.commit()
     
     return ResponseMessage(
         message=f"BOM {bom_request.nomenclature_id} linked to fabrication order {order_id} with quantity {bom_request.qty}",
@@ -243,11 +260,11 @@ async def link_bom_to_order(
 async def upload_fabrication_progress(
     order_id: int,
     attach_request: AttachDocumentRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Upload photo avancement/réalisation pour un ordre de fabrication"""
-    order = db.query(OrdreFabrication).filter(OrdreFabrication.id_of == order_id).first()
+    order = await db.scalar(select(OrdreFabrication).where(OrdreFabrication.id_of == order_id))
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -255,7 +272,7 @@ async def upload_fabrication_progress(
         )
     
     # Vérifier que tous les documents existent
-    documents = db.query(Document).filter(Document.id_document.in_(attach_request.document_ids)).all()
+    documents = (await db.scalars(select(Document).where(Document.id_document.in_(attach_request.document_ids)))).all()
     if len(documents) != len(attach_request.document_ids):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -271,7 +288,11 @@ async def upload_fabrication_progress(
         )
         db.add(of_doc)
     
-    db.commit()
+    await db.commit()
+    
+    # Déclinaisons des photos (sans effet si déjà générées à l'upload)
+    for document in documents:
+        image_derivatives.schedule(document.file_path, document.mime_type)
     
     return ResponseMessage(
         message=f"Progress photos uploaded for fabrication order {order_id}",
@@ -283,11 +304,11 @@ async def upload_fabrication_progress(
 async def update_fabrication_status(
     order_id: int,
     status_request: UpdateStatusRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Mettre à jour le statut de production d'un ordre de fabrication"""
-    order = db.query(OrdreFabrication).filter(OrdreFabrication.id_of == order_id).first()
+    order = await db.scalar(select(OrdreFabrication).where(OrdreFabrication.id_of == order_id))
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -295,7 +316,7 @@ async def update_fabrication_status(
         )
     
     # Vérifier que le statut existe
-    status_fab = db.query(StatutFabrication).filter(StatutFabrication.id_statut == status_request.status_id).first()
+    status_fab = await reference_sets.statuts_fabrication.find(db, status_request.status_id)
     if not status_fab:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -303,9 +324,9 @@ async def update_fabrication_status(
         )
     
     order.id_statut_fabrication = status_request.status_id
-    db.commit()
+    await db.commit()
     
     return ResponseMessage(
-        message=f"Fabrication order {order_id} status updated to {status_fab.libelle}",
+        message=f"Fabrication order {order_id} status updated to {status_fab['libelle']}",
         success=True
     ) 
\ No newline at end of file
@@ -2,13 +2,17 @@
 Routes pour la gestion du matériel
 """
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from dependencies import get_pagination_params, require_authenticated_user
+from pagination import fetch_page
+from serialization import schema_response
+from services.associations import find_missing_ids, insert_links, unique_ids
 from schemas.common import PaginationParams, ResponseMessage, AttachDocumentRequest
 from schemas.materials import *
-from models.materials import Materiel
+from models.materials import Materiel, materiel_document_table
 from models.documents import Document
 
 router = APIRouter(prefix="/api/v1", tags=["Materials"])
@@ -16,26 +20,28 @@ router = APIRouter(prefix="/api/v1", tags=["Materials"])
 
 @router.get("/materials", response_model=List[MaterielResponse])
 async def list_materials(
+    response: Response,
     pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste du matériel avec pagination"""
-    skip = (pagination.page - 1) * pagination.page_size
-    materials = db.query(Materiel).offset(skip).limit(pagination.page_size).all()
-    return materials
+    materials, _ = await fetch_page(
+        db, select(Materiel), pagination, Materiel.id_materiel, response=response
+    )
+    return schema_response(List[MaterielResponse], materials, response)
 
 
 @router.post("/materials", response_model=MaterielResponse, status_code=status.HTTP_201_CREATED)
 async def create_material(
     material_data: MaterielCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer un nouveau matériel"""
     # Vérifier que le document de facture existe si spécifié
     if material_data.id_facture:
-        invoice_doc = db.query(Document).filter(Document.id_document == material_data.id_facture).first()
+        invoice_doc = await db.scalar(select(Document).where(Document.id_document == material_data.id_facture))
         if not invoice_doc:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -44,19 +50,19 @@ async def create_material(
     
     material = Materiel(**material_data.model_dump())
     db.add(material)
-    db.commit()
-    db.refresh(material)
+    await db.commit()
+    await db.refresh(material)
     return material
 
 
 @router.get("/materials/{material_id}", response_model=MaterielResponse)
 async def get_material(
     material_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer un matériel par ID"""
-    material = db.query(Materiel).filter(Materiel.id_materiel == material_id).first()
+    material = await db.scalar(select(Materiel).where(Materiel.id_materiel == material_id))
     if not material:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -69,11 +75,11 @@ async def get_material(
 async def update_material(
     material_id: int,
     material_data: MaterielUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Modifier un matériel"""
-    material = db.query(Materiel).filter(Materiel.id_materiel == material_id).first()
+    material = await db.scalar(select(Materiel).where(Materiel.id_materiel == material_id))
     if not material:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -85,8 +91,8 @@ async def update_material(
     for field, value in update_data.items():
         setattr(material, field, value)
     
-    db.commit()
-    db.refresh(material)
+    await db.commit()
+    await db.refresh(material)
     return material
 
 
@@ -94,33 +100,29 @@ async def update_material(
 async def attach_material_documents(
     material_id: int,
     attach_request: AttachDocumentRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
-    """Attacher des documents à un matériel"""
-    material = db.query(Materiel).filter(Materiel.id_materiel == material_id).first()
-    if not material:
+    """Attacher des documents à un matériel (liens existants ignorés)"""
+    if not await db.scalar(select(Materiel.id_materiel).where(Materiel.id_materiel == material_id)):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Material not found"
         )
     
     # Vérifier que tous les documents existent
-    documents = db.query(Document).filter(Document.id_document.in_(attach_request.document_ids)).all()
-    if len(documents) != len(attach_request.document_ids):
+    document_ids = unique_ids(attach_request.document_ids)
+    if await find_missing_ids(db, Document.id_document, document_ids):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="One or more documents not found"
         )
     
     # Attacher les documents
-    for document in documents:
-        if document not in material.documents:
-            material.documents.append(document)
-    
-    db.commit()
+    attached = await insert_links(db, materiel_document_table, "id_materiel", material_id, "id_document", document_ids)
+    await db.commit()
     
     return ResponseMessage(
-        message=f"Documents attached to material {material_id}",
+        message=f"Documents attached to material {material_id} ({attached} new)",
         success=True
     ) 
\ No newline at end of file
@@ -2,14 +2,20 @@
 Routes pour la gestion des produits et du stock
 """
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from caching import entity_etag, not_modified
+from database import get_async_db
 from dependencies import get_pagination_params, require_authenticated_user
-from schemas.common import PaginationParams, ResponseMessage
+from pagination import fetch_page
+from serialization import schema_response
+from config import settings
+from services.batch import batch_openapi_body, read_batch, validate_rows
+from services.stock import apply_stock_move, apply_stock_moves, stock_inventory_refresher, stock_move_reference_errors
+from schemas.common import BatchResult, BatchRowError, PaginationParams, ResponseMessage
 from schemas.products import *
-from models.products import Produit, Article, Stock, StockMove
+from models.products import Produit, Article, Stock, StockMove, StockBalance
 from models.referentiels import Entreprise
 
 router = APIRouter(prefix="/api/v1", tags=["Products & Stock"])
@@ -19,26 +25,28 @@ router = APIRouter(prefix="/api/v1", tags=["Products & Stock"])
 
 @router.get("/products", response_model=List[ProduitResponse])
 async def list_products(
+    response: Response,
     pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des produits avec pagination"""
-    skip = (pagination.page - 1) * pagination.page_size
-    products = db.query(Produit).offset(skip).limit(pagination.page_size).all()
-    return products
+    products, _ = await fetch_page(
+        db, select(Produit), pagination, Produit.id_produit, response=response
+    )
+    return schema_response(List[ProduitResponse], products, response)
 
 
 @router.post("/products", response_model=ProduitResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(
     product_data: ProduitCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer un nouveau produit"""
     # Vérifier que le code produit n'existe pas déjà
     if product_data.code_produit:
-        existing = db.query(Produit).filter(Produit.code_produit == product_data.code_produit).first()
+        existing = await db.scalar(select(Produit).where(Produit.code_produit == product_data.code_produit))
         if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -47,36 +55,38 @@ async def create_product(
     
     product = Produit(**product_data.model_dump())
     db.add(product)
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    await db.refresh(product)
     return product
 
 
 @router.get("/products/{product_id}", response_model=ProduitResponse)
 async def get_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer un produit par ID"""
-    product = db.query(Produit).filter(Produit.id_produit == product_id).first()
+    product = await db.scalar(select(Produit).where(Produit.id_produit == product_id))
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
-    return product
+    return not_modified(request, response, entity_etag(product, ProduitResponse)) or product
 
 
 @router.patch("/products/{product_id}", response_model=ProduitResponse)
 async def update_product(
     product_id: int,
     product_data: ProduitUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Modifier un produit"""
-    product = db.query(Produit).filter(Produit.id_produit == product_id).first()
+    product = await db.scalar(select(Produit).where(Produit.id_produit == product_id))
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -88,8 +98,8 @@ async def update_product(
     for field, value in update_data.items():
         setattr(product, field, value)
     
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    await db.refresh(product)
     return product
 
 
@@ -97,18 +107,18 @@ async def update_product(
 async def add_product_supplier(
     product_id: int,
     supplier_request: AddSupplierRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Ajouter un fournisseur à un produit"""
-    product = db.query(Produit).filter(Produit.id_produit == product_id).first()
+    product = await db.scalar(select(Produit).where(Produit.id_produit == product_id))
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
     
-    supplier = db.query(Entreprise).filter(Entreprise.id_entreprise == supplier_request.entreprise_id).first()
+    supplier = await db.scalar(select(Entreprise).where(Entreprise.id_entreprise == supplier_request.entreprise_id))
     if not supplier:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -118,7 +128,7 @@ async def add_product_supplier(
     # Ajouter le fournisseur s'il n'est pas déjà associé
     if supplier not in product.fournisseurs:
         product.fournisseurs.append(supplier)
-        db.commit()
+        await db.commit()
     
     return ResponseMessage(
         message=f"Supplier {supplier_request.entreprise_id} added to product {product_id}",
@@ -130,18 +140,18 @@ async def add_product_supplier(
 async def remove_product_supplier(
     product_id: int,
     supplier_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Retirer un fournisseur d'un produit"""
-    product = db.query(Produit).filter(Produit.id_produit == product_id).first()
+    product = await db.scalar(select(Produit).where(Produit.id_produit == product_id))
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
     
-    supplier = db.query(Entreprise).filter(Entreprise.id_entreprise == supplier_id).first()
+    supplier = await db.scalar(select(Entreprise).where(Entreprise.id_entreprise == supplier_id))
     if not supplier:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -150,7 +160,7 @@ async def remove_product_supplier(
     
     if supplier in product.fournisseurs:
         product.fournisseurs.remove(supplier)
-        db.commit()
+        await db.commit()
     
     return ResponseMessage(
         message=f"Supplier {supplier_id} removed from product {product_id}",
@@ -162,25 +172,27 @@ async def remove_product_supplier(
 
 @router.get("/articles", response_model=List[ArticleResponse])
 async def list_articles(
+    response: Response,
     pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des articles (SKU) avec pagination"""
-    skip = (pagination.page - 1) * pagination.page_size
-    articles = db.query(Article).offset(skip).limit(pagination.page_size).all()
-    return articles
+    articles, _ = await fetch_page(
+        db, select(Article), pagination, Article.id_article, response=response
+    )
+    return schema_response(List[ArticleResponse], articles, response)
 
 
 @router.post("/articles", response_model=ArticleResponse, status_code=status.HTTP_201_CREATED)
 async def create_article(
     article_data: ArticleCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer un nouvel article (SKU)"""
     # Vérifier que le produit existe
-    product = db.query(Produit).filter(Produit.id_produit == article_data.id_produit).first()
+    product = await db.scalar(select(Produit).where(Produit.id_produit == article_data.id_produit))
     if not product:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -189,19 +201,19 @@ async def create_article(
     
     article = Article(**article_data.model_dump())
     db.add(article)
-    db.commit()
-    db.refresh(article)
+    await db.commit()
+    await db.refresh(article)
     return article
 
 
 @router.get("/articles/{article_id}", response_model=ArticleResponse)
 async def get_article(
     article_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer un article par ID"""
-    article = db.query(Article).filter(Article.id_article == article_id).first()
+    article = await db.scalar(select(Article).where(Article.id_article == article_id))
     if not article:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -214,38 +226,40 @@ async def get_article(
 
 @router.get("/stocks", response_model=List[StockResponse])
 async def list_stocks(
+    response: Response,
     pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des stocks/entrepôts avec pagination"""
-    skip = (pagination.page - 1) * pagination.page_size
-    stocks = db.query(Stock).offset(skip).limit(pagination.page_size).all()
-    return stocks
+    stocks, _ = await fetch_page(
+        db, select(Stock), pagination, Stock.id_stock, response=response
+    )
+    return schema_response(List[StockResponse], stocks, response)
 
 
 @router.post("/stocks", response_model=StockResponse, status_code=status.HTTP_201_CREATED)
 async def create_stock(
     stock_data: StockCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer un nouveau stock/entrepôt"""
     stock = Stock(**stock_data.model_dump())
     db.add(stock)
-    db.commit()
-    db.refresh(stock)
+    await db.commit()
+    await db.refresh(stock)
     return stock
 
 
 @router.get("/stocks/{stock_id}", response_model=StockResponse)
 async def get_stock(
     stock_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer un stock par ID"""
-    stock = db.query(Stock).filter(Stock.id_stock == stock_id).first()
+    stock = await db.scalar(select(Stock).where(Stock.id_stock == stock_id))
     if not stock:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -257,67 +271,85 @@ async def get_stock(
 @router.get("/stocks/{stock_id}/inventory", response_model=List[StockInventoryResponse])
 async def get_stock_inventory(
     stock_id: int,
-    db: Session = Depends(get_db),
+    from_view: bool = Query(False, description="Lire la vue matérialisée stock_inventory (rafraîchie périodiquement, légèrement en retard)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer l'inventaire actuel d'un stock"""
     # Vérifier que le stock existe
-    stock = db.query(Stock).filter(Stock.id_stock == stock_id).first()
+    stock = await db.scalar(select(Stock).where(Stock.id_stock == stock_id))
     if not stock:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Stock not found"
         )
     
-    # Requête pour calculer les quantités disponibles
-    # Note: En production, utiliser la vue matérialisée stock_inventory
-    query = text("""
-        SELECT 
-            :stock_id as id_stock,
-            sm.id_article,
-            SUM(
-                CASE 
-                    WHEN sm.dst_stock = :stock_id THEN sm.qty
-                    WHEN sm.src_stock = :stock_id THEN -sm.qty
-                    ELSE 0
-                END
-            ) as qty_available
-        FROM stock_move sm
-        WHERE (sm.dst_stock = :stock_id OR sm.src_stock = :stock_id)
-        GROUP BY sm.id_article
-        HAVING SUM(
-            CASE 
-                WHEN sm.dst_stock = :stock_id THEN sm.qty
-                WHEN sm.src_stock = :stock_id THEN -sm.qty
-                ELSE 0
-            END
-        ) > 0
-    """)
+    if from_view and db.bind.dialect.name == "postgresql":
+        result = await db.execute(text("""
+            SELECT id_stock, id_article, qty_available
+            FROM stock_inventory
+            WHERE id_stock = :stock_id AND qty_available > 0
+            ORDER BY id_article
+        """), {"stock_id": stock_id})
+        return [
+            StockInventoryResponse(id_stock=row.id_stock, id_article=row.id_article, qty_available=row.qty_available)
+            for row in result
+        ]
     
-    result = db.execute(query, {"stock_id": stock_id})
-    inventory_data = []
+    # Soldes maintenus à chaque mouvement (services/stock.py): O(articles du stock)
+    balances = (await db.scalars(
+        select(StockBalance)
+        .where(StockBalance.id_stock == stock_id, StockBalance.qty > 0)
+        .order_by(StockBalance.id_article)
+    )).all()
     
-    for row in result:
-        inventory_data.append(StockInventoryResponse(
-            id_stock=row.id_stock,
-            id_article=row.id_article,
-            qty_available=row.qty_available
-        ))
+    inventory_data = [
+        StockInventoryResponse(
+            id_stock=balance.id_stock,
+            id_article=balance.id_article,
+            qty_available=balance.qty
+        )
+        for balance in balances
+    ]
     
     return inventory_data
 
 
 # ======================= MOUVEMENTS DE STOCK ==========================
 
+@router.get("/stock-moves", response_model=List[StockMoveResponse])
+async def list_stock_moves(
+    response: Response,
+    pagination: PaginationParams = Depends(get_pagination_params),
+    article_id: int = None,
+    stock_id: int = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(require_authenticated_user)
+):
+    """Liste des mouvements de stock (plus récents d'abord) avec filtrage optionnel"""
+    query = select(StockMove)
+
+    if article_id:
+        query = query.where(StockMove.id_article == article_id)
+    if stock_id:
+        query = query.where((StockMove.src_stock == stock_id) | (StockMove.dst_stock == stock_id))
+
+    moves, _ = await fetch_page(
+        db, query, pagination, StockMove.date_move, StockMove.id_move,
+        descending=True, response=response
+    )
+    return schema_response(List[StockMoveResponse], moves, response)
+
+
 @router.post("/stock-moves", response_model=StockMoveResponse, status_code=status.HTTP_201_CREATED)
 async def create_stock_move(
     move_data: StockMoveCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer un mouvement de stock (double-entrée)"""
     # Vérifier que l'article existe
-    article = db.query(Article).filter(Article.id_article == move_data.id_article).first()
+    article = await db.scalar(select(Article).where(Article.id_article == move_data.id_article))
     if not article:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -326,7 +358,7 @@ async def create_stock_move(
     
     # Vérifier que les stocks existent
     if move_data.src_stock:
-        src_stock = db.query(Stock).filter(Stock.id_stock == move_data.src_stock).first()
+        src_stock = await db.scalar(select(Stock).where(Stock.id_stock == move_data.src_stock))
         if not src_stock:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -334,7 +366,7 @@ async def create_stock_move(
             )
     
     if move_data.dst_stock:
-        dst_stock = db.query(Stock).filter(Stock.id_stock == move_data.dst_stock).first()
+        dst_stock = await db.scalar(select(Stock).where(Stock.id_stock == move_data.dst_stock))
         if not dst_stock:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -350,19 +382,67 @@ async def create_stock_move(
     
     stock_move = StockMove(**move_data.model_dump())
     db.add(stock_move)
-    db.commit()
-    db.refresh(stock_move)
+    await apply_stock_move(db, stock_move)
+    await db.commit()
+    await db.refresh(stock_move)
+    stock_inventory_refresher.mark_dirty()
     return stock_move
 
 
+@router.post(
+    "/stock-moves/batch",
+    response_model=BatchResult,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra=batch_openapi_body("StockMoveCreate")
+)
+async def create_stock_moves_batch(
+    request: Request,
+    response: Response,
+    partial: bool = Query(False, description="Insérer les lignes valides malgré les lignes en erreur"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(require_authenticated_user)
+):
+    """
+    Import en lot de mouvements de stock (tableau JSON ou NDJSON, une transaction).
+    Les références sont vérifiées par une requête IN par table; les erreurs sont
+    rapportées par ligne. Sans partial, un lot avec erreurs n'insère rien (422).
+    """
+    rows = await read_batch(request, settings.batch_max_rows)
+    moves, errors = validate_rows(rows, StockMoveCreate)
+    
+    reference_errors = await stock_move_reference_errors(db, moves)
+    errors.extend(BatchRowError(index=index, errors=messages) for index, messages in reference_errors.items())
+    errors.sort(key=lambda error: error.index)
+    moves = [move for index, move in moves if index not in reference_errors]
+    
+    if errors and not partial:
+        response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+        return BatchResult(inserted=0, errors=errors)
+    
+    ids = []
+    if moves:
+        # INSERT Core multi-lignes (insertmanyvalues), sans passer par l'unité de travail ORM
+        table = StockMove.__table__
+        result = await db.execute(
+            insert(table).returning(table.c.id_move, sort_by_parameter_order=True),
+            [move.model_dump() for move in moves]
+        )
+        ids = list(result.scalars())
+        await apply_stock_moves(db, moves)
+        await db.commit()
+        stock_inventory_refresher.mark_dirty()
+    
+    return BatchResult(inserted=len(ids), ids=ids, errors=errors)
+
+
 @router.get("/stock-moves/{move_id}", response_model=StockMoveResponse)
 async def get_stock_move(
     move_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer un mouvement de stock par ID"""
-    move = db.query(StockMove).filter(StockMove.id_move == move_id).first()
+    move = await db.scalar(select(StockMove).where(StockMove.id_move == move_id))
     if not move:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
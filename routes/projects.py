@@ -3,15 +3,23 @@ Routes pour la gestion des projets
 """
 from typing import List
 from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from caching import entity_etag, not_modified
+from database import get_async_db
 from dependencies import get_pagination_params, require_authenticated_user
+from instrumentation import query_budget
+from loading import response_options
+from pagination import fetch_page
+from serialization import schema_response
+from services.associations import find_missing_ids, insert_links, unique_ids
+from services.reference import reference_sets
 from schemas.common import PaginationParams, ResponseMessage, AttachDocumentRequest
 from schemas.projects import *
-from models.projects import Projet, SiteClient
-from models.finance import CaisseProjet, LedgerLine, Account
+from models.projects import Projet, SiteClient, projet_document_table
+from models.documents import Document
+from models.finance import CaisseProjet, LedgerLine, Account, AccountBalance
 from models.hr import Employe
 from models.vehicles import Voiture
 from models.materials import Materiel
@@ -23,54 +31,60 @@ router = APIRouter(prefix="/api/v1", tags=["Projects"])
 
 @router.get("/sites", response_model=List[SiteClientResponse])
 async def list_client_sites(
+    response: Response,
     pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des sites clients avec pagination"""
-    skip = (pagination.page - 1) * pagination.page_size
-    sites = db.query(SiteClient).offset(skip).limit(pagination.page_size).all()
-    return sites
+    sites, _ = await fetch_page(
+        db, select(SiteClient), pagination, SiteClient.id_site_client, response=response
+    )
+    return schema_response(List[SiteClientResponse], sites, response)
 
 
 @router.post("/sites", response_model=SiteClientResponse, status_code=status.HTTP_201_CREATED)
 async def create_client_site(
     site_data: SiteClientCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer un nouveau site client"""
     site = SiteClient(**site_data.model_dump())
     db.add(site)
-    db.commit()
-    db.refresh(site)
+    await db.commit()
+    await db.refresh(site)
     return site
 
 
 # ======================= PROJETS ==========================
 
 @router.get("/projects", response_model=List[ProjetResponse])
+@query_budget(7)
 async def list_projects(
+    response: Response,
     pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des projets avec pagination"""
-    skip = (pagination.page - 1) * pagination.page_size
-    projects = db.query(Projet).offset(skip).limit(pagination.page_size).all()
-    return projects
+    projects, _ = await fetch_page(
+        db, select(Projet).options(*response_options(Projet, ProjetResponse)),
+        pagination, Projet.id_projet, response=response
+    )
+    return schema_response(List[ProjetResponse], projects, response)
 
 
 @router.post("/projects", response_model=ProjetResponse, status_code=status.HTTP_201_CREATED)
 async def create_project(
     project_data: ProjetCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer un nouveau projet"""
     # Vérifier que le chef de chantier existe
     if project_data.id_chef_chantier:
-        chef = db.query(Employe).filter(Employe.id_employe == project_data.id_chef_chantier).first()
+        chef = await db.scalar(select(Employe).where(Employe.id_employe == project_data.id_chef_chantier))
         if not chef:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -79,36 +93,43 @@ async def create_project(
     
     project = Projet(**project_data.model_dump())
     db.add(project)
-    db.commit()
-    db.refresh(project)
+    await db.commit()
+    await db.refresh(project)
     return project
 
 
 @router.get("/projects/{project_id}", response_model=ProjetResponse)
+@query_budget(7)
 async def get_project(
     project_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer un projet par ID"""
-    project = db.query(Projet).filter(Projet.id_projet == project_id).first()
+    project = await db.scalar(
+        select(Projet)
+        .options(*response_options(Projet, ProjetResponse))
+        .where(Projet.id_projet == project_id)
+    )
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
-    return project
+    return not_modified(request, response, entity_etag(project, ProjetResponse)) or project
 
 
 @router.patch("/projects/{project_id}", response_model=ProjetResponse)
 async def update_project(
     project_id: int,
     project_data: ProjetUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Modifier un projet"""
-    project = db.query(Projet).filter(Projet.id_projet == project_id).first()
+    project = await db.scalar(select(Projet).where(Projet.id_projet == project_id))
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -120,8 +141,8 @@ async def update_project(
     for field, value in update_data.items():
         setattr(project, field, value)
     
-    db.commit()
-    db.refresh(project)
+    await db.commit()
+    await db.refresh(project)
     return project
 
 
@@ -129,18 +150,18 @@ async def update_project(
 async def link_project_vehicle(
     project_id: int,
     vehicle_request: LinkVehicleRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Lier un véhicule à un projet"""
-    project = db.query(Projet).filter(Projet.id_projet == project_id).first()
+    project = await db.scalar(select(Projet).where(Projet.id_projet == project_id))
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
     
-    vehicle = db.query(Voiture).filter(Voiture.id_voiture == vehicle_request.vehicle_id).first()
+    vehicle = await db.scalar(select(Voiture).where(Voiture.id_voiture == vehicle_request.vehicle_id))
     if not vehicle:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -150,7 +171,7 @@ async def link_project_vehicle(
     # Ajouter le véhicule s'il n'est pas déjà lié
     if vehicle not in project.voitures:
         project.voitures.append(vehicle)
-        db.commit()
+        await db.commit()
     
     return ResponseMessage(
         message=f"Vehicle {vehicle_request.vehicle_id} linked to project {project_id}",
@@ -162,18 +183,18 @@ async def link_project_vehicle(
 async def link_project_material(
     project_id: int,
     material_request: LinkMaterialRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Lier du matériel à un projet"""
-    project = db.query(Projet).filter(Projet.id_projet == project_id).first()
+    project = await db.scalar(select(Projet).where(Projet.id_projet == project_id))
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
     
-    material = db.query(Materiel).filter(Materiel.id_materiel == material_request.material_id).first()
+    material = await db.scalar(select(Materiel).where(Materiel.id_materiel == material_request.material_id))
     if not material:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -183,7 +204,7 @@ async def link_project_material(
     # Ajouter le matériel s'il n'est pas déjà lié
     if material not in project.materiel:
         project.materiel.append(material)
-        db.commit()
+        await db.commit()
     
     return ResponseMessage(
         message=f"Material {material_request.material_id} linked to project {project_id}",
@@ -195,35 +216,30 @@ async def link_project_material(
 async def attach_project_documents(
     project_id: int,
     attach_request: AttachDocumentRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
-    """Attacher des documents à un projet"""
-    project = db.query(Projet).filter(Projet.id_projet == project_id).first()
-    if not project:
+    """Attacher des documents à un projet (liens existants ignorés)"""
+    if not await db.scalar(select(Projet.id_projet).where(Projet.id_projet == project_id)):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
     
     # Vérifier que tous les documents existent
-    from models.documents import Document
-    documents = db.query(Document).filter(Document.id_document.in_(attach_request.document_ids)).all()
-    if len(documents) != len(attach_request.document_ids):
+    document_ids = unique_ids(attach_request.document_ids)
+    if await find_missing_ids(db, Document.id_document, document_ids):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="One or more documents not found"
         )
     
     # Attacher les documents
-    for document in documents:
-        if document not in project.documents:
-            project.documents.append(document)
-    
-    db.commit()
+    attached = await insert_links(db, projet_document_table, "id_projet", project_id, "id_document", document_ids)
+    await db.commit()
     
     return ResponseMessage(
-        message=f"Documents attached to project {project_id}",
+        message=f"Documents attached to project {project_id} ({attached} new)",
         success=True
     )
 
@@ -233,41 +249,30 @@ async def attach_project_documents(
 @router.get("/projects/{project_id}/cash/balance", response_model=CaisseBalanceResponse)
 async def get_project_cash_balance(
     project_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer le solde actuel de la caisse d'un projet"""
-    project = db.query(Projet).filter(Projet.id_projet == project_id).first()
+    project = await db.scalar(select(Projet).where(Projet.id_projet == project_id))
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
     
-    caisse = db.query(CaisseProjet).filter(CaisseProjet.id_projet == project_id).first()
+    caisse = await db.scalar(select(CaisseProjet).where(CaisseProjet.id_projet == project_id))
     if not caisse:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project cash not found"
         )
     
-    # Calculer le solde en sommant toutes les lignes du grand livre pour ce compte
-    query = text("""
-        SELECT 
-            SUM(
-                CASE 
-                    WHEN debit_account = :account_id THEN amount_minor
-                    WHEN credit_account = :account_id THEN -amount_minor
-                    ELSE 0
-                END
-            ) as balance_minor,
-            MAX(date_op) as last_transaction
-        FROM ledger_line
-        WHERE debit_account = :account_id OR credit_account = :account_id
-    """)
-    
-    result = db.execute(query, {"account_id": caisse.id_account}).first()
-    balance_minor = result.balance_minor or 0
+    # Solde courant maintenu à chaque ligne de grand livre (services/ledger.py)
+    account_balance = await db.scalar(
+        select(AccountBalance).where(AccountBalance.id_account == caisse.id_account)
+    )
+    balance_minor = account_balance.balance_minor if account_balance else 0
+    last_transaction = account_balance.last_date_op if account_balance else None
     
     # Convertir en unités principales (diviser par 100 pour les centimes)
     balance = Decimal(balance_minor) / 100
@@ -275,7 +280,7 @@ async def get_project_cash_balance(
     return CaisseBalanceResponse(
         balance=balance,
         currency="MAD",  # TODO: Récupérer la devise du projet
-        last_updated=result.last_transaction.isoformat() if result.last_transaction else None
+        last_updated=last_transaction.isoformat() if last_transaction else None
     )
 
 
@@ -283,18 +288,18 @@ async def get_project_cash_balance(
 async def top_up_project_cash(
     project_id: int,
     top_up_data: CaisseTopUpRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Alimentation de la caisse d'un projet"""
-    project = db.query(Projet).filter(Projet.id_projet == project_id).first()
+    project = await db.scalar(select(Projet).where(Projet.id_projet == project_id))
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
     
-    caisse = db.query(CaisseProjet).filter(CaisseProjet.id_projet == project_id).first()
+    caisse = await db.scalar(select(CaisseProjet).where(CaisseProjet.id_projet == project_id))
     if not caisse:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -316,18 +321,18 @@ async def top_up_project_cash(
 async def create_project_cash_expense(
     project_id: int,
     expense_data: CaisseExpenseRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer une dépense sur la caisse d'un projet"""
-    project = db.query(Projet).filter(Projet.id_projet == project_id).first()
+    project = await db.scalar(select(Projet).where(Projet.id_projet == project_id))
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
     
-    caisse = db.query(CaisseProjet).filter(CaisseProjet.id_projet == project_id).first()
+    caisse = await db.scalar(select(CaisseProjet).where(CaisseProjet.id_projet == project_id))
     if not caisse:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -335,8 +340,7 @@ async def create_project_cash_expense(
         )
     
     # Vérifier que la catégorie existe
-    from models.referentiels import ExpenseCategory
-    category = db.query(ExpenseCategory).filter(ExpenseCategory.id_cat == expense_data.category_id).first()
+    category = await reference_sets.expense_categories.find(db, expense_data.category_id)
     if not category:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -355,39 +359,44 @@ async def create_project_cash_expense(
 
 
 @router.get("/projects/{project_id}/cash/ledger", response_model=List[dict])
+@query_budget(7)
 async def get_project_cash_ledger(
     project_id: int,
+    response: Response,
     pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer le grand livre de la caisse d'un projet (paginé)"""
-    project = db.query(Projet).filter(Projet.id_projet == project_id).first()
+    # Colonnes seules: pas de chargement des relations du projet et de la caisse
+    project = await db.scalar(select(Projet.id_projet).where(Projet.id_projet == project_id))
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
     
-    caisse = db.query(CaisseProjet).filter(CaisseProjet.id_projet == project_id).first()
-    if not caisse:
+    caisse_account = await db.scalar(select(CaisseProjet.id_account).where(CaisseProjet.id_projet == project_id))
+    if not caisse_account:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project cash not found"
         )
     
     # Récupérer les lignes du grand livre pour ce compte
-    skip = (pagination.page - 1) * pagination.page_size
-    
-    ledger_lines = db.query(LedgerLine).filter(
-        (LedgerLine.debit_account == caisse.id_account) |
-        (LedgerLine.credit_account == caisse.id_account)
-    ).order_by(LedgerLine.date_op.desc()).offset(skip).limit(pagination.page_size).all()
+    query = select(LedgerLine).where(
+        (LedgerLine.debit_account == caisse_account) |
+        (LedgerLine.credit_account == caisse_account)
+    )
+    ledger_lines, _ = await fetch_page(
+        db, query, pagination, LedgerLine.date_op, LedgerLine.id_line,
+        descending=True, response=response
+    )
     
     # Formatter la réponse
     ledger_data = []
     for line in ledger_lines:
-        entry_type = "CREDIT" if line.debit_account == caisse.id_account else "DEBIT"
+        entry_type = "CREDIT" if line.debit_account == caisse_account else "DEBIT"
         amount = Decimal(line.amount_minor) / 100
         
         ledger_data.append({
@@ -400,4 +409,4 @@ async def get_project_cash_ledger(
             "category": line.category.libelle if line.category else None
         })
     
-    return ledger_data 
\ No newline at end of file
+    return schema_response(List[dict], ledger_data, response)
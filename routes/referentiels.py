@@ -2,39 +2,54 @@
 Routes pour les données de référence
 """
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from caching import cache_control, not_modified
+from config import settings
+from database import get_async_db
 from dependencies import get_pagination_params, require_authenticated_user
+from instrumentation import query_budget
+from services.reference import ReferenceTable, reference_sets
 from schemas.common import PaginationParams, PaginatedResponse, ResponseMessage
 from schemas.referentiels import *
 from models.referentiels import *
 
-router = APIRouter(prefix="/api/v1", tags=["Reference Data"])
+router = APIRouter(
+    prefix="/api/v1",
+    tags=["Reference Data"],
+    dependencies=[Depends(cache_control(settings.cache_control_reference))]
+)
+
+
+async def reference_rows(table: ReferenceTable, request: Request, response: Response, db: AsyncSession):
+    """Lignes en cache, ou 304 sans sérialisation si le client a déjà cette version"""
+    etag, rows = await table.snapshot(db)
+    return not_modified(request, response, etag) or rows
 
 
 # ======================= DEVISES ==========================
 
 @router.get("/devise", response_model=List[DeviseResponse])
+@query_budget(2)
 async def list_devises(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des devises ISO-4217"""
-    devises = db.query(Devise).all()
-    return devises
+    return await reference_rows(reference_sets.currencies, request, response, db)
 
 
 @router.post("/devise", response_model=DeviseResponse, status_code=status.HTTP_201_CREATED)
 async def create_devise(
     devise_data: DeviseCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer une nouvelle devise"""
     # Vérifier si la devise existe déjà
-    existing = db.query(Devise).filter(Devise.code == devise_data.code).first()
-    if existing:
+    if await reference_sets.currencies.find(db, devise_data.code):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Currency {devise_data.code} already exists"
@@ -42,64 +57,74 @@ async def create_devise(
     
     devise = Devise(**devise_data.model_dump())
     db.add(devise)
-    db.commit()
-    db.refresh(devise)
+    await db.commit()
+    await db.refresh(devise)
+    await reference_sets.changed(db, "currencies")
     return devise
 
 
 # ======================= CATÉGORIES DE DÉPENSES ==========================
 
 @router.get("/expense-categories", response_model=List[ExpenseCategoryResponse])
+@query_budget(2)
 async def list_expense_categories(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des catégories de dépenses"""
-    categories = db.query(ExpenseCategory).all()
-    return categories
+    return await reference_rows(reference_sets.expense_categories, request, response, db)
 
 
 @router.post("/expense-categories", response_model=ExpenseCategoryResponse, status_code=status.HTTP_201_CREATED)
 async def create_expense_category(
     category_data: ExpenseCategoryCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer une nouvelle catégorie de dépense"""
     category = ExpenseCategory(**category_data.model_dump())
     db.add(category)
-    db.commit()
-    db.refresh(category)
+    await db.commit()
+    await db.refresh(category)
+    await reference_sets.changed(db, "expense_categories")
     return category
 
 
 # ======================= STATUTS ==========================
 
 @router.get("/statuts/fabrication", response_model=List[StatutFabricationResponse])
+@query_budget(2)
 async def list_statuts_fabrication(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des statuts de fabrication"""
-    statuts = db.query(StatutFabrication).all()
-    return statuts
+    return await reference_rows(reference_sets.statuts_fabrication, request, response, db)
 
 
 @router.get("/statuts/livraison", response_model=List[StatutLivraisonResponse])
+@query_budget(2)
 async def list_statuts_livraison(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des statuts de livraison"""
-    statuts = db.query(StatutLivraison).all()
-    return statuts
+    return await reference_rows(reference_sets.statuts_livraison, request, response, db)
 
 
 @router.get("/statuts/appro", response_model=List[StatutApproResponse])
+@query_budget(2)
 async def list_statuts_appro(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des statuts d'approvisionnement"""
-    statuts = db.query(StatutAppro).all()
-    return statuts 
\ No newline at end of file
+    return await reference_rows(reference_sets.statuts_appro, request, response, db) 
\ No newline at end of file
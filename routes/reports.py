@@ -0,0 +1,124 @@
+"""
+Routes pour les rapports générés en tâche de fond
+"""
+import json
+import os
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import FileResponse
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from dependencies import get_pagination_params, require_authenticated_user
+from pagination import fetch_page
+from schemas.common import PaginationParams
+from schemas.reports import ReportJobResponse, ReportRequest, ReportType
+from services.reports import REPORTS, report_jobs, request_report
+from models.reports import ReportJob
+
+router = APIRouter(prefix="/api/v1", tags=["Reports"])
+
+
+def report_job_response(job: ReportJob) -> ReportJobResponse:
+    return ReportJobResponse(
+        id_job=job.id_job,
+        report_type=job.report_type,
+        params=json.loads(job.params),
+        status=job.status,
+        size_bytes=job.size_bytes,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        download_url=f"{router.prefix}/reports/{job.id_job}/download" if job.status == "DONE" else None
+    )
+
+
+async def get_report_job(db: AsyncSession, job_id: int) -> ReportJob:
+    job = await db.scalar(select(ReportJob).where(ReportJob.id_job == job_id))
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Report job not found"
+        )
+    return job
+
+
+@router.post("/reports", response_model=ReportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_report(
+    report: ReportRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(require_authenticated_user)
+):
+    """
+    Demander un rapport. Un rapport identique déjà généré sur les mêmes données
+    est renvoyé immédiatement (200); sinon le job est mis en file (202) et son
+    statut se suit sur GET /reports/{id}.
+    """
+    try:
+        params = REPORTS[report.report_type].params.model_validate(report.params)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=json.loads(e.json(include_url=False))
+        )
+
+    job, created = await request_report(db, report.report_type, params, current_user.id_employe)
+    if created:
+        report_jobs.submit(job.id_job)
+    elif job.status == "DONE":
+        response.status_code = status.HTTP_200_OK
+    return report_job_response(job)
+
+
+@router.get("/reports", response_model=List[ReportJobResponse])
+async def list_reports(
+    response: Response,
+    report_type: Optional[ReportType] = Query(None, description="Filtrer par type de rapport"),
+    pagination: PaginationParams = Depends(get_pagination_params),
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(require_authenticated_user)
+):
+    """Liste des jobs de rapport, du plus récent au plus ancien"""
+    query = select(ReportJob)
+    if report_type:
+        query = query.where(ReportJob.report_type == report_type)
+    jobs, _ = await fetch_page(db, query, pagination, ReportJob.id_job, descending=True, response=response)
+    return [report_job_response(job) for job in jobs]
+
+
+@router.get("/reports/{job_id}", response_model=ReportJobResponse)
+async def get_report(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(require_authenticated_user)
+):
+    """Statut d'un job de rapport"""
+    return report_job_response(await get_report_job(db, job_id))
+
+
+@router.get("/reports/{job_id}/download")
+async def download_report(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(require_authenticated_user)
+):
+    """Télécharger un rapport terminé (fichier JSON pré-calculé)"""
+    job = await get_report_job(db, job_id)
+    if job.status != "DONE":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Report is not ready (status: {job.status})"
+        )
+    if not job.file_path or not os.path.exists(job.file_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Report file not found"
+        )
+    return FileResponse(
+        job.file_path,
+        media_type="application/json",
+        filename=f"{job.report_type}_{job.id_job}.json"
+    )
@@ -2,10 +2,14 @@
 Routes pour la gestion des véhicules
 """
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from caching import entity_etag, not_modified
+from database import get_async_db
 from dependencies import get_pagination_params, require_authenticated_user
+from pagination import fetch_page
+from serialization import schema_response
 from schemas.common import PaginationParams, ResponseMessage
 from schemas.vehicles import *
 from models.vehicles import Voiture, VoitureKmLog, VoitureConducteur
@@ -18,26 +22,28 @@ router = APIRouter(prefix="/api/v1", tags=["Vehicles"])
 
 @router.get("/vehicles", response_model=List[VoitureResponse])
 async def list_vehicles(
+    response: Response,
     pagination: PaginationParams = Depends(get_pagination_params),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Liste des véhicules avec pagination"""
-    skip = (pagination.page - 1) * pagination.page_size
-    vehicles = db.query(Voiture).offset(skip).limit(pagination.page_size).all()
-    return vehicles
+    vehicles, _ = await fetch_page(
+        db, select(Voiture), pagination, Voiture.id_voiture, response=response
+    )
+    return schema_response(List[VoitureResponse], vehicles, response)
 
 
 @router.post("/vehicles", response_model=VoitureResponse, status_code=status.HTTP_201_CREATED)
 async def create_vehicle(
     vehicle_data: VoitureCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Créer un nouveau véhicule"""
     # Vérifier que l'immatriculation n'existe pas déjà
     if vehicle_data.immatriculation:
-        existing = db.query(Voiture).filter(Voiture.immatriculation == vehicle_data.immatriculation).first()
+        existing = await db.scalar(select(Voiture).where(Voiture.immatriculation == vehicle_data.immatriculation))
         if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -46,36 +52,38 @@ async def create_vehicle(
     
     vehicle = Voiture(**vehicle_data.model_dump())
     db.add(vehicle)
-    db.commit()
-    db.refresh(vehicle)
+    await db.commit()
+    await db.refresh(vehicle)
     return vehicle
 
 
 @router.get("/vehicles/{vehicle_id}", response_model=VoitureResponse)
 async def get_vehicle(
     vehicle_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Récupérer un véhicule par ID"""
-    vehicle = db.query(Voiture).filter(Voiture.id_voiture == vehicle_id).first()
+    vehicle = await db.scalar(select(Voiture).where(Voiture.id_voiture == vehicle_id))
     if not vehicle:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Vehicle not found"
         )
-    return vehicle
+    return not_modified(request, response, entity_etag(vehicle, VoitureResponse)) or vehicle
 
 
 @router.patch("/vehicles/{vehicle_id}", response_model=VoitureResponse)
 async def update_vehicle(
     vehicle_id: int,
     vehicle_data: VoitureUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Modifier un véhicule"""
-    vehicle = db.query(Voiture).filter(Voiture.id_voiture == vehicle_id).first()
+    vehicle = await db.scalar(select(Voiture).where(Voiture.id_voiture == vehicle_id))
     if not vehicle:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -87,8 +95,8 @@ async def update_vehicle(
     for field, value in update_data.items():
         setattr(vehicle, field, value)
     
-    db.commit()
-    db.refresh(vehicle)
+    await db.commit()
+    await db.refresh(vehicle)
     return vehicle
 
 
@@ -98,11 +106,11 @@ async def update_vehicle(
 async def add_km_log(
     vehicle_id: int,
     km_log_data: VoitureKmLogCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Ajouter un relevé kilométrique"""
-    vehicle = db.query(Voiture).filter(Voiture.id_voiture == vehicle_id).first()
+    vehicle = await db.scalar(select(Voiture).where(Voiture.id_voiture == vehicle_id))
     if not vehicle:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -110,10 +118,10 @@ async def add_km_log(
         )
     
     # Vérifier qu'il n'y a pas déjà un relevé pour cette date
-    existing = db.query(VoitureKmLog).filter(
+    existing = await db.scalar(select(VoitureKmLog).where(
         VoitureKmLog.id_voiture == vehicle_id,
         VoitureKmLog.date_releve == km_log_data.date_releve
-    ).first()
+    ))
     
     if existing:
         raise HTTPException(
@@ -126,8 +134,8 @@ async def add_km_log(
         **km_log_data.model_dump()
     )
     db.add(km_log)
-    db.commit()
-    db.refresh(km_log)
+    await db.commit()
+    await db.refresh(km_log)
     return km_log
 
 
@@ -137,18 +145,18 @@ async def add_km_log(
 async def assign_driver(
     vehicle_id: int,
     driver_data: VoitureConducteurCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Assigner un conducteur à un véhicule"""
-    vehicle = db.query(Voiture).filter(Voiture.id_voiture == vehicle_id).first()
+    vehicle = await db.scalar(select(Voiture).where(Voiture.id_voiture == vehicle_id))
     if not vehicle:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Vehicle not found"
         )
     
-    employee = db.query(Employe).filter(Employe.id_employe == driver_data.employe_id).first()
+    employee = await db.scalar(select(Employe).where(Employe.id_employe == driver_data.employe_id))
     if not employee:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -156,10 +164,10 @@ async def assign_driver(
         )
     
     # Vérifier qu'il n'y a pas déjà une assignation active pour ce véhicule
-    active_assignment = db.query(VoitureConducteur).filter(
+    active_assignment = await db.scalar(select(VoitureConducteur).where(
         VoitureConducteur.id_voiture == vehicle_id,
         VoitureConducteur.date_fin.is_(None)
-    ).first()
+    ))
     
     if active_assignment:
         raise HTTPException(
@@ -173,8 +181,8 @@ async def assign_driver(
         date_debut=driver_data.date_start
     )
     db.add(assignment)
-    db.commit()
-    db.refresh(assignment)
+    await db.commit()
+    await db.refresh(assignment)
     return assignment
 
 
@@ -183,15 +191,15 @@ async def close_driver_assignment(
     vehicle_id: int,
     employee_id: int,
     update_data: VoitureConducteurUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_authenticated_user)
 ):
     """Clôturer une assignation de conducteur (date_fin)"""
-    assignment = db.query(VoitureConducteur).filter(
+    assignment = await db.scalar(select(VoitureConducteur).where(
         VoitureConducteur.id_voiture == vehicle_id,
         VoitureConducteur.id_employe == employee_id,
         VoitureConducteur.date_fin.is_(None)
-    ).first()
+    ))
     
     if not assignment:
         raise HTTPException(
@@ -201,7 +209,7 @@ async def close_driver_assignment(
     
     if update_data.date_end:
         assignment.date_fin = update_data.date_end
-        db.commit()
-        db.refresh(assignment)
+        await db.commit()
+        await db.refresh(assignment)
     
     return assignment 
\ No newline at end of file
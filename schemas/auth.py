@@ -35,6 +35,20 @@ class UserInfo(BaseModel):
         from_attributes = True
 
 
+class CurrentUser(BaseModel):
+    """Utilisateur authentifié (principal mis en cache par get_current_user)"""
+    id_employe: int
+    email: Optional[str] = None
+    nom: str
+    prenom: str
+    role: Optional[str] = None
+    is_active: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+        frozen = True
+
+
 class CreateUserRequest(BaseModel):
     """Demande de création d'utilisateur"""
     email: EmailStr
@@ -1,7 +1,7 @@
 """
 Schémas Pydantic communs
 """
-from typing import Optional, Generic, TypeVar, List
+from typing import Optional, Generic, TypeVar, List, Literal
 from datetime import datetime
 from pydantic import BaseModel, Field
 
@@ -12,6 +12,9 @@ class PaginationParams(BaseModel):
     """Paramètres de pagination"""
     page: int = Field(1, ge=1, description="Numéro de page")
     page_size: int = Field(20, ge=1, le=100, description="Taille de page")
+    cursor: Optional[str] = Field(None, description="Curseur opaque de la page suivante (prioritaire sur page)")
+    include_total: bool = Field(True, description="Calculer le nombre total d'éléments")
+    total_mode: Literal["exact", "cached", "estimate"] = Field("exact", description="Mode de calcul du total")
 
     @property
     def offset(self) -> int:
@@ -25,10 +28,12 @@ class PaginationParams(BaseModel):
 class PaginatedResponse(BaseModel, Generic[T]):
     """Réponse paginée générique"""
     items: List[T]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    total_estimated: bool = False
+    next_cursor: Optional[str] = None
 
 
 class FilterParams(BaseModel):
@@ -60,6 +65,19 @@ class ResponseMessage(BaseModel):
     id: Optional[int] = None
 
 
+class BatchRowError(BaseModel):
+    """Erreurs d'une ligne d'un import en lot"""
+    index: int = Field(..., description="Position de la ligne dans le lot (à partir de 0)")
+    errors: List[str]
+
+
+class BatchResult(BaseModel):
+    """Résultat d'un import en lot"""
+    inserted: int
+    ids: List[int] = []
+    errors: List[BatchRowError] = []
+
+
 class AttachDocumentRequest(BaseModel):
     """Demande d'attachement de document"""
     document_ids: List[int] = Field(..., description="IDs des documents à attacher") 
\ No newline at end of file
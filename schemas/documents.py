@@ -11,9 +11,12 @@ class DocumentUploadResponse(BaseSchema):
     """Réponse après upload d'un document"""
     id_document: int
     file_path: str
+    filename: Optional[str] = None
     mime_type: Optional[str]
     size_bytes: Optional[int]
     checksum: Optional[str]
+    sha256: Optional[str] = None
+    deduplicated: bool = False  # contenu déjà stocké, non réécrit
     upload_url: str  # URL signée pour l'upload
 
 
@@ -21,9 +24,11 @@ class DocumentResponse(BaseSchema, TimestampMixin):
     """Réponse pour un document"""
     id_document: int
     file_path: str
+    filename: Optional[str] = None
     mime_type: Optional[str]
     size_bytes: Optional[int]
     checksum: Optional[str]
+    sha256: Optional[str] = None
     uploaded_by: Optional[int]
     download_url: Optional[str]  # URL signée pour le téléchargement
     tags: Optional[List["TagDocumentResponse"]] = None
@@ -32,9 +37,12 @@ class DocumentResponse(BaseSchema, TimestampMixin):
 class DocumentMetadata(BaseSchema):
     """Métadonnées d'un document"""
     id_document: int
+    filename: Optional[str] = None
     mime_type: Optional[str]
     size_bytes: Optional[int]
+    sha256: Optional[str] = None
     signed_url: str  # URL signée pour accès
+    thumbnail_url: Optional[str] = None  # miniature (images uniquement), ajouter &size=web pour la taille écran
 
 
 class AttachTagRequest(BaseModel):
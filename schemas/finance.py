@@ -41,6 +41,13 @@ class LedgerLineCreate(LedgerLineBase):
     pass
 
 
+class JournalEntryCreate(BaseModel):
+    """Écriture de journal: lignes postées ensemble, tout ou rien"""
+    date_op: Optional[datetime] = Field(None, description="Date d'opération des lignes (maintenant par défaut)")
+    memo: Optional[str] = Field(None, description="Mémo des lignes qui n'en ont pas")
+    lines: List[LedgerLineCreate] = Field(..., min_length=1, description="Lignes débit/crédit")
+
+
 class LedgerLineResponse(LedgerLineBase):
     """Schéma de réponse pour une ligne de grand livre"""
     id_line: int
@@ -0,0 +1,52 @@
+"""
+Schémas pour les rapports générés en tâche de fond
+"""
+from typing import Any, Dict, Literal, Optional
+from datetime import datetime
+from pydantic import BaseModel, Field
+from .common import BaseSchema
+
+ReportType = Literal["profit_loss", "trial_balance", "stock_valuation", "project_cash_statement"]
+
+
+class TrialBalanceParams(BaseModel):
+    """Paramètres de la balance de vérification"""
+    as_of: Optional[datetime] = Field(None, description="Soldes à cette date; solde courant par défaut")
+
+
+class ProfitLossParams(BaseModel):
+    """Paramètres du compte de résultat"""
+    date_from: Optional[datetime] = Field(None, description="Début de période (inclus)")
+    date_to: Optional[datetime] = Field(None, description="Fin de période (exclue); aujourd'hui par défaut")
+
+
+class StockValuationParams(BaseModel):
+    """Paramètres de la valorisation du stock"""
+    id_stock: Optional[int] = Field(None, description="Dépôt; tous les dépôts par défaut")
+
+
+class ProjectCashStatementParams(BaseModel):
+    """Paramètres du relevé de caisse d'un projet"""
+    project_id: int = Field(..., description="ID du projet")
+    date_from: Optional[datetime] = Field(None, description="Début de période (inclus)")
+    date_to: Optional[datetime] = Field(None, description="Fin de période (exclue)")
+
+
+class ReportRequest(BaseModel):
+    """Demande de rapport: réutilise un rapport identique si les données n'ont pas changé"""
+    report_type: ReportType = Field(..., description="Type de rapport")
+    params: Dict[str, Any] = Field(default_factory=dict, description="Paramètres du rapport")
+
+
+class ReportJobResponse(BaseSchema):
+    """Schéma de réponse pour un job de rapport"""
+    id_job: int
+    report_type: str
+    params: Dict[str, Any]
+    status: str
+    size_bytes: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    download_url: Optional[str] = None
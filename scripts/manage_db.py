@@ -106,6 +106,142 @@ def backup_db():
     run_command(cmd)
     print(f"✅ Sauvegarde créée: {backup_file}")
 
+def rebuild_stock():
+    """Reconstruire la table stock_balance depuis les mouvements de stock"""
+    from database import SessionLocal
+    from services.stock import rebuild_stock_balance
+    
+    print("🔄 Reconstruction des soldes de stock...")
+    db = SessionLocal()
+    try:
+        count = rebuild_stock_balance(db)
+    finally:
+        db.close()
+    print(f"✅ {count} soldes (stock, article) recalculés")
+
+def verify_stock():
+    """Vérifier la cohérence de stock_balance avec les mouvements de stock"""
+    from database import SessionLocal
+    from services.stock import verify_stock_balance
+    
+    print("🔍 Vérification des soldes de stock...")
+    db = SessionLocal()
+    try:
+        mismatches = verify_stock_balance(db)
+    finally:
+        db.close()
+    
+    if not mismatches:
+        print("✅ Soldes de stock cohérents")
+        return
+    
+    print(f"❌ {len(mismatches)} écart(s) détecté(s):")
+    for row in mismatches:
+        print(f"   stock {row['id_stock']} / article {row['id_article']}: "
+              f"attendu {row['expected']}, enregistré {row['actual']}")
+    print("💡 Corriger avec: python3 scripts/manage_db.py rebuild-stock")
+    sys.exit(1)
+
+def rebuild_ledger():
+    """Reconstruire la table account_balance depuis les lignes du grand livre"""
+    from database import SessionLocal
+    from services.ledger import rebuild_account_balance
+    
+    print("🔄 Reconstruction des soldes de comptes...")
+    db = SessionLocal()
+    try:
+        count = rebuild_account_balance(db)
+    finally:
+        db.close()
+    print(f"✅ {count} soldes de comptes recalculés")
+
+def verify_ledger():
+    """Vérifier la cohérence de account_balance avec le grand livre"""
+    from database import SessionLocal
+    from services.ledger import verify_account_balance
+    
+    print("🔍 Vérification des soldes de comptes...")
+    db = SessionLocal()
+    try:
+        mismatches = verify_account_balance(db)
+    finally:
+        db.close()
+    
+    if not mismatches:
+        print("✅ Soldes de comptes cohérents")
+        return
+    
+    print(f"❌ {len(mismatches)} écart(s) détecté(s):")
+    for row in mismatches:
+        print(f"   compte {row['id_account']}: attendu {row['expected']}, enregistré {row['actual']}")
+    print("💡 Corriger avec: python3 scripts/manage_db.py rebuild-ledger")
+    sys.exit(1)
+
+def close_ledger():
+    """Enregistrer une clôture datée des soldes (défaut: début du mois courant)"""
+    from datetime import datetime, timezone
+    from database import SessionLocal
+    from services.ledger import close_ledger as record_closing
+    
+    if len(sys.argv) > 2:
+        closed_at = datetime.fromisoformat(sys.argv[2])
+    else:
+        closed_at = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    
+    print(f"📒 Clôture du grand livre au {closed_at.isoformat()}...")
+    db = SessionLocal()
+    try:
+        count = record_closing(db, closed_at)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+    print(f"✅ {count} soldes de clôture enregistrés")
+
+def export_table():
+    """Exporter une table (CSV, NDJSON, Parquet) dans export_dir, en flux"""
+    from datetime import datetime, time
+    from config import settings
+    from database import SessionLocal
+    from services.exports import EXPORT_DATASETS, EXPORT_FORMATS, ExportFormatUnavailable, export_filename, write_export
+    
+    args = sys.argv[2:]
+    if not args or args[0] not in EXPORT_DATASETS:
+        print(f"❌ Table à exporter: {', '.join(EXPORT_DATASETS)}")
+        sys.exit(1)
+    dataset, fmt, gzip, bounds = args[0], "csv", False, {}
+    rest = iter(args[1:])
+    for arg in rest:
+        if arg in EXPORT_FORMATS:
+            fmt = arg
+        elif arg == "--gzip":
+            gzip = True
+        elif arg in ("--from", "--to"):
+            value = next(rest)
+            bounds[arg] = datetime.fromisoformat(value)
+            if arg == "--to" and len(value) == 10:
+                # Date seule: journée incluse
+                bounds[arg] = datetime.combine(bounds[arg].date(), time.max)
+        else:
+            print(f"❌ Argument inconnu: {arg}")
+            sys.exit(1)
+    
+    os.makedirs(settings.export_dir, exist_ok=True)
+    path = os.path.join(settings.export_dir, export_filename(dataset, fmt, gzip))
+    print(f"📤 Export de {dataset} vers {path}...")
+    db = SessionLocal()
+    try:
+        with open(path, "wb") as out:
+            count = write_export(db, out, dataset, fmt, gzip, bounds.get("--from"), bounds.get("--to"))
+    except ExportFormatUnavailable as e:
+        os.remove(path)
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+    print(f"✅ {count} lignes exportées")
+
 def show_help():
     """Afficher l'aide"""
     print("""
@@ -120,12 +256,20 @@ Commandes disponibles:
   reset     - Réinitialiser la base (SUPPRIME TOUT!)
   psql      - Se connecter à psql
   backup    - Créer une sauvegarde
+  rebuild-stock - Reconstruire les soldes de stock (stock_balance)
+  verify-stock  - Vérifier les soldes de stock
+  rebuild-ledger - Reconstruire les soldes de comptes (account_balance)
+  verify-ledger  - Vérifier les soldes de comptes
+  close-ledger [DATE] - Clôture datée des soldes (défaut: 1er du mois, à planifier en cron)
+  export TABLE [csv|ndjson|parquet] [--gzip] [--from DATE] [--to DATE]
+            - Exporter ledger_line, stock_move ou voiture_km_log dans exports/
   help      - Afficher cette aide
 
 Exemples:
   python3 scripts/manage_db.py start
   python3 scripts/manage_db.py psql
   python3 scripts/manage_db.py backup
+  python3 scripts/manage_db.py export ledger_line csv --gzip --from 2024-01-01 --to 2024-12-31
     """)
 
 def main():
@@ -142,6 +286,12 @@ def main():
         'reset': reset_db,
         'psql': psql_connect,
         'backup': backup_db,
+        'rebuild-stock': rebuild_stock,
+        'verify-stock': verify_stock,
+        'rebuild-ledger': rebuild_ledger,
+        'verify-ledger': verify_ledger,
+        'close-ledger': close_ledger,
+        'export': export_table,
         'help': show_help
     }
     
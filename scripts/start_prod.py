@@ -4,6 +4,7 @@ Script de lancement pour l'environnement de PRODUCTION
 Usage: python3 start_prod.py
 """
 import os
+import shutil
 import sys
 import uvicorn
 from pathlib import Path
@@ -42,11 +43,23 @@ def main():
         uploads_dir.mkdir(parents=True, exist_ok=True)
         print(f"⚠️  Utilisation du dossier local: {uploads_dir}")
     
+    # Dimensionnement du pool: chaque worker ouvre son propre pool de connexions
+    from config import settings
+    max_connections = settings.workers * (settings.db_pool_size + settings.db_max_overflow)
+    
+    # Métriques Prometheus partagées par les workers (mode multiprocessus de prometheus_client):
+    # répertoire vidé à chaque démarrage, les fichiers des anciens processus fausseraient les totaux
+    metrics_dir = Path(os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/pms-metrics"))
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    metrics_dir.mkdir(parents=True)
+    
     print("🚀 Démarrage de l'API PMS Protection Incendie")
     print("🏭 Environnement: PRODUCTION")
     print("📁 Config: .env.prod")
     print("🌐 URL: http://0.0.0.0:80")
     print("🔒 Mode sécurisé: Documentation désactivée")
+    print(f"📈 Métriques: /metrics (workers agrégés via {metrics_dir})")
+    print(f"🗄️  Pool DB: {settings.workers} workers × ({settings.db_pool_size} + {settings.db_max_overflow} overflow) = {max_connections} connexions max")
     print("═" * 50)
     
     # Configuration pour la production
@@ -58,7 +71,7 @@ def main():
         log_level="warning",
         access_log=False,
         use_colors=False,
-        workers=4  # Plusieurs workers pour la production
+        workers=settings.workers  # Plusieurs workers pour la production
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+"""
+Sérialisation JSON des réponses.
+
+- ORJSONResponse: classe de réponse par défaut de l'application (main.py),
+  encodée par orjson (dépendance optionnelle, json standard sinon).
+- schema_response: chemin direct des listes. Les objets ORM sont validés par le
+  schéma et encodés en JSON en une passe pydantic-core (TypeAdapter.dump_json),
+  sans dictionnaire intermédiaire ni jsonable_encoder, et sans la seconde
+  validation que FastAPI applique aux modèles déjà construits (PaginatedResponse).
+
+Les deux chemins encodent comme BaseSchema: Decimal en chaîne (comme pydantic),
+datetime en isoformat (json_encoders).
+"""
+import json
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Optional
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépend de l'installation
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Types que l'encodeur ne connaît pas, encodés comme pydantic"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse encodée par orjson"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return json.dumps(
+                content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+            ).encode("utf-8")
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+@lru_cache(maxsize=None)
+def _adapter(schema: Any) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+def schema_response(schema: Any, content: Any, response: Optional[Response] = None) -> Response:
+    """
+    Réponse JSON de `content` (objets ORM, dictionnaires, modèles) validée et
+    encodée selon `schema`, le response_model de la route:
+    return schema_response(List[LedgerLineResponse], lines, response)
+    Le statut et les en-têtes posés sur `response` (réponse injectée: curseur
+    suivant, Cache-Control...) sont repris.
+    """
+    adapter = _adapter(schema)
+    body = adapter.dump_json(adapter.validate_python(content, from_attributes=True), by_alias=True)
+    result = Response(body, media_type="application/json")
+    if response is not None:
+        result.status_code = response.status_code or result.status_code
+        result.raw_headers.extend(header for header in response.raw_headers if header[0] != b"content-length")
+    return result
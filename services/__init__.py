@@ -0,0 +1,3 @@
+"""
+Services métier partagés par les routes et les scripts
+"""
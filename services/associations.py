@@ -0,0 +1,53 @@
+"""
+Liens en masse dans les tables de liaison (projet_document, task_document,
+materiel_document, document_tag...): SQL ensembliste par lots, sans charger
+les collections ORM.
+"""
+from typing import Any, Iterable, Iterator, List, Sequence, Set
+from sqlalchemy import Column, Table, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Identifiants par requête (paramètres liés: limite asyncpg 32767, SQLite 32766)
+BULK_CHUNK_SIZE = 5000
+
+
+def _chunks(ids: Sequence[Any], size: int = BULK_CHUNK_SIZE) -> Iterator[Sequence[Any]]:
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def unique_ids(ids: Iterable[Any]) -> List[Any]:
+    """Identifiants sans doublons, ordre d'origine conservé"""
+    return list(dict.fromkeys(ids))
+
+
+async def existing_ids(db: AsyncSession, pk: Column, ids: Iterable[Any]) -> Set[Any]:
+    """Identifiants présents dans la table de `pk` (une requête IN par lot)"""
+    found = set()
+    for chunk in _chunks(unique_ids(ids)):
+        found.update((await db.scalars(select(pk).where(pk.in_(chunk)))).all())
+    return found
+
+
+async def find_missing_ids(db: AsyncSession, pk: Column, ids: Sequence[int]) -> List[int]:
+    """Identifiants absents de la table de `pk`"""
+    found = await existing_ids(db, pk, ids)
+    return [i for i in ids if i not in found]
+
+
+async def insert_links(db: AsyncSession, table: Table, owner_column: str, owner_id: int,
+                       target_column: str, target_ids: Sequence[int]) -> int:
+    """
+    INSERT ... ON CONFLICT DO NOTHING des couples (owner_id, target_id).
+    Les liens existants sont ignorés; retourne le nombre de liens créés.
+    """
+    dialect_insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    inserted = 0
+    for chunk in _chunks(target_ids, BULK_CHUNK_SIZE // 2):
+        stmt = dialect_insert(table).values(
+            [{owner_column: owner_id, target_column: target_id} for target_id in chunk]
+        ).on_conflict_do_nothing()
+        result = await db.execute(stmt)
+        inserted += max(result.rowcount, 0)
+    return inserted
@@ -0,0 +1,95 @@
+"""
+Imports en lot: lecture d'un corps JSON (tableau) ou NDJSON (une ligne par
+objet, lue en flux) et validation ligne par ligne avec rapport d'erreurs.
+"""
+import json
+from typing import Any, Dict, List, Tuple, Type, TypeVar
+from fastapi import HTTPException, Request, status
+from pydantic import BaseModel, ValidationError
+from schemas.common import BatchRowError
+
+NDJSON_MEDIA_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+M = TypeVar("M", bound=BaseModel)
+
+
+class MalformedRow:
+    """Ligne NDJSON illisible (signalée dans les erreurs du lot)"""
+
+    def __init__(self, error: str):
+        self.error = error
+
+
+def batch_openapi_body(schema_name: str) -> Dict[str, Any]:
+    """Documentation OpenAPI du corps: tableau JSON ou NDJSON de `schema_name`"""
+    items = {"$ref": f"#/components/schemas/{schema_name}"}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": items}},
+                "application/x-ndjson": {"schema": {"type": "string", "description": f"Un objet {schema_name} par ligne"}},
+            },
+        }
+    }
+
+
+def _too_many_rows(max_rows: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Too many rows. Max rows per batch: {max_rows}"
+    )
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return MalformedRow(f"Invalid JSON: {e}")
+
+
+async def read_batch(request: Request, max_rows: int) -> List[Any]:
+    """
+    Lignes du corps de la requête. NDJSON est lu en flux (arrêt dès max_rows
+    dépassé), les lignes vides sont ignorées.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_MEDIA_TYPES:
+        rows: List[Any] = []
+        pending = b""
+        async for chunk in request.stream():
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            rows.extend(_parse_line(line) for line in lines if line.strip())
+            if len(rows) > max_rows:
+                raise _too_many_rows(max_rows)
+        if pending.strip():
+            rows.append(_parse_line(pending))
+    else:
+        try:
+            rows = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON body")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a JSON array")
+
+    if len(rows) > max_rows:
+        raise _too_many_rows(max_rows)
+    return rows
+
+
+def validate_rows(rows: List[Any], schema: Type[M]) -> Tuple[List[Tuple[int, M]], List[BatchRowError]]:
+    """Valide chaque ligne avec `schema`: (index, objet) valides et erreurs par ligne"""
+    valid, errors = [], []
+    for index, row in enumerate(rows):
+        if isinstance(row, MalformedRow):
+            errors.append(BatchRowError(index=index, errors=[row.error]))
+            continue
+        try:
+            valid.append((index, schema.model_validate(row)))
+        except ValidationError as e:
+            errors.append(BatchRowError(
+                index=index,
+                errors=[f"{'.'.join(str(loc) for loc in err['loc']) or 'row'}: {err['msg']}" for err in e.errors()]
+            ))
+    return valid, errors
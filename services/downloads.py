@@ -0,0 +1,156 @@
+"""
+Téléchargement des documents: URLs signées (HMAC, expirantes, vérifiables sans
+base de données) et réponses fichier avec ETag/304 et requêtes Range (206).
+Le corps est envoyé par l'extension ASGI zero-copy (sendfile) quand le serveur
+la fournit, sinon lu par blocs dans un thread.
+"""
+import hashlib
+import hmac
+import math
+import os
+import re
+import time
+from email.utils import formatdate
+from typing import Optional, Tuple
+from urllib.parse import quote
+import anyio
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from config import settings
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _signature(document_id: int, expires: int) -> str:
+    key = (settings.download_url_secret or settings.secret_key).encode()
+    return hmac.new(key, f"{document_id}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+
+def signed_download_url(document_id: int) -> str:
+    """
+    URL de téléchargement valable au moins download_url_ttl secondes.
+    L'expiration est arrondie à la fenêtre suivante: l'URL reste identique
+    pendant la fenêtre et les clients peuvent la garder en cache.
+    """
+    ttl = settings.download_url_ttl
+    expires = math.ceil((time.time() + ttl) / ttl) * ttl
+    return f"/api/v1/documents/{document_id}/download?expires={expires}&sig={_signature(document_id, expires)}"
+
+
+def verify_download_signature(document_id: int, expires: int, sig: str) -> bool:
+    """Signature valide et non expirée (aucun accès base)"""
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(_signature(document_id, expires), sig)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match / If-Range: comparaison faible, liste et * acceptés"""
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in candidates
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Plage d'octets [start, end] d'un en-tête Range à une seule plage.
+    None: en-tête ignoré (réponse complète). ValueError: plage non satisfiable.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None  # multi-plages ou syntaxe inconnue: fichier complet
+    first, last = match.groups()
+    if first == "":
+        # Suffixe: les N derniers octets
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError
+    return start, end
+
+
+class RangeFileResponse(Response):
+    """Envoie les octets [start, end] d'un fichier (zero-copy si le serveur le permet)"""
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: str, start: int, end: int, status_code: int, headers: dict,
+                 media_type: Optional[str], send_body: bool = True):
+        self.path = path
+        self.start = start
+        self.count = end - start + 1
+        self.status_code = status_code
+        self.media_type = media_type or "application/octet-stream"
+        self.send_body = send_body
+        self.background = None
+        self.init_headers(headers)
+        self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.start,
+                    "count": self.count,
+                    "more_body": False,
+                })
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # Fichier tronqué pendant l'envoi: clôturer la réponse
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def file_response(request: Request, path: str, stat_result: os.stat_result, etag: str,
+                  media_type: Optional[str], filename: Optional[str]) -> Response:
+    """Réponse 200, 206, 304 ou 416 selon If-None-Match, Range et If-Range"""
+    size = stat_result.st_size
+    etag = f'"{etag}"'
+    headers = {
+        "etag": etag,
+        "accept-ranges": "bytes",
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "cache-control": f"private, max-age={settings.download_url_ttl}",
+    }
+    if filename:
+        headers["content-disposition"] = f"inline; filename*=utf-8''{quote(filename)}"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={k: headers[k] for k in ("etag", "cache-control")})
+
+    send_body = request.method != "HEAD"
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or _etag_matches(if_range, etag)):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={"content-range": f"bytes */{size}", "accept-ranges": "bytes"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            return RangeFileResponse(path, start, end, 206, headers, media_type, send_body)
+
+    return RangeFileResponse(path, 0, size - 1, 200, headers, media_type, send_body)
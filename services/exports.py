@@ -0,0 +1,257 @@
+"""
+Exports de tables volumineuses (ledger_line, stock_move, voiture_km_log) en
+CSV, NDJSON ou Parquet, compressés en gzip à la demande.
+
+Les lignes sont lues par lots avec un curseur côté serveur (yield_per) et
+encodées lot par lot: la mémoire utilisée ne dépend pas de la taille de l'export.
+Parquet nécessite pyarrow (dépendance optionnelle, requirements-optional.txt).
+"""
+import csv
+import io
+import json
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import BigInteger, Column, Date, DateTime, Integer, Numeric, Select, Table, select
+from sqlalchemy.orm import Session
+from config import settings
+from database import AsyncSessionLocal
+from models.finance import LedgerLine
+from models.products import StockMove
+from models.vehicles import VoitureKmLog
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - dépend de l'installation
+    pyarrow = None
+
+EXPORT_FORMATS = ("csv", "ndjson", "parquet")
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class ExportFormatUnavailable(Exception):
+    """Format demandé non disponible (dépendance optionnelle absente)"""
+
+
+@dataclass(frozen=True)
+class ExportDataset:
+    """Table exportable: colonne de date filtrée par date_from/date_to, ordre de lecture"""
+    table: Table
+    date_column: Column
+    order_by: Tuple[Column, ...]
+
+
+EXPORT_DATASETS: Dict[str, ExportDataset] = {
+    "ledger_line": ExportDataset(
+        LedgerLine.__table__, LedgerLine.__table__.c.date_op,
+        (LedgerLine.__table__.c.date_op, LedgerLine.__table__.c.id_line)
+    ),
+    "stock_move": ExportDataset(
+        StockMove.__table__, StockMove.__table__.c.date_move,
+        (StockMove.__table__.c.date_move, StockMove.__table__.c.id_move)
+    ),
+    "voiture_km_log": ExportDataset(
+        VoitureKmLog.__table__, VoitureKmLog.__table__.c.date_releve,
+        (VoitureKmLog.__table__.c.id_voiture, VoitureKmLog.__table__.c.date_releve)
+    ),
+}
+
+
+def export_filename(dataset: str, fmt: str, gzip: bool, at: Optional[datetime] = None) -> str:
+    stamp = (at or datetime.now()).strftime("%Y%m%d_%H%M%S")
+    return f"{dataset}_{stamp}.{fmt}{'.gz' if gzip and fmt != 'parquet' else ''}"
+
+
+def export_statement(dataset: str, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None) -> Select:
+    """SELECT des colonnes de la table, filtré sur sa colonne de date (bornes incluses)"""
+    spec = EXPORT_DATASETS[dataset]
+    stmt = select(spec.table).order_by(*spec.order_by)
+    is_date = isinstance(spec.date_column.type, Date) and not isinstance(spec.date_column.type, DateTime)
+    if date_from is not None:
+        stmt = stmt.where(spec.date_column >= (date_from.date() if is_date else date_from))
+    if date_to is not None:
+        stmt = stmt.where(spec.date_column <= (date_to.date() if is_date else date_to))
+    return stmt
+
+
+def _text_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)  # pas de conversion en float: précision conservée
+    return value
+
+
+class CsvEncoder:
+    def __init__(self, columns: Sequence[Column]):
+        self.columns = [c.name for c in columns]
+
+    def start(self) -> bytes:
+        return self._encode([self.columns])
+
+    def rows(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        return self._encode([["" if v is None else _text_value(v) for v in row] for row in rows])
+
+    def finish(self) -> bytes:
+        return b""
+
+    @staticmethod
+    def _encode(rows: List[List[Any]]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        return buffer.getvalue().encode("utf-8")
+
+
+class NdjsonEncoder:
+    def __init__(self, columns: Sequence[Column]):
+        self.columns = [c.name for c in columns]
+
+    def start(self) -> bytes:
+        return b""
+
+    def rows(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(self.columns, map(_text_value, row))), ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _DrainableSink(io.RawIOBase):
+    """Fichier en écriture seule dont le contenu est vidé après chaque lot"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _arrow_type(column: Column):
+    column_type = column.type
+    if isinstance(column_type, (BigInteger, Integer)):
+        return pyarrow.int64()
+    if isinstance(column_type, Numeric):
+        return pyarrow.decimal128(column_type.precision or 38, column_type.scale or 0)
+    if isinstance(column_type, DateTime):
+        return pyarrow.timestamp("us", tz="UTC" if column_type.timezone else None)
+    if isinstance(column_type, Date):
+        return pyarrow.date32()
+    return pyarrow.string()
+
+
+class ParquetEncoder:
+    """Un row group par lot; schéma dérivé des types des colonnes"""
+
+    def __init__(self, columns: Sequence[Column]):
+        if pyarrow is None:
+            raise ExportFormatUnavailable("Parquet export requires pyarrow")
+        self.schema = pyarrow.schema([(c.name, _arrow_type(c)) for c in columns])
+        self.sink = _DrainableSink()
+        self.writer = pyarrow.parquet.ParquetWriter(self.sink, self.schema, compression="zstd")
+
+    def start(self) -> bytes:
+        return self.sink.drain()
+
+    def rows(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        arrays = [list(values) for values in zip(*rows)]
+        self.writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(values, type=field.type) for values, field in zip(arrays, self.schema)],
+            schema=self.schema
+        ))
+        return self.sink.drain()
+
+    def finish(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+ENCODERS = {"csv": CsvEncoder, "ndjson": NdjsonEncoder, "parquet": ParquetEncoder}
+
+
+class ExportWriter:
+    """Encode les lots dans le format demandé, puis gzip en flux (sauf Parquet, déjà compressé)"""
+
+    def __init__(self, dataset: str, fmt: str, gzip: bool = False):
+        self.encoder = ENCODERS[fmt](list(EXPORT_DATASETS[dataset].table.columns))
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip and fmt != "parquet" else None
+        self.row_count = 0
+
+    def _output(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) if self.compressor else data
+
+    def start(self) -> bytes:
+        return self._output(self.encoder.start())
+
+    def rows(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        self.row_count += len(rows)
+        return self._output(self.encoder.rows(rows))
+
+    def finish(self) -> bytes:
+        data = self._output(self.encoder.finish())
+        if self.compressor:
+            data += self.compressor.flush()
+        return data
+
+
+async def _stream(writer: ExportWriter, stmt: Select) -> AsyncIterator[bytes]:
+    if chunk := writer.start():
+        yield chunk
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=settings.export_batch_size))
+        async for rows in result.partitions():
+            if chunk := writer.rows(rows):
+                yield chunk
+    if chunk := writer.finish():
+        yield chunk
+
+
+def stream_export(dataset: str, fmt: str, gzip: bool = False,
+                  date_from: Optional[datetime] = None, date_to: Optional[datetime] = None) -> AsyncIterator[bytes]:
+    """
+    Contenu de l'export par blocs (StreamingResponse). Session propre au flux:
+    la connexion est rendue au pool à la fin de l'export.
+    Lève ExportFormatUnavailable avant le début du flux.
+    """
+    return _stream(ExportWriter(dataset, fmt, gzip), export_statement(dataset, date_from, date_to))
+
+
+def write_export(db: Session, out: BinaryIO, dataset: str, fmt: str, gzip: bool = False,
+                 date_from: Optional[datetime] = None, date_to: Optional[datetime] = None) -> int:
+    """Écrit l'export dans `out` (session synchrone, scripts); retourne le nombre de lignes"""
+    writer = ExportWriter(dataset, fmt, gzip)
+    out.write(writer.start())
+    result = db.execute(
+        export_statement(dataset, date_from, date_to),
+        execution_options={"stream_results": True, "yield_per": settings.export_batch_size}
+    )
+    for rows in result.partitions():
+        out.write(writer.rows(rows))
+    out.write(writer.finish())
+    return writer.row_count
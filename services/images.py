@@ -0,0 +1,127 @@
+"""
+Déclinaisons des images (miniature, taille web) générées dans un pool de
+processus, enregistrées sur disque à côté du fichier d'origine:
+<fichier>.thumb.webp, <fichier>.web.webp
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Set
+from PIL import Image, ImageOps
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_MIME_TYPE = "image/webp"
+
+
+def image_sizes() -> Dict[str, int]:
+    """Nom de la déclinaison -> plus grand côté en pixels"""
+    return {"thumb": settings.image_thumbnail_size, "web": settings.image_web_size}
+
+
+def derivative_path(file_path: str, size: str) -> str:
+    return f"{file_path}.{size}.webp"
+
+
+def is_image(mime_type: Optional[str]) -> bool:
+    """Images matricielles décodables par Pillow (SVG exclu)"""
+    return bool(mime_type) and mime_type.startswith("image/") and mime_type != "image/svg+xml"
+
+
+def render_derivatives(file_path: str, sizes: Dict[str, int], quality: int):
+    """
+    Génère les déclinaisons manquantes (exécuté dans un processus du pool).
+    Du plus grand au plus petit format: chaque réduction repart de la précédente.
+    """
+    missing = {name: px for name, px in sizes.items() if not os.path.exists(derivative_path(file_path, name))}
+    if not missing:
+        return
+    with Image.open(file_path) as img:
+        # JPEG: décodage directement à l'échelle réduite la plus proche
+        img.draft("RGB", (max(missing.values()),) * 2)
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+        for name, px in sorted(missing.items(), key=lambda item: -item[1]):
+            img.thumbnail((px, px), Image.LANCZOS)
+            target = derivative_path(file_path, name)
+            tmp_path = f"{target}.{os.getpid()}.part"
+            img.save(tmp_path, "WEBP", quality=quality)
+            os.replace(tmp_path, target)
+
+
+class ImageDerivatives:
+    """
+    Génération asynchrone des déclinaisons (par worker uvicorn).
+    Le pool de processus est créé au premier usage; une même image n'est
+    traitée qu'une fois à la fois.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: pas de fork d'un processus qui a déjà des threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def exists(self, file_path: str) -> bool:
+        return all(os.path.exists(derivative_path(file_path, name)) for name in image_sizes())
+
+    async def ensure(self, file_path: str) -> bool:
+        """Génère les déclinaisons manquantes; False si l'image n'a pas pu être traitée"""
+        if not self.enabled:
+            return False
+        if self.exists(file_path):
+            return True
+        try:
+            future = self._pending.get(file_path)
+            if future is None:
+                loop = asyncio.get_running_loop()
+                future = loop.run_in_executor(
+                    self._get_pool(), render_derivatives, file_path, image_sizes(), settings.image_quality
+                )
+                self._pending[file_path] = future
+                future.add_done_callback(lambda _: self._pending.pop(file_path, None))
+            await asyncio.shield(future)
+            return True
+        except BrokenProcessPool as e:
+            # Processus tué (mémoire...): le pool sera recréé au prochain usage
+            logger.warning(f"Pool de génération des images interrompu: {e}")
+            self._pool = None
+            return False
+        except Exception as e:
+            logger.warning(f"Génération des dérivés de {file_path} échouée: {e}")
+            return False
+
+    def schedule(self, file_path: str, mime_type: Optional[str]):
+        """Lance la génération en tâche de fond (après un upload)"""
+        if not self.enabled or not is_image(mime_type) or self.exists(file_path):
+            return
+        task = asyncio.create_task(self.ensure(file_path))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+image_derivatives = ImageDerivatives(settings.image_workers)
@@ -0,0 +1,239 @@
+"""
+Soldes des comptes du grand livre: solde courant (account_balance) maintenu à
+chaque ligne et clôtures datées (account_balance_snapshot).
+Un solde à une date = dernière clôture antérieure + lignes postérieures.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import case, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models.finance import AccountBalance, AccountBalanceSnapshot, LedgerLine
+from services.reference import reference_sets
+
+# Comptes par instruction upsert
+BALANCE_CHUNK_SIZE = 5000
+
+
+def _ledger_delta_sql(since: bool, until: bool) -> str:
+    """
+    Mouvements par compte (débit positif, crédit négatif) sur [since, until).
+    Deux branches UNION ALL plutôt qu'un OR: chacune peut utiliser son index.
+    """
+    bounds = []
+    if since:
+        bounds.append("date_op >= :since")
+    if until:
+        bounds.append("date_op < :until")
+    where = f"WHERE {' AND '.join(bounds)}" if bounds else ""
+    return f"""
+        SELECT id_account, SUM(amount_minor) AS delta_minor, MAX(date_op) AS last_date_op
+        FROM (
+            SELECT debit_account AS id_account, amount_minor, date_op FROM ledger_line {where}
+            UNION ALL
+            SELECT credit_account AS id_account, -amount_minor, date_op FROM ledger_line {where}
+        ) lines
+        GROUP BY id_account
+    """
+
+
+def _balances_as_of_sql(since: bool) -> str:
+    """Soldes de tous les comptes à :until (clôture :since éventuelle + delta)"""
+    if not since:
+        return f"""
+            SELECT a.id_account, COALESCE(d.delta_minor, 0) AS balance_minor
+            FROM account a
+            LEFT JOIN ({_ledger_delta_sql(since=False, until=True)}) d ON d.id_account = a.id_account
+        """
+    return f"""
+        SELECT a.id_account, COALESCE(s.balance_minor, 0) + COALESCE(d.delta_minor, 0) AS balance_minor
+        FROM account a
+        LEFT JOIN account_balance_snapshot s ON s.id_account = a.id_account AND s.closed_at = :since
+        LEFT JOIN ({_ledger_delta_sql(since=True, until=True)}) d ON d.id_account = a.id_account
+    """
+
+
+def _upsert_balances(dialect_name: str, rows: List[Dict[str, Any]]):
+    """
+    INSERT ... ON CONFLICT DO UPDATE: crée les soldes ou les incrémente sous verrou de ligne.
+    Un compte ne doit apparaître qu'une fois par instruction.
+    """
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(AccountBalance).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[AccountBalance.id_account],
+        set_={
+            "balance_minor": AccountBalance.balance_minor + stmt.excluded.balance_minor,
+            "last_date_op": case(
+                (AccountBalance.last_date_op.is_(None), stmt.excluded.last_date_op),
+                (AccountBalance.last_date_op < stmt.excluded.last_date_op, stmt.excluded.last_date_op),
+                else_=AccountBalance.last_date_op
+            ),
+        }
+    )
+
+
+async def apply_ledger_line(db: AsyncSession, line: LedgerLine):
+    """
+    Répercute une ligne sur account_balance dans la transaction courante.
+    Les comptes sont verrouillés par ordre d'ID pour éviter les interblocages.
+    """
+    dialect_name = db.bind.dialect.name
+    # date_op vaut now() par défaut côté serveur: même valeur dans la transaction
+    date_op = line.date_op if line.date_op is not None else func.now()
+    deltas = sorted([
+        (line.debit_account, line.amount_minor),
+        (line.credit_account, -line.amount_minor),
+    ])
+    for id_account, delta in deltas:
+        await db.execute(_upsert_balances(dialect_name, [
+            {"id_account": id_account, "balance_minor": delta, "last_date_op": date_op}
+        ]))
+
+
+async def apply_ledger_lines(db: AsyncSession, lines: Iterable[Dict[str, Any]]):
+    """
+    Répercute un lot de lignes (date_op renseignée) sur account_balance:
+    variations cumulées par compte, une ligne upsert par compte, dans l'ordre des comptes.
+    """
+    totals: Dict[int, List[Any]] = {}
+    for line in lines:
+        for id_account, delta in (
+            (line["debit_account"], line["amount_minor"]),
+            (line["credit_account"], -line["amount_minor"]),
+        ):
+            total = totals.setdefault(id_account, [0, line["date_op"]])
+            total[0] += delta
+            total[1] = max(total[1], line["date_op"])
+
+    rows = [
+        {"id_account": id_account, "balance_minor": delta, "last_date_op": last_date_op}
+        for id_account, (delta, last_date_op) in sorted(totals.items())
+    ]
+    dialect_name = db.bind.dialect.name
+    for start in range(0, len(rows), BALANCE_CHUNK_SIZE):
+        await db.execute(_upsert_balances(dialect_name, rows[start:start + BALANCE_CHUNK_SIZE]))
+
+
+async def ledger_line_reference_errors(db: AsyncSession, lines: List[Tuple[int, Any]]) -> Dict[int, List[str]]:
+    """
+    Erreurs de référence d'un lot de lignes, par index, validées contre les
+    ensembles de référence en cache. Applique aussi la règle du trigger
+    check_caisse_category (catégorie obligatoire sur une dépense de caisse).
+    """
+    missing_accounts = await reference_sets.accounts.missing(
+        db, (account for _, line in lines for account in (line.debit_account, line.credit_account))
+    )
+    missing_categories = await reference_sets.expense_categories.missing(
+        db, (line.id_cat for _, line in lines if line.id_cat is not None)
+    )
+    missing_currencies = await reference_sets.currencies.missing(db, (line.currency for _, line in lines))
+    caisse_accounts = await reference_sets.caisse_accounts.get(db)
+
+    errors: Dict[int, List[str]] = {}
+    for index, line in lines:
+        line_errors = []
+        if line.debit_account in missing_accounts:
+            line_errors.append("Debit account not found")
+        if line.credit_account in missing_accounts:
+            line_errors.append("Credit account not found")
+        if line.debit_account == line.credit_account:
+            line_errors.append("Debit and credit accounts must be different")
+        if line.id_cat is not None and line.id_cat in missing_categories:
+            line_errors.append("Expense category not found")
+        if line.currency in missing_currencies:
+            line_errors.append("Currency not found")
+        if line.id_cat is None and line.credit_account in caisse_accounts:
+            line_errors.append("Expense category required for project cash expenses")
+        if line_errors:
+            errors[index] = line_errors
+    return errors
+
+
+async def get_last_closing(db: AsyncSession, before: Optional[datetime] = None) -> Optional[datetime]:
+    """Date de la dernière clôture (éventuellement antérieure ou égale à `before`)"""
+    query = select(func.max(AccountBalanceSnapshot.closed_at))
+    if before is not None:
+        query = query.where(AccountBalanceSnapshot.closed_at <= before)
+    return await db.scalar(query)
+
+
+async def get_account_balances(db: AsyncSession, as_of: Optional[datetime] = None) -> Dict[int, int]:
+    """
+    Soldes (unités mineures, débit - crédit) par compte.
+    Sans date: solde courant. Avec date: dernière clôture + lignes jusqu'à as_of (exclu).
+    """
+    if as_of is None:
+        rows = await db.execute(select(AccountBalance.id_account, AccountBalance.balance_minor))
+        return {row.id_account: row.balance_minor for row in rows}
+
+    since = await get_last_closing(db, before=as_of)
+    params: Dict[str, Any] = {"until": as_of}
+    if since is not None:
+        params["since"] = since
+    rows = await db.execute(text(_balances_as_of_sql(since=since is not None)), params)
+    return {row.id_account: row.balance_minor for row in rows}
+
+
+def close_ledger(db: Session, closed_at: datetime) -> int:
+    """
+    Enregistre une clôture datée: solde de chaque compte pour les lignes antérieures
+    à closed_at, calculé depuis la clôture précédente.
+    """
+    if closed_at.tzinfo is None:
+        closed_at = closed_at.replace(tzinfo=timezone.utc)
+    if closed_at > datetime.now(timezone.utc):
+        raise ValueError("A closing date cannot be in the future")
+
+    since = db.scalar(select(func.max(AccountBalanceSnapshot.closed_at)))
+    if since is not None and since.replace(tzinfo=since.tzinfo or timezone.utc) >= closed_at:
+        raise ValueError(f"Ledger already closed at {since.isoformat()}")
+
+    params: Dict[str, Any] = {"until": closed_at}
+    if since is not None:
+        params["since"] = since
+    result = db.execute(text(f"""
+        INSERT INTO account_balance_snapshot (id_account, closed_at, balance_minor)
+        SELECT id_account, :until, balance_minor FROM ({_balances_as_of_sql(since=since is not None)}) balances
+    """), params)
+    db.commit()
+    return result.rowcount
+
+
+def rebuild_account_balance(db: Session) -> int:
+    """
+    Reconstruit account_balance depuis ledger_line.
+    Sous PostgreSQL, les écritures concurrentes attendent la fin de la reconstruction.
+    """
+    if db.bind.dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE ledger_line IN SHARE MODE"))
+        db.execute(text("LOCK TABLE account_balance IN EXCLUSIVE MODE"))
+    db.execute(text("DELETE FROM account_balance"))
+    result = db.execute(text(f"""
+        INSERT INTO account_balance (id_account, balance_minor, last_date_op)
+        SELECT id_account, delta_minor, last_date_op FROM ({_ledger_delta_sql(since=False, until=False)}) balances
+    """))
+    db.commit()
+    return result.rowcount
+
+
+def verify_account_balance(db: Session) -> List[Dict[str, Any]]:
+    """
+    Compare account_balance aux soldes recalculés depuis ledger_line.
+    Retourne les écarts (liste vide si la table est cohérente).
+    """
+    rows = db.execute(text(f"""
+        SELECT id_account, SUM(expected) AS expected, SUM(actual) AS actual
+        FROM (
+            SELECT id_account, delta_minor AS expected, 0 AS actual
+            FROM ({_ledger_delta_sql(since=False, until=False)}) balances
+            UNION ALL
+            SELECT id_account, 0 AS expected, balance_minor AS actual
+            FROM account_balance
+        ) compared
+        GROUP BY id_account
+        HAVING SUM(expected) <> SUM(actual)
+        ORDER BY id_account
+    """))
+    return [dict(row._mapping) for row in rows]
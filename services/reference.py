@@ -0,0 +1,217 @@
+"""
+Données de référence en cache (par worker): comptes, comptes de caisse, devises,
+catégories de dépense, statuts. Sert aux listes de référence, aux contrôles
+d'existence des routes (recherche dans un dictionnaire) et à la validation de
+gros lots sans requête par ligne.
+
+Chaque cache porte un numéro de version, incrémenté par les routes de création
+(ReferenceSets.changed): la lecture suivante recharge la table. Avec PostgreSQL,
+le changement est diffusé aux autres workers par NOTIFY; chaque worker écoute
+le canal (LISTEN) et invalide sa copie. Les comptes de caisse, créés hors de
+l'API, sont notifiés par un trigger sur caisse_projet. Sans notification (autre
+base, écoute interrompue), un identifiant absent du cache provoque un
+rechargement (au plus un par `min_reload` secondes) et `ttl` borne l'âge des
+données.
+"""
+import asyncio
+from abc import ABC, abstractmethod
+import logging
+import os
+import time
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import Column, func, inspect, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from caching import make_etag
+from config import settings
+from database import async_engine
+from models.finance import Account, CaisseProjet
+from models.referentiels import Devise, ExpenseCategory, StatutAppro, StatutFabrication, StatutLivraison
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "reference_cache"
+# Nom de cache d'une notification qui invalide tous les caches
+ALL_CACHES = "*"
+
+
+class CachedReference(ABC):
+    """Valeur chargée depuis la base, rechargée au changement de version ou après `ttl` secondes"""
+
+    def __init__(self, ttl: float, min_reload: float = 1.0):
+        self.ttl = ttl
+        self.min_reload = min_reload
+        self.version = 0
+        self._value: Any = None
+        self._loaded_version = -1
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        """Nouvelle version: la prochaine lecture recharge"""
+        self.version += 1
+
+    def _fresh(self) -> bool:
+        return self._loaded_version == self.version and time.monotonic() - self._loaded_at <= self.ttl
+
+    @abstractmethod
+    async def _query(self, db: AsyncSession) -> Any:
+        """Valeur à mettre en cache, lue depuis la base"""
+
+    async def _load(self, db: AsyncSession, loaded_at: float) -> Any:
+        async with self._lock:
+            # Un autre appel a rechargé pendant l'attente du verrou
+            if not self._fresh() or self._loaded_at == loaded_at:
+                # Version lue avant la requête: une invalidation pendant le chargement n'est pas perdue
+                version = self.version
+                self._value = await self._query(db)
+                self._loaded_version = version
+                self._loaded_at = time.monotonic()
+            return self._value
+
+    async def get(self, db: AsyncSession) -> Any:
+        if not self._fresh():
+            return await self._load(db, self._loaded_at)
+        return self._value
+
+    async def missing(self, db: AsyncSession, values: Iterable[Any]) -> Set[Any]:
+        """Valeurs inconnues (après un rechargement si le cache n'est pas récent)"""
+        wanted = set(values)
+        known = await self.get(db)
+        missing = {value for value in wanted if value not in known}
+        if missing and time.monotonic() - self._loaded_at > self.min_reload:
+            known = await self._load(db, self._loaded_at)
+            missing = {value for value in wanted if value not in known}
+        return missing
+
+
+class ReferenceSet(CachedReference):
+    """Valeurs d'une colonne de référence"""
+
+    def __init__(self, column: Column, ttl: float, min_reload: float = 1.0):
+        super().__init__(ttl, min_reload)
+        self.column = column
+
+    async def _query(self, db: AsyncSession) -> FrozenSet[Any]:
+        return frozenset((await db.scalars(select(self.column))).all())
+
+
+class ReferenceTable(CachedReference):
+    """Lignes d'une petite table de référence, indexées par clé primaire"""
+
+    def __init__(self, model: type, ttl: float, min_reload: float = 1.0):
+        super().__init__(ttl, min_reload)
+        self.model = model
+        self.key = inspect(model).primary_key[0]
+        self._etag: Optional[Tuple[Dict, str]] = None
+
+    async def _query(self, db: AsyncSession) -> Dict[Any, Dict[str, Any]]:
+        rows = (await db.execute(select(*self.model.__table__.columns).order_by(self.key))).mappings()
+        return {row[self.key.key]: dict(row) for row in rows}
+
+    async def snapshot(self, db: AsyncSession) -> Tuple[str, List[Dict[str, Any]]]:
+        """(ETag, lignes) d'une même version du cache; l'ETag est calculé une fois par chargement"""
+        value = await self.get(db)
+        if self._etag is None or self._etag[0] is not value:
+            self._etag = (value, make_etag(self.model.__tablename__, list(value.values())))
+        return self._etag[1], list(value.values())
+
+    async def find(self, db: AsyncSession, key: Any) -> Optional[Dict[str, Any]]:
+        """Ligne de clé `key`, None si elle n'existe pas"""
+        if await self.missing(db, (key,)):
+            return None
+        return self._value.get(key)
+
+
+class ReferenceSets:
+    """Caches de référence du worker et leur invalidation entre workers"""
+
+    def __init__(self, ttl: float, notify: bool = True):
+        self.accounts = ReferenceSet(Account.id_account, ttl)
+        self.caisse_accounts = ReferenceSet(CaisseProjet.id_account, ttl)
+        self.currencies = ReferenceTable(Devise, ttl)
+        self.expense_categories = ReferenceTable(ExpenseCategory, ttl)
+        self.statuts_fabrication = ReferenceTable(StatutFabrication, ttl)
+        self.statuts_livraison = ReferenceTable(StatutLivraison, ttl)
+        self.statuts_appro = ReferenceTable(StatutAppro, ttl)
+        self.notify = notify
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def caches(self) -> Dict[str, CachedReference]:
+        return {name: cache for name, cache in vars(self).items() if isinstance(cache, CachedReference)}
+
+    @property
+    def broadcast(self) -> bool:
+        return self.notify and async_engine.dialect.name == "postgresql"
+
+    def invalidate(self, *names: str):
+        """Nouvelle version des caches nommés (tous par défaut)"""
+        for name in names or self.caches:
+            cache = self.caches.get(name)
+            if cache is not None:
+                cache.invalidate()
+
+    async def changed(self, db: AsyncSession, *names: str):
+        """
+        À appeler après le commit d'une création: nouvelle version locale et,
+        avec PostgreSQL, notification des autres workers (tous les caches si
+        aucun nom n'est donné)
+        """
+        self.invalidate(*names)
+        if self.broadcast:
+            payload = f"{os.getpid()}:{','.join(names) or ALL_CACHES}"
+            await db.execute(select(func.pg_notify(NOTIFY_CHANNEL, payload)))
+            await db.commit()
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        sender, _, names = payload.partition(":")
+        if sender != str(os.getpid()):
+            # Aucun nom ou ALL_CACHES: tous les caches
+            self.invalidate(*(name for name in names.split(",") if name and name != ALL_CACHES))
+
+    def start(self):
+        if not self.broadcast or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._listen(), name="reference-cache-listener")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _listen(self):
+        """LISTEN sur une connexion dédiée (hors pool), reconnectée si elle tombe"""
+        import asyncpg
+
+        url = make_url(settings.database_url)
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(
+                    user=url.username, password=url.password, host=url.host,
+                    port=url.port, database=url.database
+                )
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(NOTIFY_CHANNEL, self._on_notify)
+                # Notifications manquées pendant la déconnexion
+                self.invalidate()
+                await closed.wait()
+                logger.warning("Écoute des changements de référence interrompue, reconnexion")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Écoute des changements de référence impossible: {e}")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(5)
+
+
+reference_sets = ReferenceSets(settings.reference_cache_ttl, notify=settings.reference_cache_notify)
@@ -0,0 +1,440 @@
+"""
+Rapports pré-calculés: compte de résultat, balance de vérification,
+valorisation du stock, relevé de caisse projet.
+
+Une demande crée un job (table report_job) exécuté dans un pool de processus:
+le calcul n'occupe pas les workers de l'API. Le rapport est écrit en JSON dans
+reports/ et réutilisé tant que les paramètres et l'état des données (watermark)
+sont identiques. ledger_line et stock_move n'étant jamais modifiées, le nombre
+de lignes et le plus grand identifiant suffisent à détecter un changement.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Type
+from pydantic import BaseModel
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from database import AsyncSessionLocal
+from models.finance import Account, CaisseProjet, LedgerLine
+from models.products import StockBalance, StockMove
+from models.referentiels import ExpenseCategory
+from models.reports import ReportJob
+from schemas.reports import ProfitLossParams, ProjectCashStatementParams, StockValuationParams, TrialBalanceParams
+from services.ledger import get_account_balances
+
+logger = logging.getLogger(__name__)
+
+# Un job en attente depuis plus longtemps est considéré perdu (worker arrêté)
+STALE_JOB_AFTER = timedelta(hours=1)
+# Un job en cours depuis plus longtemps est considéré perdu (processus tué, redémarrage)
+RUNNING_JOB_TIMEOUT = timedelta(minutes=10)
+# Au démarrage, un job en cours depuis plus longtemps n'a plus de worker
+# (les autres workers uvicorn démarrent en même temps)
+RUNNING_JOB_GRACE = timedelta(minutes=1)
+
+
+class ReportError(Exception):
+    """Rapport impossible à générer avec ces paramètres"""
+
+
+# ======================= CALCULS ==========================
+
+async def trial_balance(db: AsyncSession, as_of: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Balance de vérification - soldes de tous les comptes"""
+    balances = await get_account_balances(db, as_of)
+    accounts = (await db.execute(
+        select(Account.id_account, Account.libelle, Account.account_type)
+        .order_by(Account.account_type, Account.libelle)
+    )).all()
+    return [
+        {
+            "id_account": account.id_account,
+            "libelle": account.libelle,
+            "account_type": account.account_type,
+            "balance": float(balances.get(account.id_account, 0)) / 100  # Convertir en unités principales
+        }
+        for account in accounts
+    ]
+
+
+async def profit_loss(db: AsyncSession, date_from: Optional[datetime] = None,
+                      date_to: Optional[datetime] = None) -> Dict[str, Any]:
+    """Compte de résultat simplifié (sur une période si des dates sont fournies)"""
+    accounts = (await db.execute(
+        select(Account.id_account, Account.account_type)
+        .where(Account.account_type.in_(("INCOME", "EXPENSE")))
+    )).all()
+
+    # Résultat de la période = solde de fin - solde de début
+    closing = await get_account_balances(db, date_to)
+    opening = await get_account_balances(db, date_from) if date_from else {}
+
+    def period_balance(id_account: int) -> int:
+        return closing.get(id_account, 0) - opening.get(id_account, 0)
+
+    # Revenus au crédit, dépenses au débit
+    income_minor = -sum(period_balance(a.id_account) for a in accounts if a.account_type == "INCOME")
+    expenses_minor = sum(period_balance(a.id_account) for a in accounts if a.account_type == "EXPENSE")
+
+    total_income = float(income_minor) / 100
+    total_expenses = float(expenses_minor) / 100
+    return {
+        "total_income": total_income,
+        "total_expenses": total_expenses,
+        "net_profit": total_income - total_expenses,
+        "currency": "MAD"
+    }
+
+
+async def stock_valuation(db: AsyncSession, id_stock: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Valeur des soldes de stock au coût moyen pondéré des entrées
+    (mouvements vers un dépôt avec coût unitaire)
+    """
+    average_cost = (
+        select(
+            StockMove.id_article,
+            (func.sum(StockMove.qty * StockMove.unit_cost) / func.sum(StockMove.qty)).label("unit_cost")
+        )
+        .where(StockMove.dst_stock.isnot(None), StockMove.unit_cost.isnot(None))
+        .group_by(StockMove.id_article)
+        .subquery()
+    )
+    query = (
+        select(StockBalance.id_stock, StockBalance.id_article, StockBalance.qty, average_cost.c.unit_cost)
+        .outerjoin(average_cost, average_cost.c.id_article == StockBalance.id_article)
+        .where(StockBalance.qty != 0)
+        .order_by(StockBalance.id_stock, StockBalance.id_article)
+    )
+    if id_stock is not None:
+        query = query.where(StockBalance.id_stock == id_stock)
+
+    lines, total = [], Decimal(0)
+    for row in await db.execute(query):
+        unit_cost = Decimal(row.unit_cost) if row.unit_cost is not None else None
+        value = row.qty * unit_cost if unit_cost is not None else None
+        total += value or 0
+        lines.append({
+            "id_stock": row.id_stock,
+            "id_article": row.id_article,
+            "qty": float(row.qty),
+            "unit_cost": float(round(unit_cost, 4)) if unit_cost is not None else None,
+            "value": float(round(value, 2)) if value is not None else None
+        })
+    return {"lines": lines, "total_value": float(round(total, 2)), "currency": "MAD"}
+
+
+async def project_cash_statement(db: AsyncSession, project_id: int, date_from: Optional[datetime] = None,
+                                 date_to: Optional[datetime] = None) -> Dict[str, Any]:
+    """Relevé de la caisse d'un projet: solde d'ouverture, lignes de la période avec solde courant"""
+    id_account = await db.scalar(select(CaisseProjet.id_account).where(CaisseProjet.id_projet == project_id))
+    if id_account is None:
+        raise ReportError("Project cash not found")
+
+    # Entrées au débit de la caisse, sorties au crédit
+    delta = case((LedgerLine.debit_account == id_account, LedgerLine.amount_minor), else_=-LedgerLine.amount_minor)
+    on_account = or_(LedgerLine.debit_account == id_account, LedgerLine.credit_account == id_account)
+
+    opening_minor = 0
+    if date_from is not None:
+        opening_minor = await db.scalar(
+            select(func.coalesce(func.sum(delta), 0)).where(on_account, LedgerLine.date_op < date_from)
+        )
+
+    query = (
+        select(LedgerLine.id_line, LedgerLine.date_op, LedgerLine.amount_minor, LedgerLine.debit_account,
+               LedgerLine.currency, LedgerLine.memo, ExpenseCategory.libelle.label("category"))
+        .outerjoin(ExpenseCategory, ExpenseCategory.id_cat == LedgerLine.id_cat)
+        .where(on_account)
+        .order_by(LedgerLine.date_op, LedgerLine.id_line)
+    )
+    if date_from is not None:
+        query = query.where(LedgerLine.date_op >= date_from)
+    if date_to is not None:
+        query = query.where(LedgerLine.date_op < date_to)
+
+    balance_minor, total_in, total_out, lines = opening_minor, 0, 0, []
+    for row in await db.execute(query):
+        incoming = row.debit_account == id_account
+        if incoming:
+            balance_minor += row.amount_minor
+            total_in += row.amount_minor
+        else:
+            balance_minor -= row.amount_minor
+            total_out += row.amount_minor
+        lines.append({
+            "id_line": row.id_line,
+            "date_op": row.date_op.isoformat(),
+            "type": "CREDIT" if incoming else "DEBIT",
+            "amount": float(row.amount_minor) / 100,
+            "currency": row.currency,
+            "memo": row.memo,
+            "category": row.category,
+            "balance": float(balance_minor) / 100
+        })
+
+    return {
+        "project_id": project_id,
+        "id_account": id_account,
+        "opening_balance": float(opening_minor) / 100,
+        "total_in": float(total_in) / 100,
+        "total_out": float(total_out) / 100,
+        "closing_balance": float(balance_minor) / 100,
+        "currency": "MAD",
+        "lines": lines
+    }
+
+
+# ======================= WATERMARKS ==========================
+
+async def _ledger_watermark(db: AsyncSession) -> str:
+    lines = (await db.execute(select(func.count(LedgerLine.id_line), func.max(LedgerLine.id_line)))).one()
+    accounts = (await db.execute(select(func.count(Account.id_account), func.max(Account.id_account)))).one()
+    return f"ledger_line:{lines[0]}:{lines[1]}/account:{accounts[0]}:{accounts[1]}"
+
+
+async def _stock_watermark(db: AsyncSession) -> str:
+    moves = (await db.execute(select(func.count(StockMove.id_move), func.max(StockMove.id_move)))).one()
+    return f"stock_move:{moves[0]}:{moves[1]}"
+
+
+@dataclass(frozen=True)
+class ReportDefinition:
+    """Type de rapport: schéma des paramètres, état des données, calcul"""
+    params: Type[BaseModel]
+    watermark: Callable[[AsyncSession], Awaitable[str]]
+    render: Callable[[AsyncSession, Any], Awaitable[Any]]
+
+
+REPORTS: Dict[str, ReportDefinition] = {
+    "profit_loss": ReportDefinition(
+        ProfitLossParams, _ledger_watermark,
+        lambda db, p: profit_loss(db, p.date_from, p.date_to)
+    ),
+    "trial_balance": ReportDefinition(
+        TrialBalanceParams, _ledger_watermark,
+        lambda db, p: trial_balance(db, p.as_of)
+    ),
+    "stock_valuation": ReportDefinition(
+        StockValuationParams, _stock_watermark,
+        lambda db, p: stock_valuation(db, p.id_stock)
+    ),
+    "project_cash_statement": ReportDefinition(
+        ProjectCashStatementParams, _ledger_watermark,
+        lambda db, p: project_cash_statement(db, p.project_id, p.date_from, p.date_to)
+    ),
+}
+
+
+# ======================= JOBS ==========================
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _reusable(job: ReportJob) -> bool:
+    if job.status == "DONE":
+        return bool(job.file_path) and os.path.exists(job.file_path)
+    now = datetime.now(timezone.utc)
+    if job.status == "RUNNING" and job.started_at is not None:
+        return now - _aware(job.started_at) < RUNNING_JOB_TIMEOUT
+    return now - _aware(job.created_at) < STALE_JOB_AFTER
+
+
+async def request_report(db: AsyncSession, report_type: str, params: BaseModel,
+                         requested_by: Optional[int] = None) -> Tuple[ReportJob, bool]:
+    """
+    Job pour ce rapport: un job identique (mêmes paramètres, mêmes données) terminé
+    ou en cours est réutilisé, sinon un nouveau job est créé (à soumettre après commit).
+    Retourne (job, créé).
+    """
+    params_json = params.model_dump_json()
+    watermark = await REPORTS[report_type].watermark(db)
+    cache_key = hashlib.sha256(f"{report_type}\n{params_json}\n{watermark}".encode()).hexdigest()
+
+    existing = await db.scalar(
+        select(ReportJob)
+        .where(ReportJob.cache_key == cache_key, ReportJob.status != "FAILED")
+        .order_by(ReportJob.id_job.desc())
+        .limit(1)
+    )
+    if existing is not None and _reusable(existing):
+        return existing, False
+
+    job = ReportJob(
+        report_type=report_type,
+        params=params_json,
+        watermark=watermark,
+        cache_key=cache_key,
+        status="PENDING",
+        requested_by=requested_by,
+        created_at=datetime.now(timezone.utc)
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job, True
+
+
+def _write_report(path: str, payload: Dict[str, Any]) -> int:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.part"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+async def run_report_job(id_job: int) -> Optional[str]:
+    """
+    Génère le rapport d'un job en attente et enregistre le résultat.
+    Le passage PENDING -> RUNNING est atomique: un job n'est exécuté qu'une fois,
+    même soumis par plusieurs workers. Retourne le statut final (None si déjà pris).
+    """
+    async with AsyncSessionLocal() as db:
+        job = (await db.execute(
+            update(ReportJob)
+            .where(ReportJob.id_job == id_job, ReportJob.status == "PENDING")
+            .values(status="RUNNING", started_at=datetime.now(timezone.utc))
+            .returning(ReportJob.report_type, ReportJob.params, ReportJob.watermark, ReportJob.cache_key)
+        )).one_or_none()
+        await db.commit()
+        if job is None:
+            return None
+
+        try:
+            definition = REPORTS[job.report_type]
+            data = await definition.render(db, definition.params.model_validate_json(job.params))
+            await db.rollback()  # fin de la transaction de lecture
+            path = os.path.join(settings.report_dir, f"{job.report_type}_{id_job}_{job.cache_key[:12]}.json")
+            size = await asyncio.to_thread(_write_report, path, {
+                "id_job": id_job,
+                "report_type": job.report_type,
+                "params": json.loads(job.params),
+                "watermark": job.watermark,
+                "generated_at": datetime.now(timezone.utc).isoformat(),
+                "data": data
+            })
+            result = {"status": "DONE", "file_path": path, "size_bytes": size}
+        except Exception as e:
+            if not isinstance(e, ReportError):
+                logger.exception(f"Rapport {id_job} ({job.report_type}) échoué")
+            await db.rollback()
+            result = {"status": "FAILED", "error": str(e) or type(e).__name__}
+
+        await db.execute(
+            update(ReportJob)
+            .where(ReportJob.id_job == id_job)
+            .values(finished_at=datetime.now(timezone.utc), **result)
+        )
+        await db.commit()
+        return result["status"]
+
+
+async def _mark_failed(id_job: int, error: str):
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(ReportJob)
+            .where(ReportJob.id_job == id_job, ReportJob.status.in_(("PENDING", "RUNNING")))
+            .values(status="FAILED", error=error, finished_at=datetime.now(timezone.utc))
+        )
+        await db.commit()
+
+
+# Boucle asyncio du processus de génération: conservée d'un job à l'autre pour
+# réutiliser les connexions du moteur (liées à leur boucle)
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _run_in_worker(id_job: int) -> Optional[str]:
+    """Point d'entrée dans un processus du pool"""
+    global _worker_loop
+    if _worker_loop is None:
+        _worker_loop = asyncio.new_event_loop()
+    return _worker_loop.run_until_complete(run_report_job(id_job))
+
+
+class ReportJobs:
+    """
+    Exécution des jobs de rapport (par worker uvicorn). Le pool de processus est
+    créé au premier job; sans processus (workers = 0), les jobs tournent dans la
+    boucle de l'API.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: pas de fork d'un processus qui a déjà des threads et des connexions
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    async def _execute(self, id_job: int):
+        try:
+            if self.workers > 0:
+                await asyncio.get_running_loop().run_in_executor(self._get_pool(), _run_in_worker, id_job)
+            else:
+                await run_report_job(id_job)
+        except BrokenProcessPool as e:
+            # Processus tué (mémoire...): le pool sera recréé au prochain job
+            logger.warning(f"Pool de génération des rapports interrompu: {e}")
+            self._pool = None
+            await _mark_failed(id_job, "Report worker crashed")
+        except Exception as e:
+            logger.warning(f"Rapport {id_job} échoué: {e}")
+            await _mark_failed(id_job, str(e))
+
+    def submit(self, id_job: int):
+        """Lance la génération en tâche de fond (après le commit du job)"""
+        task = asyncio.create_task(self._execute(id_job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def start(self):
+        """
+        Redémarrage de l'API: les jobs restés en cours sont marqués en échec (leur
+        worker a disparu), les jobs restés en attente sont relancés
+        """
+        now = datetime.now(timezone.utc)
+        async with AsyncSessionLocal() as db:
+            orphaned = await db.execute(
+                update(ReportJob)
+                .where(ReportJob.status == "RUNNING", ReportJob.started_at < now - RUNNING_JOB_GRACE)
+                .values(status="FAILED", error="Report worker stopped", finished_at=now)
+            )
+            await db.commit()
+            if orphaned.rowcount:
+                logger.warning(f"{orphaned.rowcount} rapport(s) interrompu(s) marqué(s) en échec")
+            pending = (await db.scalars(
+                select(ReportJob.id_job)
+                .where(ReportJob.status == "PENDING", ReportJob.created_at >= now - STALE_JOB_AFTER)
+                .order_by(ReportJob.id_job)
+            )).all()
+        for id_job in pending:
+            self.submit(id_job)
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+report_jobs = ReportJobs(settings.report_workers)
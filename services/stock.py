@@ -0,0 +1,243 @@
+"""
+Soldes de stock (table stock_balance) maintenus de façon incrémentale
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from config import settings
+from database import async_engine
+from models.documents import Document
+from models.products import Article, Stock, StockBalance, StockMove
+from models.referentiels import Devise
+from services.associations import existing_ids
+
+logger = logging.getLogger(__name__)
+
+# Lignes par instruction upsert (3 paramètres liés par ligne)
+BALANCE_CHUNK_SIZE = 5000
+
+# Soldes recalculés depuis l'historique complet des mouvements
+_MOVES_BALANCE_SQL = """
+    SELECT id_stock, id_article, SUM(delta) AS qty
+    FROM (
+        SELECT dst_stock AS id_stock, id_article, qty AS delta
+        FROM stock_move WHERE dst_stock IS NOT NULL
+        UNION ALL
+        SELECT src_stock AS id_stock, id_article, -qty AS delta
+        FROM stock_move WHERE src_stock IS NOT NULL
+    ) moves
+    GROUP BY id_stock, id_article
+"""
+
+
+def stock_move_deltas(
+    id_article: int,
+    src_stock: Optional[int],
+    dst_stock: Optional[int],
+    qty: Decimal
+) -> List[Tuple[int, int, Decimal]]:
+    """
+    Variations (id_stock, id_article, delta) induites par un mouvement,
+    triées par stock pour verrouiller les lignes toujours dans le même ordre
+    """
+    deltas = []
+    if src_stock is not None:
+        deltas.append((src_stock, id_article, -qty))
+    if dst_stock is not None:
+        deltas.append((dst_stock, id_article, qty))
+    return sorted(deltas, key=lambda delta: delta[0])
+
+
+def _upsert_balances(dialect_name: str, rows: List[Dict[str, Any]]):
+    """
+    INSERT ... ON CONFLICT DO UPDATE: crée les lignes ou les incrémente sous verrou de ligne.
+    Une clé (id_stock, id_article) ne doit apparaître qu'une fois par instruction.
+    """
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(StockBalance).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[StockBalance.id_stock, StockBalance.id_article],
+        set_={"qty": StockBalance.qty + stmt.excluded.qty}
+    )
+
+
+async def apply_stock_move(db: AsyncSession, move: StockMove):
+    """
+    Répercute un mouvement sur stock_balance dans la transaction courante.
+    Doit être appelé avant le commit qui enregistre le mouvement.
+    """
+    dialect_name = db.bind.dialect.name
+    for id_stock, id_article, delta in stock_move_deltas(
+        move.id_article, move.src_stock, move.dst_stock, Decimal(move.qty)
+    ):
+        await db.execute(_upsert_balances(dialect_name, [{"id_stock": id_stock, "id_article": id_article, "qty": delta}]))
+
+
+async def apply_stock_moves(db: AsyncSession, moves: Iterable[Any]):
+    """
+    Répercute un lot de mouvements sur stock_balance (transaction courante):
+    variations cumulées par (stock, article), une ligne upsert par clé, dans l'ordre des clés.
+    """
+    totals: Dict[Tuple[int, int], Decimal] = defaultdict(Decimal)
+    for move in moves:
+        for id_stock, id_article, delta in stock_move_deltas(
+            move.id_article, move.src_stock, move.dst_stock, Decimal(move.qty)
+        ):
+            totals[(id_stock, id_article)] += delta
+
+    rows = [
+        {"id_stock": id_stock, "id_article": id_article, "qty": delta}
+        for (id_stock, id_article), delta in sorted(totals.items())
+    ]
+    dialect_name = db.bind.dialect.name
+    for start in range(0, len(rows), BALANCE_CHUNK_SIZE):
+        await db.execute(_upsert_balances(dialect_name, rows[start:start + BALANCE_CHUNK_SIZE]))
+
+
+async def stock_move_reference_errors(db: AsyncSession, moves: List[Tuple[int, Any]]) -> Dict[int, List[str]]:
+    """
+    Références inconnues (article, stocks, devise, document) d'un lot de mouvements,
+    par index de ligne. Une requête IN par table pour tout le lot.
+    """
+    articles = await existing_ids(db, Article.id_article, (m.id_article for _, m in moves))
+    stocks = await existing_ids(db, Stock.id_stock, (
+        stock for _, m in moves for stock in (m.src_stock, m.dst_stock) if stock is not None
+    ))
+    currencies = await existing_ids(db, Devise.code, (m.currency for _, m in moves if m.currency is not None))
+    documents = await existing_ids(db, Document.id_document, (m.ref_document for _, m in moves if m.ref_document is not None))
+
+    errors: Dict[int, List[str]] = {}
+    for index, move in moves:
+        row_errors = []
+        if move.id_article not in articles:
+            row_errors.append("Article not found")
+        if move.src_stock is not None and move.src_stock not in stocks:
+            row_errors.append("Source stock not found")
+        if move.dst_stock is not None and move.dst_stock not in stocks:
+            row_errors.append("Destination stock not found")
+        if move.src_stock is None and move.dst_stock is None:
+            row_errors.append("At least one stock (source or destination) must be specified")
+        if move.currency is not None and move.currency not in currencies:
+            row_errors.append("Currency not found")
+        if move.ref_document is not None and move.ref_document not in documents:
+            row_errors.append("Reference document not found")
+        if row_errors:
+            errors[index] = row_errors
+    return errors
+
+
+def rebuild_stock_balance(db: Session) -> int:
+    """
+    Reconstruit stock_balance depuis stock_move.
+    Sous PostgreSQL, les mouvements concurrents attendent la fin de la reconstruction.
+    """
+    if db.bind.dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE stock_move IN SHARE MODE"))
+        db.execute(text("LOCK TABLE stock_balance IN EXCLUSIVE MODE"))
+    db.execute(text("DELETE FROM stock_balance"))
+    result = db.execute(text(f"""
+        INSERT INTO stock_balance (id_stock, id_article, qty)
+        SELECT id_stock, id_article, qty FROM ({_MOVES_BALANCE_SQL}) balances
+    """))
+    db.commit()
+    return result.rowcount
+
+
+def verify_stock_balance(db: Session) -> List[Dict[str, Any]]:
+    """
+    Compare stock_balance aux soldes recalculés depuis stock_move.
+    Retourne les écarts (liste vide si la table est cohérente).
+    """
+    rows = db.execute(text(f"""
+        SELECT id_stock, id_article, SUM(expected) AS expected, SUM(actual) AS actual
+        FROM (
+            SELECT id_stock, id_article, qty AS expected, 0 AS actual
+            FROM ({_MOVES_BALANCE_SQL}) balances
+            UNION ALL
+            SELECT id_stock, id_article, 0 AS expected, qty AS actual
+            FROM stock_balance
+        ) compared
+        GROUP BY id_stock, id_article
+        HAVING SUM(expected) <> SUM(actual)
+        ORDER BY id_stock, id_article
+    """))
+    return [dict(row._mapping) for row in rows]
+
+
+class StockInventoryRefresher:
+    """
+    Rafraîchit la vue matérialisée stock_inventory en tâche de fond (par worker):
+    toutes les `interval` secondes, et `debounce` secondes après un mouvement de
+    stock (les écritures rapprochées sont regroupées en un seul rafraîchissement).
+    """
+
+    def __init__(self, interval: float, debounce: float):
+        self.interval = interval
+        self.debounce = debounce
+        self.last_refresh: Optional[datetime] = None
+        self._dirty: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0 and async_engine.dialect.name == "postgresql"
+
+    def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self._dirty = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="stock-inventory-refresher")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def mark_dirty(self):
+        """Signale un mouvement de stock: rafraîchissement après le délai de regroupement"""
+        if self._dirty is not None:
+            self._dirty.set()
+
+    async def refresh(self) -> bool:
+        """
+        REFRESH MATERIALIZED VIEW CONCURRENTLY (lectures non bloquées).
+        Un verrou consultatif évite que plusieurs workers rafraîchissent en même temps.
+        """
+        async with async_engine.begin() as conn:
+            locked = await conn.scalar(text("SELECT pg_try_advisory_xact_lock(hashtext('stock_inventory'))"))
+            if not locked:
+                return False
+            await conn.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY stock_inventory"))
+        self.last_refresh = datetime.now(timezone.utc)
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._dirty.wait(), timeout=self.interval)
+                await asyncio.sleep(self.debounce)
+            except asyncio.TimeoutError:
+                pass
+            self._dirty.clear()
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Rafraîchissement de stock_inventory échoué: {e}")
+
+
+stock_inventory_refresher = StockInventoryRefresher(
+    interval=settings.stock_inventory_refresh_interval,
+    debounce=settings.stock_inventory_refresh_debounce
+)
@@ -0,0 +1,230 @@
+"""
+Stockage des fichiers uploadés, adressé par contenu: chaque contenu est écrit
+une seule fois sous upload_dir/ab/cd/<sha256> et compté dans document_blob.
+
+L'upload est écrit en flux par blocs vers un fichier temporaire avec hachage
+incrémental (MD5 + SHA-256); un contenu déjà connu n'est pas réécrit.
+UploadSizeLimitRoute borne le corps de la requête avant l'analyse multipart.
+"""
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Optional
+from fastapi import HTTPException, Request, Response, UploadFile, status
+from fastapi.routing import APIRoute
+from sqlalchemy import delete, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from config import settings
+from metrics import upload_bytes
+from models.documents import Document, DocumentBlob
+from services.images import derivative_path, image_sizes
+
+
+# Enveloppe multipart (délimiteurs, en-têtes de partie) tolérée autour du fichier
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class FileTooLargeError(Exception):
+    """Le fichier dépasse settings.max_file_size"""
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File too large. Max size: {settings.max_file_size} bytes"
+    )
+
+
+class UploadSizeLimitRoute(APIRoute):
+    """
+    Route dont le corps est borné à max_file_size + MULTIPART_OVERHEAD avant que
+    Starlette ne l'analyse (et ne l'écrive sur disque): Content-Length trop grand
+    rejeté sans lecture, flux coupé dès que la limite est dépassée (chunked)
+    APIRouter(..., route_class=UploadSizeLimitRoute)
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request) -> Response:
+            limit = settings.max_file_size + MULTIPART_OVERHEAD
+            length = request.headers.get("content-length", "")
+            if length.isdigit() and int(length) > limit:
+                raise _too_large()
+            received = 0
+
+            async def receive():
+                nonlocal received
+                message = await request.receive()
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _too_large()
+                return message
+
+            return await handler(Request(request.scope, receive))
+
+        return limited_handler
+
+
+@dataclass
+class StoredFile:
+    """Contenu enregistré dans le magasin de blobs"""
+    file_path: str
+    filename: str
+    size_bytes: int
+    md5: str
+    sha256: str
+    deduplicated: bool  # contenu déjà présent, rien n'a été écrit
+
+
+def blob_path(sha256: str) -> str:
+    """Chemin du blob: répertoires de 2 niveaux pour limiter le nombre d'entrées par dossier"""
+    return os.path.join(settings.upload_dir, sha256[:2], sha256[2:4], sha256)
+
+
+def _write_chunk(f: BinaryIO, md5, sha256, chunk: bytes):
+    """Hache et écrit un bloc (hashlib libère le GIL sur les gros blocs)"""
+    md5.update(chunk)
+    sha256.update(chunk)
+    f.write(chunk)
+
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _discard_with_derivatives(path: str):
+    _discard(path)
+    for size in image_sizes():
+        _discard(derivative_path(path, size))
+
+
+def _place_blob(tmp_path: str, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+
+
+def _acquire_blob(dialect_name: str, sha256: str, size: int, refs: int = 1):
+    """
+    INSERT ... ON CONFLICT DO UPDATE: crée le blob ou ajoute `refs` références
+    (refs=0: verrouille la ligne sans la modifier)
+    """
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(DocumentBlob).values(sha256=sha256, size_bytes=size, ref_count=refs)
+    return stmt.on_conflict_do_update(
+        index_elements=[DocumentBlob.sha256],
+        set_={"ref_count": DocumentBlob.ref_count + refs}
+    ).returning(DocumentBlob.ref_count)
+
+
+async def _purge_blob(db: AsyncSession, sha256: str, size: int = 0):
+    """
+    Supprime un blob sans référence (nouvelle transaction, après le commit ou le
+    rollback de l'opération). La ligne est verrouillée pendant la suppression du
+    fichier: un upload concurrent du même contenu attend puis recrée le blob.
+    """
+    ref_count = await db.scalar(_acquire_blob(db.bind.dialect.name, sha256, size, refs=0))
+    if ref_count <= 0:
+        await db.execute(delete(DocumentBlob).where(DocumentBlob.sha256 == sha256))
+        await run_in_threadpool(_discard_with_derivatives, blob_path(sha256))
+    await db.commit()
+
+
+async def save_upload(db: AsyncSession, file: UploadFile) -> StoredFile:
+    """
+    Enregistre un UploadFile et prend une référence sur son blob (transaction courante).
+    Lève FileTooLargeError si le fichier dépasse max_file_size (le corps de la
+    requête est déjà borné par UploadSizeLimitRoute).
+    Si la transaction échoue ensuite, appeler discard_upload après le rollback.
+    """
+    os.makedirs(settings.upload_dir, exist_ok=True)
+    # Même système de fichiers que le blob: os.replace reste atomique
+    fd, tmp_path = tempfile.mkstemp(dir=settings.upload_dir, prefix=".upload-", suffix=".part")
+    md5, sha256 = hashlib.md5(), hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := await file.read(settings.upload_chunk_size):
+                size += len(chunk)
+                if size > settings.max_file_size:
+                    raise FileTooLargeError(f"File too large. Max size: {settings.max_file_size} bytes")
+                await run_in_threadpool(_write_chunk, f, md5, sha256, chunk)
+            await run_in_threadpool(os.fsync, f.fileno())
+
+        digest = sha256.hexdigest()
+        path = blob_path(digest)
+        # Le verrou de ligne pris par l'upsert sérialise avec _purge_blob
+        ref_count = await db.scalar(_acquire_blob(db.bind.dialect.name, digest, size))
+        deduplicated = ref_count > 1 and os.path.exists(path)
+        if deduplicated:
+            _discard(tmp_path)
+        else:
+            await run_in_threadpool(_place_blob, tmp_path, path)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+
+    upload_bytes.labels("true" if deduplicated else "false").inc(size)
+    return StoredFile(
+        file_path=path,
+        filename=os.path.basename(file.filename or "upload"),
+        size_bytes=size,
+        md5=md5.hexdigest(),
+        sha256=digest,
+        deduplicated=deduplicated
+    )
+
+
+async def discard_upload(db: AsyncSession, stored: StoredFile):
+    """Annule save_upload après l'échec (rollback) de la transaction qui l'a enregistré"""
+    if not stored.deduplicated:
+        await _purge_blob(db, stored.sha256, stored.size_bytes)
+
+
+@dataclass
+class ReleasedFile:
+    """Fichier d'un document supprimé, à purger après le commit"""
+    file_path: str
+    sha256: Optional[str]  # None: fichier antérieur au magasin de blobs
+
+
+async def release_document_file(db: AsyncSession, document: Document) -> Optional[ReleasedFile]:
+    """
+    Rend la référence d'un document supprimé sur son blob (transaction courante).
+    Rien n'est supprimé du disque: après le commit, purge_released_file supprime
+    le blob s'il n'a plus de référence. Si le commit échoue (document encore
+    référencé), le fichier reste en place.
+    """
+    ref_count = None
+    if document.sha256:
+        ref_count = await db.scalar(
+            update(DocumentBlob)
+            .where(DocumentBlob.sha256 == document.sha256)
+            .values(ref_count=DocumentBlob.ref_count - 1)
+            .returning(DocumentBlob.ref_count)
+        )
+    if ref_count is None:
+        return ReleasedFile(document.file_path, None)
+    if ref_count <= 0:
+        return ReleasedFile(blob_path(document.sha256), document.sha256)
+    return None
+
+
+async def purge_released_file(db: AsyncSession, released: Optional[ReleasedFile]):
+    """
+    Après le commit de la suppression: supprime le blob si sa dernière référence
+    a été rendue (revérifié, un upload concurrent a pu le reprendre), ou le
+    fichier antérieur au magasin de blobs
+    """
+    if released is None:
+        return
+    if released.sha256 is None:
+        await run_in_threadpool(_discard_with_derivatives, released.file_path)
+        return
+    await _purge_blob(db, released.sha256)
@@ -0,0 +1,65 @@
+"""
+Tests des encodeurs d'export (services/exports.py)
+
+Lots de lignes ledger_line encodés sans base de données. Le format Parquet
+nécessite pyarrow (requirements-optional.txt): ses tests sont ignorés sans lui.
+"""
+import io
+import os
+import sys
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("ENVIRONMENT", "test")
+
+import pytest
+from services import exports
+from services.exports import EXPORT_DATASETS, ExportFormatUnavailable, ExportWriter
+
+COLUMNS = [c.name for c in EXPORT_DATASETS["ledger_line"].table.columns]
+
+
+def ledger_rows(start: int, count: int):
+    """Lignes dans l'ordre des colonnes de la table"""
+    rows = []
+    for id_line in range(start, start + count):
+        values = {
+            "id_line": id_line,
+            "debit_account": 1,
+            "credit_account": 2,
+            "amount_minor": 1000 + id_line,
+            "currency": "MAD",
+            "fx_rate": Decimal("10.25000000") if id_line % 2 else None,
+            "date_op": datetime(2024, 3, 1, 10, 20, id_line % 60, tzinfo=timezone.utc),
+            "id_cat": None,
+            "memo": f"ligne {id_line}",
+        }
+        rows.append(tuple(values[name] for name in COLUMNS))
+    return rows
+
+
+def write_batches(fmt: str, batches) -> bytes:
+    writer = ExportWriter("ledger_line", fmt)
+    return writer.start() + b"".join(writer.rows(rows) for rows in batches) + writer.finish()
+
+
+def test_parquet_unavailable_without_pyarrow(monkeypatch):
+    """Sans pyarrow, l'erreur est levée avant le début du flux"""
+    monkeypatch.setattr(exports, "pyarrow", None)
+    with pytest.raises(ExportFormatUnavailable):
+        ExportWriter("ledger_line", "parquet")
+
+
+def test_parquet_round_trip():
+    """Un row group par lot; décimaux, dates UTC et NULL conservés"""
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    batches = [ledger_rows(1, 3), ledger_rows(4, 2)]
+
+    parquet_file = pyarrow_parquet.ParquetFile(io.BytesIO(write_batches("parquet", batches)))
+    assert parquet_file.metadata.num_row_groups == 2
+    table = parquet_file.read()
+    assert table.column_names == COLUMNS
+    assert table.to_pylist() == [dict(zip(COLUMNS, row)) for rows in batches for row in rows]
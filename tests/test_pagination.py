@@ -0,0 +1,67 @@
+"""
+Tests de la pagination par curseur (pagination.py)
+
+Base SQLite en mémoire: les dates-heures du défaut serveur (CURRENT_TIMESTAMP,
+sans fraction) et celles liées par l'application (microsecondes) partagent la
+même seconde; le curseur doit avancer jusqu'à la fin sans répéter de ligne.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("ENVIRONMENT", "test")
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import StaticPool
+from pagination import fetch_page
+from schemas.common import PaginationParams
+
+Base = declarative_base()
+
+
+class Move(Base):
+    __tablename__ = "move"
+
+    id_move = Column(Integer, primary_key=True)
+    date_move = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+async def follow_cursor(descending: bool):
+    engine = create_async_engine(
+        "sqlite+aiosqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSession(engine) as db:
+        db.add_all(Move() for _ in range(6))
+        await db.flush()
+        stored = (await db.scalars(select(Move.date_move).limit(1))).one()
+        db.add_all(Move(date_move=stored.replace(microsecond=ms * 1000)) for ms in (0, 250, 500))
+        await db.commit()
+
+        seen, cursor = [], None
+        # Un curseur qui n'avance pas relirait la même page indéfiniment
+        for _ in range(10):
+            pagination = PaginationParams(page_size=2, cursor=cursor)
+            items, cursor = await fetch_page(
+                db, select(Move), pagination, Move.date_move, Move.id_move, descending=descending
+            )
+            seen.extend(item.id_move for item in items)
+            if cursor is None:
+                break
+    await engine.dispose()
+    return seen
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_cursor_walks_same_second_rows(descending):
+    """Chaque ligne apparaît une fois, dans l'ordre (date, id)"""
+    seen = asyncio.run(follow_cursor(descending))
+    expected = list(range(1, 10))
+    assert seen == (expected[::-1] if descending else expected)
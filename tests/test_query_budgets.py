@@ -0,0 +1,89 @@
+"""
+Tests de l'instrumentation SQL par requête (instrumentation.py)
+
+Moteur SQLite en mémoire et mini-application FastAPI reproduisant le middleware
+de main.py: détection des N+1 par forme d'instruction, en-tête Server-Timing
+et échec des routes au-delà de leur budget @query_budget en mode test.
+"""
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("ENVIRONMENT", "test")
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+from config import TestConfig
+from instrumentation import (
+    QueryBudgetExceeded, instrument_engine, query_budget, report_request, statement_shape, track_queries
+)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    # Une seule connexion: la base en mémoire est visible depuis le thread du TestClient
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    instrument_engine(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY, libelle TEXT)"))
+        conn.execute(text("INSERT INTO item (id, libelle) VALUES (:id, 'x')"), [{"id": i} for i in range(1, 21)])
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def client(engine):
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def instrument(request: Request, call_next):
+        with track_queries(detailed=True) as stats:
+            response = await call_next(request)
+        report_request(request, response, stats, 0.0, strict=True)
+        return response
+
+    @app.get("/items")
+    @query_budget(2)
+    async def list_items(n: int = 1):
+        """Une requête par élément: N+1 volontaire"""
+        with engine.connect() as conn:
+            return [conn.execute(text("SELECT libelle FROM item WHERE id = :id"), {"id": i}).scalar() for i in range(1, n + 1)]
+
+    return TestClient(app)
+
+
+def test_statement_shape_collapses_in_lists():
+    """Les listes IN développées donnent une seule forme quelle que soit leur longueur"""
+    assert statement_shape("SELECT * FROM item WHERE id IN (?, ?)") == statement_shape(
+        "SELECT * FROM item\n WHERE id IN ($1, $2, $3)"
+    )
+    assert statement_shape("SELECT * FROM item WHERE id = %(id_1)s") == "SELECT * FROM item WHERE id = ?"
+
+
+def test_repeated_statement_flagged(engine):
+    """Même instruction exécutée en boucle: signalée; requête groupée: non"""
+    with track_queries(detailed=True) as stats:
+        with engine.connect() as conn:
+            for i in range(1, 7):
+                conn.execute(text("SELECT libelle FROM item WHERE id = :id"), {"id": i})
+            conn.execute(text("SELECT libelle FROM item WHERE id IN (1, 2, 3)"))
+    assert stats.queries == 7
+    assert stats.repeated(5) == [("SELECT libelle FROM item WHERE id = ?", 6)]
+
+
+def test_within_budget_reports_server_timing(client):
+    response = client.get("/items", params={"n": 2})
+    assert response.status_code == 200
+    assert 'desc="2 SQL"' in response.headers["Server-Timing"]
+
+
+def test_budget_exceeded_fails(client):
+    """En mode test, une route au-delà de son budget fait échouer la requête"""
+    assert TestConfig().sql_query_budget_strict
+    with pytest.raises(QueryBudgetExceeded, match="3 SQL statements, budget 2"):
+        client.get("/items", params={"n": 3})
@@ -0,0 +1,238 @@
+"""
+Tests de non-régression des plans de requête (PostgreSQL)
+
+Applique les migrations Alembic sur la base de test (ENVIRONMENT=test), charge un
+jeu de données dans une transaction annulée en fin de module, puis vérifie avec
+EXPLAIN que la requête principale de chaque route utilise l'index attendu.
+Ignorés si la base PostgreSQL de test n'est pas joignable.
+"""
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("ENVIRONMENT", "test")
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, exc, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import make_url
+from config import settings
+from models.finance import LedgerLine
+from models.hr import Employe
+from models.products import StockBalance, StockMove
+from models.vehicles import VoitureConducteur
+
+# Volumétrie réaliste: les valeurs "rares" sont hors des valeurs fréquentes
+# collectées par ANALYZE, le planificateur les sait sélectives.
+SEED_SQL = """
+INSERT INTO devise (code, libelle) VALUES ('XTS', 'Test') ON CONFLICT DO NOTHING;
+
+INSERT INTO account (libelle, account_type) SELECT 'plan', 'ASSET' FROM generate_series(1, 100);
+INSERT INTO account (libelle, account_type) VALUES ('plan-rare', 'ASSET');
+INSERT INTO ledger_line (debit_account, credit_account, amount_minor, currency, date_op)
+SELECT b.id + mod(g, 100), b.id + mod(g + 1, 100), 100, 'XTS', now() - g * interval '1 hour'
+FROM generate_series(1, 50000) g, (SELECT min(id_account) AS id FROM account WHERE libelle = 'plan') b;
+INSERT INTO ledger_line (debit_account, credit_account, amount_minor, currency, date_op)
+SELECT r.id_account, b.id, 100, 'XTS', now() - g * interval '1 day'
+FROM generate_series(1, 3) g,
+     (SELECT id_account FROM account WHERE libelle = 'plan-rare') r,
+     (SELECT min(id_account) AS id FROM account WHERE libelle = 'plan') b;
+
+INSERT INTO produit (libelle) VALUES ('plan');
+INSERT INTO article (id_produit)
+SELECT p.id FROM generate_series(1, 200), (SELECT max(id_produit) AS id FROM produit) p;
+INSERT INTO stock (libelle) SELECT 'plan' FROM generate_series(1, 50);
+INSERT INTO stock (libelle) VALUES ('plan-rare');
+INSERT INTO stock_move (id_article, src_stock, dst_stock, qty, date_move)
+SELECT a.id + mod(g, 200),
+       CASE WHEN mod(g, 3) = 0 THEN NULL ELSE s.id + mod(g, 50) END,
+       s.id + mod(g + 1, 50),
+       1,
+       now() - g * interval '1 minute'
+FROM generate_series(1, 50000) g,
+     (SELECT max(id_article) - 199 AS id FROM article) a,
+     (SELECT min(id_stock) AS id FROM stock WHERE libelle = 'plan') s;
+INSERT INTO stock_move (id_article, src_stock, dst_stock, qty)
+SELECT a.id, NULL, r.id_stock, 1
+FROM generate_series(1, 3),
+     (SELECT max(id_article) AS id FROM article) a,
+     (SELECT id_stock FROM stock WHERE libelle = 'plan-rare') r;
+
+INSERT INTO employe (nom, prenom, email)
+SELECT 'plan', 'plan', 'plan-' || g || '@test.local' FROM generate_series(1, 5000) g;
+INSERT INTO voiture (modele) SELECT 'plan' FROM generate_series(1, 500);
+INSERT INTO voiture_conducteur (id_voiture, id_employe, date_debut, date_fin)
+SELECT v.id + mod(g, 500), e.id + g - 1, date '2000-01-01' + g,
+       CASE WHEN g > 4500 THEN NULL ELSE date '2000-01-01' + g + 30 END
+FROM generate_series(1, 5000) g,
+     (SELECT min(id_voiture) AS id FROM voiture WHERE modele = 'plan') v,
+     (SELECT min(id_employe) AS id FROM employe WHERE nom = 'plan') e;
+
+ANALYZE;
+"""
+
+# Valeurs de référence du jeu de données (résolues après le chargement)
+LOOKUPS_SQL = {
+    "rare_account": "SELECT id_account FROM account WHERE libelle = 'plan-rare'",
+    "rare_stock": "SELECT id_stock FROM stock WHERE libelle = 'plan-rare'",
+    "article": "SELECT max(id_article) FROM article",
+    "voiture": "SELECT max(id_voiture) FROM voiture WHERE modele = 'plan'",
+}
+
+# Tables de liaison: recherche par la seconde colonne (suppression en cascade d'un document, etc.)
+JUNCTION_INDEXES = [
+    ("document_tag", "id_tag", "ix_document_tag_id_tag"),
+    ("task_assignment", "id_employe", "ix_task_assignment_id_employe"),
+    ("task_dependency", "id_child_task", "ix_task_dependency_id_child_task"),
+    ("task_document", "id_document", "ix_task_document_id_document"),
+    ("materiel_document", "id_document", "ix_materiel_document_id_document"),
+    ("produit_fournisseur", "id_entreprise", "ix_produit_fournisseur_id_entreprise"),
+    ("projet_voiture", "id_voiture", "ix_projet_voiture_id_voiture"),
+    ("projet_materiel", "id_materiel", "ix_projet_materiel_id_materiel"),
+    ("projet_document", "id_document", "ix_projet_document_id_document"),
+    ("nomenclature_produit", "id_produit", "ix_nomenclature_produit_id_produit"),
+    ("nomenclature_document", "id_document", "ix_nomenclature_document_id_document"),
+    ("of_nomenclature", "id_nomenclature", "ix_of_nomenclature_id_nomenclature"),
+    ("of_document", "id_document", "ix_of_document_id_document"),
+]
+
+
+def route_queries(ids):
+    """Requête principale de chaque route (première page, taille par défaut)"""
+    page = settings.default_page_size + 1
+    rare_account_lines = (LedgerLine.debit_account == ids["rare_account"]) | (LedgerLine.credit_account == ids["rare_account"])
+    rare_stock_moves = (StockMove.src_stock == ids["rare_stock"]) | (StockMove.dst_stock == ids["rare_stock"])
+    return {
+        # POST /auth/login
+        "login": (
+            select(Employe).where(Employe.email == "plan-42@test.local", Employe.is_active == "1"),
+            {"employe_email_key"},
+        ),
+        # GET /ledger/lines
+        "ledger_lines": (
+            select(LedgerLine).order_by(LedgerLine.date_op.desc(), LedgerLine.id_line.desc()).limit(page),
+            {"ix_ledger_line_date_op"},
+        ),
+        # GET /ledger/lines?account_id= et GET /projects/{id}/cash/ledger
+        "ledger_lines_by_account": (
+            select(LedgerLine).where(rare_account_lines)
+            .order_by(LedgerLine.date_op.desc(), LedgerLine.id_line.desc()).limit(page),
+            {"ix_ledger_line_debit_account", "ix_ledger_line_credit_account"},
+        ),
+        # GET /stock-moves?article_id=
+        "stock_moves_by_article": (
+            select(StockMove).where(StockMove.id_article == ids["article"])
+            .order_by(StockMove.date_move.desc(), StockMove.id_move.desc()).limit(page),
+            {"ix_stock_move_id_article"},
+        ),
+        # GET /stock-moves?stock_id=
+        "stock_moves_by_stock": (
+            select(StockMove).where(rare_stock_moves)
+            .order_by(StockMove.date_move.desc(), StockMove.id_move.desc()).limit(page),
+            {"ix_stock_move_src_stock", "ix_stock_move_dst_stock"},
+        ),
+        # GET /stocks/{id}/inventory
+        "stock_inventory": (
+            select(StockBalance).where(StockBalance.id_stock == ids["rare_stock"], StockBalance.qty > 0),
+            {"stock_balance_pkey"},
+        ),
+        # POST /vehicles/{id}/drivers (conducteur actif)
+        "active_driver": (
+            select(VoitureConducteur).where(
+                VoitureConducteur.id_voiture == ids["voiture"],
+                VoitureConducteur.date_fin.is_(None)
+            ),
+            {"ix_voiture_conducteur_active"},
+        ),
+    }
+
+
+def explain(conn, sql: str):
+    """Index utilisés et tables parcourues séquentiellement par le plan"""
+    plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+    indexes, seq_scans = set(), set()
+
+    def walk(node):
+        if "Index Name" in node:
+            indexes.add(node["Index Name"])
+        if node["Node Type"] == "Seq Scan":
+            seq_scans.add(node["Relation Name"])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return indexes, seq_scans
+
+
+def compile_sql(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+@pytest.fixture(scope="module")
+def conn():
+    if make_url(settings.database_url).get_backend_name() != "postgresql":
+        pytest.skip("Plans de requête vérifiés uniquement sur PostgreSQL")
+
+    engine = create_engine(settings.database_url)
+    try:
+        engine.connect().close()
+    except exc.OperationalError as e:
+        pytest.skip(f"Base PostgreSQL de test indisponible: {e}")
+
+    alembic_cfg = Config(str(ROOT / "alembic.ini"))
+    alembic_cfg.set_main_option("script_location", str(ROOT / "database" / "migrations"))
+    command.upgrade(alembic_cfg, "head")
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    try:
+        connection.exec_driver_sql(SEED_SQL)
+        # Sur ces volumes un parcours séquentiel resterait bon marché: on ne
+        # vérifie que l'existence d'un chemin d'accès indexé pour chaque route
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        yield connection
+    finally:
+        transaction.rollback()
+        connection.close()
+        engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def ids(conn):
+    return {name: conn.exec_driver_sql(sql).scalar() for name, sql in LOOKUPS_SQL.items()}
+
+
+@pytest.mark.parametrize("route", [
+    "login",
+    "ledger_lines",
+    "ledger_lines_by_account",
+    "stock_moves_by_article",
+    "stock_moves_by_stock",
+    "stock_inventory",
+    "active_driver",
+])
+def test_route_query_uses_index(conn, ids, route):
+    stmt, expected = route_queries(ids)[route]
+    indexes, seq_scans = explain(conn, compile_sql(stmt))
+    assert expected <= indexes, f"{route}: expected {sorted(expected)}, plan used {sorted(indexes)}"
+    assert not seq_scans, f"{route}: sequential scan on {sorted(seq_scans)}"
+
+
+def test_ledger_delta_since_closing_uses_date_index(conn):
+    """Soldes à une date: lignes postérieures à la dernière clôture (services/ledger.py)"""
+    from services.ledger import _ledger_delta_sql
+    sql = _ledger_delta_sql(since=True, until=True)
+    sql = sql.replace(":since", "now() - interval '30 days'").replace(":until", "now()")
+    indexes, seq_scans = explain(conn, sql)
+    assert "ix_ledger_line_date_op" in indexes
+    assert "ledger_line" not in seq_scans
+
+
+@pytest.mark.parametrize("table,column,index_name", JUNCTION_INDEXES)
+def test_junction_reverse_lookup_uses_index(conn, table, column, index_name):
+    indexes, _ = explain(conn, f"SELECT * FROM {table} WHERE {column} = 1")
+    assert index_name in indexes